@@ -0,0 +1,209 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .siyi_protocol import SiyiPacket
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending:
+    __slots__ = ("seq", "frame", "tag", "future", "retries", "fixed_rto", "attempts", "sent_at", "on_sent")
+
+    def __init__(self, seq: int, frame: bytes, tag: Any, future: asyncio.Future, retries: int, fixed_rto: Optional[float],
+                 on_sent: Optional[Callable[[float], None]] = None):
+        self.seq = seq
+        self.on_sent = on_sent
+        self.frame = frame
+        self.tag = tag
+        self.future = future
+        self.retries = retries
+        self.fixed_rto = fixed_rto
+        self.attempts = 0
+        self.sent_at = 0.0
+
+
+class AckWindow:
+    """
+    Sliding window of commands waiting for an ACK.
+
+    Up to `max_in_flight` seqs can be outstanding at once. Retransmit
+    deadlines live in one heap served by a single loop timer, and the
+    retransmit timeout (RTO) adapts to measured ACK latency the way TCP
+    does (RFC 6298 SRTT/RTTVAR, Karn's rule for retransmitted frames).
+
+    `write(frame, tag, on_sent)` hands a frame to the transmit path; `tag`
+    is passed through from send() and `on_sent(t)` must be called with the
+    loop time the frame actually went out, which starts its ACK timer.
+    """
+    def __init__(self, write: Callable[[bytes, Any, Callable[[float], None]], None], max_in_flight: int = 8,
+                 initial_rto: float = 1.0, min_rto: float = 0.05, max_rto: float = 4.0,
+                 stats_callback: Optional[Callable[['AckWindow'], None]] = None):
+        self.write = write
+        self.max_in_flight = max_in_flight
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.stats_callback = stats_callback
+
+        self.rto = initial_rto
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+        self.last_rtt: Optional[float] = None
+
+        # Counters
+        self.acked = 0
+        self.retransmits = 0
+        self.failures = 0  # Gave up after all retries
+
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._pending: Dict[int, _Pending] = {}
+        self._deadlines: List[Tuple[float, int, int, int]] = []  # (deadline, tiebreak, seq, attempt)
+        self._tiebreak = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_at = float("inf")
+
+    def __contains__(self, seq: int) -> bool:
+        return seq in self._pending
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    async def send(self, seq: int, frame: bytes, timeout: Optional[float] = None, retries: int = 3,
+                   tag: Any = None, on_sent: Optional[Callable[[float], None]] = None) -> Optional[SiyiPacket]:
+        """
+        Transmits `frame` and waits for the ACK carrying `seq`.
+        `timeout` fixes the per-attempt timeout; None uses the adaptive RTO.
+        `on_sent(t)` is called when the first transmission goes out.
+        Returns the ACK packet, or None once all retries are exhausted.
+        """
+        await self._slots.acquire()
+        entry = None
+        try:
+            entry = _Pending(seq, frame, tag, asyncio.get_running_loop().create_future(), retries, timeout, on_sent)
+            self._pending[seq] = entry
+            self._transmit(entry)
+            return await entry.future
+        finally:
+            if entry is not None and self._pending.get(seq) is entry:
+                del self._pending[seq]
+            self._slots.release()
+
+    def on_ack(self, packet: SiyiPacket) -> bool:
+        """Resolves the command waiting on `packet.seq`. Returns False for unknown seqs."""
+        entry = self._pending.pop(packet.seq, None)
+        if entry is None:
+            return False
+        # Karn's rule: an ACK for a retransmitted frame is ambiguous, skip the RTT sample
+        if entry.attempts == 1:
+            self._update_rto(asyncio.get_running_loop().time() - entry.sent_at)
+        self.acked += 1
+        if not entry.future.done():
+            entry.future.set_result(packet)
+        self._notify()
+        return True
+
+    def clear(self):
+        """Fails every outstanding command, e.g. on disconnect."""
+        for entry in self._pending.values():
+            if not entry.future.done():
+                entry.future.set_result(None)
+        self._pending.clear()
+        self._deadlines.clear()
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        self._timer_at = float("inf")
+        self._notify()
+
+    def _update_rto(self, rtt: float):
+        self.last_rtt = rtt
+        metrics.ACK_RTT.observe(rtt)
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.rto = min(self.max_rto, max(self.min_rto, self.srtt + 4 * self.rttvar))
+
+    def _transmit(self, entry: _Pending):
+        entry.attempts += 1
+        attempt = entry.attempts
+        self.write(entry.frame, entry.tag, lambda sent_at: self._on_sent(entry, attempt, sent_at))
+
+    def _on_sent(self, entry: _Pending, attempt: int, sent_at: float):
+        if self._pending.get(entry.seq) is not entry or entry.attempts != attempt:
+            return  # ACKed or cancelled while queued
+        entry.sent_at = sent_at
+        if attempt == 1 and entry.on_sent is not None:
+            entry.on_sent(sent_at)
+        if entry.fixed_rto is not None:
+            rto = entry.fixed_rto
+        else:
+            # Exponential backoff on retransmits
+            rto = min(self.max_rto, self.rto * (2 ** (attempt - 1)))
+        self._schedule(asyncio.get_running_loop(), sent_at + rto, entry.seq, attempt)
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop, deadline: float, seq: int, attempt: int):
+        heapq.heappush(self._deadlines, (deadline, next(self._tiebreak), seq, attempt))
+        if deadline < self._timer_at:
+            if self._timer:
+                self._timer.cancel()
+            self._timer_at = deadline
+            self._timer = loop.call_at(deadline, self._on_timer)
+
+    def _on_timer(self):
+        loop = asyncio.get_running_loop()
+        self._timer = None
+        self._timer_at = float("inf")
+        now = loop.time()
+        deadlines = self._deadlines
+
+        while deadlines and deadlines[0][0] <= now:
+            _, _, seq, attempt = heapq.heappop(deadlines)
+            entry = self._pending.get(seq)
+            if entry is None or entry.attempts != attempt:
+                continue  # Already ACKed or superseded by a retransmit
+            if entry.attempts <= entry.retries:
+                logger.warning(f"Timeout waiting for ACK (seq={seq}, attempt={attempt}), retransmitting")
+                self.retransmits += 1
+                metrics.RETRANSMITS.inc()
+                try:
+                    self._transmit(entry)
+                except Exception as e:
+                    logger.error(f"Retransmit failed (seq={seq}): {e}")
+                    self._give_up(entry)
+            else:
+                logger.warning(f"No ACK for seq={seq} after {attempt} attempts")
+                self._give_up(entry)
+            self._notify()
+
+        # Re-arm for the earliest live deadline, dropping stale entries
+        while deadlines:
+            deadline, _, seq, attempt = deadlines[0]
+            entry = self._pending.get(seq)
+            if entry is None or entry.attempts != attempt:
+                heapq.heappop(deadlines)
+                continue
+            # Retransmits above may already have armed the timer
+            if deadline < self._timer_at:
+                if self._timer:
+                    self._timer.cancel()
+                self._timer_at = deadline
+                self._timer = loop.call_at(deadline, self._on_timer)
+            break
+
+    def _give_up(self, entry: _Pending):
+        self.failures += 1
+        metrics.ACK_FAILURES.inc()
+        self._pending.pop(entry.seq, None)
+        if not entry.future.done():
+            entry.future.set_result(None)
+
+    def _notify(self):
+        if self.stats_callback:
+            self.stats_callback(self)
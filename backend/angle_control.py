@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import struct
+from typing import Any, Dict, Optional
+
+from . import metrics
+from .coalescer import CMD_DOWN, CMD_LEFT, CMD_RIGHT, CMD_STOP, CMD_UP
+from .telemetry import MAX_RATE, PITCH_LIMITS, YAW_LIMITS
+
+logger = logging.getLogger(__name__)
+
+AXES = ("yaw", "pitch")
+# Rotate command per axis for a positive / negative rate
+AXIS_COMMANDS = {"yaw": (CMD_RIGHT, CMD_LEFT), "pitch": (CMD_UP, CMD_DOWN)}
+LIMITS = {"yaw": YAW_LIMITS, "pitch": PITCH_LIMITS}
+
+
+class _AxisPID:
+    """
+    PID on one axis producing a rate in deg/s. Derivative acts on the
+    measurement (no kick on a new target). The integral only runs within
+    `integral_zone` degrees of the target and its share of the output is
+    capped at `integral_rate`, so it trims the final approach without
+    winding up during the slew. The output is slew limited to `max_accel`
+    so moves start and stop on a ramp.
+    """
+    def __init__(self, kp: float, ki: float, kd: float, max_rate: float, max_accel: float,
+                 integral_zone: float = 3.0, integral_rate: float = 5.0):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.max_rate = max_rate
+        self.max_accel = max_accel
+        self.integral_zone = integral_zone
+        self.integral_rate = integral_rate
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.last_measurement: Optional[float] = None
+        self.output = 0.0
+
+    def update(self, error: float, measurement: float, dt: float) -> float:
+        derivative = 0.0
+        if self.last_measurement is not None and dt > 0:
+            derivative = -(measurement - self.last_measurement) / dt
+        self.last_measurement = measurement
+
+        if self.ki and abs(error) < self.integral_zone:
+            limit = self.integral_rate / self.ki
+            self.integral = max(-limit, min(limit, self.integral + error * dt))
+        target = self.kp * error + self.ki * self.integral + self.kd * derivative
+        target = max(-self.max_rate, min(self.max_rate, target))
+
+        step = self.max_accel * dt
+        self.output += max(-step, min(step, target - self.output))
+        return self.output
+
+
+class _Move:
+    def __init__(self, target: Dict[str, float], start: Dict[str, float], started_at: float):
+        self.target = target
+        self.start = start
+        self.started_at = started_at
+        self.in_band_since: Optional[float] = None
+        self.overshoot = {axis: 0.0 for axis in AXES}
+        self.commands = 0
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def track(self, position: Dict[str, float]):
+        # Overshoot: furthest excursion past the target, in the direction of travel
+        for axis in AXES:
+            direction = 1.0 if self.target[axis] >= self.start[axis] else -1.0
+            past = (position[axis] - self.target[axis]) * direction
+            if past > self.overshoot[axis]:
+                self.overshoot[axis] = past
+
+
+class AngleController:
+    """
+    Server-side absolute pointing: drives the gimbal to a yaw/pitch target
+    with rate commands (ids 1-4) from a fixed-rate loop fed by the decoded
+    attitude stream, so the browser is out of the control loop.
+
+    A move settles once both axes stay within `tolerance` degrees for
+    `settle_window` seconds; it is reported with settle time and overshoot.
+    A new target replaces the current one, cancel() stops the gimbal.
+    """
+    def __init__(self, driver, hz: float = 50.0, kp: float = 4.0, ki: float = 0.5, kd: float = 0.1,
+                 max_rate: float = MAX_RATE, max_accel: float = 360.0, tolerance: float = 0.5,
+                 settle_window: float = 0.25, timeout: float = 15.0, feedback_timeout: float = 0.5,
+                 refresh: float = 0.5):
+        self.driver = driver
+        self.hz = hz
+        self.max_rate = max_rate
+        self.tolerance = tolerance
+        self.settle_window = settle_window
+        self.timeout = timeout
+        self.feedback_timeout = feedback_timeout
+        self.refresh = refresh  # Resend an unchanged rate this often; rotate commands aren't ACKed
+        self._pids = {axis: _AxisPID(kp, ki, kd, max_rate, max_accel) for axis in AXES}
+        self._move: Optional[_Move] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sent: Dict[str, tuple] = {}  # axis -> (cmd_id, speed, sent_at)
+        self.last_result: Optional[Dict[str, Any]] = None
+
+    @property
+    def active(self) -> bool:
+        return self._move is not None
+
+    def status(self) -> Dict[str, Any]:
+        move = self._move
+        return {
+            "active": move is not None,
+            "target": dict(move.target) if move else None,
+            "last_result": self.last_result,
+        }
+
+    async def set_target(self, yaw: float, pitch: float) -> asyncio.Future:
+        """
+        Starts a move (clamped to the mechanical range) and returns a future
+        resolving to the result dict. Raises RuntimeError if the gimbal is not
+        connected. The move waits up to `feedback_timeout` for a fresh attitude
+        sample and ends with status "no_feedback" if none comes, or if the
+        stream stalls for that long mid-move.
+        """
+        if not self.driver.connected:
+            raise RuntimeError("Gimbal not connected")
+        if not self.driver.state.get("attitude_stream_hz"):
+            # Feedback comes from the attitude stream; start it at the loop rate
+            await self.driver.request_attitude_stream(self.hz)
+
+        await self.cancel(stop=False, reason="superseded")
+        loop = asyncio.get_running_loop()
+        state = self.driver.state
+        target = {axis: max(LIMITS[axis][0], min(LIMITS[axis][1], float(value)))
+                  for axis, value in (("yaw", yaw), ("pitch", pitch))}
+        move = _Move(target, {axis: state[axis] for axis in AXES}, loop.time())
+        for pid in self._pids.values():
+            pid.reset()
+        self._sent.clear()
+        self._move = move
+        self._task = asyncio.create_task(self._run(move))
+        logger.info(f"Angle move to yaw={target['yaw']:.1f} pitch={target['pitch']:.1f}")
+        return move.future
+
+    async def cancel(self, stop: bool = True, reason: str = "cancelled"):
+        """Aborts the active move; with `stop` the gimbal is told to stop rotating."""
+        move, task = self._move, self._task
+        if move is None:
+            return
+        self._move = self._task = None
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if stop:
+            await self.driver.send_cmd(CMD_STOP, b'', expect_ack=False)
+        self._finish(move, reason, asyncio.get_running_loop().time())
+
+    def _finish(self, move: _Move, status: str, now: float, settled_at: Optional[float] = None):
+        state = self.driver.state
+        result = {
+            "status": status,
+            "target": dict(move.target),
+            "duration_s": round(now - move.started_at, 3),
+            "settle_time_s": round(settled_at - move.started_at, 3) if settled_at is not None else None,
+            "overshoot_deg": {axis: round(v, 2) for axis, v in move.overshoot.items()},
+            "error_deg": {axis: round(move.target[axis] - state[axis], 2) for axis in AXES},
+            "commands": move.commands,
+        }
+        self.last_result = result
+        metrics.ANGLE_MOVES.labels(status).inc()
+        if settled_at is not None:
+            metrics.ANGLE_SETTLE_SECONDS.observe(settled_at - move.started_at)
+            metrics.ANGLE_OVERSHOOT_DEGREES.observe(max(move.overshoot.values()))
+        if not move.future.done():
+            move.future.set_result(result)
+
+    async def _command(self, move: _Move, rates: Dict[str, float], now: float):
+        for axis in AXES:
+            rate = rates[axis]
+            # Smallest non-zero speed byte still moves; zero means hold this axis
+            speed = 0 if rate == 0 else min(100, max(1, int(round(abs(rate) / self.max_rate * 100))))
+            positive, negative = AXIS_COMMANDS[axis]
+            last = self._sent.get(axis)
+            cmd_id = positive if rate >= 0 else negative
+            if speed == 0:
+                if last is None or last[1] == 0:
+                    continue
+                cmd_id = last[0]  # Zero speed on the current direction stops this axis only
+            if last and last[:2] == (cmd_id, speed) and now - last[2] < self.refresh:
+                continue
+            self._sent[axis] = (cmd_id, speed, now)
+            move.commands += 1
+            await self.driver.send_cmd(cmd_id, struct.pack('B', speed), expect_ack=False)
+
+    async def _run(self, move: _Move):
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / self.hz
+        next_tick = loop.time()
+        last_tick = None
+        status = "error"
+        settled_at = None
+        try:
+            while True:
+                now = loop.time()
+                dt = now - last_tick if last_tick is not None else interval
+                last_tick = now
+
+                latest = self.driver.attitude.latest()
+                if latest is None or now - latest.t > self.feedback_timeout:
+                    # Stalled since the last sample, or since the move started if that
+                    # is later (the stream may only just have been requested)
+                    last_seen = move.started_at if latest is None else max(latest.t, move.started_at)
+                    if now - last_seen > self.feedback_timeout:
+                        logger.warning("Angle move aborted: attitude feedback stalled")
+                        status = "no_feedback"
+                        break
+                    last_tick = None  # No fresh sample yet: hold, and restart the PID timing
+                    next_tick += interval
+                    await asyncio.sleep(max(0.0, next_tick - loop.time()))
+                    continue
+                position = {"yaw": latest.yaw, "pitch": latest.pitch}
+                move.track(position)
+                errors = {axis: move.target[axis] - position[axis] for axis in AXES}
+
+                if all(abs(e) <= self.tolerance for e in errors.values()):
+                    if move.in_band_since is None:
+                        move.in_band_since = now
+                    elif now - move.in_band_since >= self.settle_window:
+                        status, settled_at = "settled", move.in_band_since
+                        break
+                else:
+                    move.in_band_since = None
+
+                if now - move.started_at > self.timeout:
+                    status = "timeout"
+                    break
+
+                rates = {}
+                for axis in AXES:
+                    pid = self._pids[axis]
+                    rate = pid.update(errors[axis], position[axis], dt)
+                    if abs(errors[axis]) <= self.tolerance / 2:
+                        # Close enough on this axis: hold instead of dithering around the target
+                        pid.output = rate = 0.0
+                    rates[axis] = rate
+                await self._command(move, rates, now)
+
+                next_tick += interval
+                delay = next_tick - loop.time()
+                if delay < 0:
+                    next_tick = loop.time()
+                    delay = 0
+                await asyncio.sleep(delay)
+        except Exception as e:
+            logger.error(f"Angle controller error: {e}")
+        if self._move is move:
+            self._move = self._task = None
+            await self.driver.send_cmd(CMD_STOP, b'', expect_ack=False)
+            self._finish(move, status, loop.time(), settled_at)
@@ -0,0 +1,233 @@
+"""
+Finds which serial port, baud rate, header byte order and CRC init a
+gimbal answers on.
+
+Every candidate port is probed in parallel. On each port the baud rates
+are tried in order of likelihood, and per baud one write carries a
+firmware-version request (0x12) in every header/CRC variant. The attempt
+ends as soon as a CRC-valid reply is decoded, or after `probe_timeout`.
+The winning configuration is cached per device (JSON file), and the next
+detect() checks it first.
+
+    python -m backend.autodetect [PORT ...] [--timeout 0.25] [--device default] [--json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .siyi_protocol import FRAME_CRC, HEAD_LEN, HEADER, MAX_PAYLOAD_LEN, MIN_PACKET_LEN, SiyiCRC
+from .telemetry import CMD_FIRMWARE, FirmwareVersion, decode_firmware
+from .transports import open_serial
+
+logger = logging.getLogger(__name__)
+
+# SIYI ships at 115200; the rest are what UART adapters get set to
+BAUDS = (115200, 57600, 230400, 460800, 38400, 19200, 9600)
+# (header, crc init): the SDK layout first, then byte-swapped STX and 0xFFFF init seen on other firmware
+VARIANTS = ((HEADER, 0x0000), (HEADER, 0xFFFF), (0x5566, 0x0000), (0x5566, 0xFFFF))
+
+CACHE_PATH = os.environ.get("SIYI_AUTODETECT_CACHE", os.path.expanduser("~/.cache/siyi/autodetect.json"))
+
+_BODY = struct.Struct('<BHHB')  # CTRL, LEN, SEQ, CMD
+
+
+class Detection(NamedTuple):
+    port: str
+    baud: int
+    header: int
+    crc_init: int
+    firmware: Optional[FirmwareVersion]
+    elapsed: float  # Seconds from the start of detect()
+
+    @property
+    def standard(self) -> bool:
+        """True if SiyiDriver can talk to it as is (SDK header and CRC init)."""
+        return self.header == HEADER and self.crc_init == 0
+
+    def to_dict(self) -> Dict:
+        return {
+            "port": self.port,
+            "baud": self.baud,
+            "header": f"0x{self.header:04x}",
+            "crc_init": f"0x{self.crc_init:04x}",
+            "firmware": self.firmware._asdict() if self.firmware else None,
+            "standard": self.standard,
+            "elapsed_s": round(self.elapsed, 3),
+        }
+
+
+def probe_frame(seq: int = 1) -> bytes:
+    """One firmware request per variant, back to back."""
+    frames = bytearray()
+    body = _BODY.pack(1, 0, seq, CMD_FIRMWARE)
+    for header, crc_init in VARIANTS:
+        frames += struct.pack('<H', header) + body + FRAME_CRC.pack(SiyiCRC.calculate(body, crc_init))
+    return bytes(frames)
+
+
+def find_reply(data: bytes) -> Optional[Tuple[int, int, bytes]]:
+    """
+    Looks for a firmware reply in any variant; returns (header, crc_init,
+    payload). Replies must carry a payload, so an echo of our own request
+    (loopback adapter, TX tied to RX) doesn't count.
+    """
+    for header, crc_init in VARIANTS:
+        stx = struct.pack('<H', header)
+        pos = data.find(stx)
+        while pos >= 0 and len(data) - pos >= MIN_PACKET_LEN:
+            _, length, _, cmd_id = _BODY.unpack_from(data, pos + 2)
+            end = pos + HEAD_LEN + length
+            if 0 < length <= MAX_PAYLOAD_LEN and cmd_id == CMD_FIRMWARE and end + 2 <= len(data):
+                if SiyiCRC.calculate(data[pos + 2:end], crc_init) == FRAME_CRC.unpack_from(data, end)[0]:
+                    return header, crc_init, bytes(data[pos + HEAD_LEN:end])
+            pos = data.find(stx, pos + 1)
+    return None
+
+
+class _ProbeProtocol(asyncio.Protocol):
+    def __init__(self):
+        self.buffer = bytearray()
+        self.reply: Optional[asyncio.Future] = None
+
+    def data_received(self, data):
+        self.buffer += data
+        if self.reply is not None and not self.reply.done():
+            found = find_reply(self.buffer)
+            if found is not None:
+                self.reply.set_result(found)
+
+
+async def probe_port(port: str, bauds: Sequence[int] = BAUDS, probe_timeout: float = 0.25,
+                     started: Optional[float] = None) -> Optional[Detection]:
+    """Tries `bauds` in order on one port; None if nothing answered."""
+    loop = asyncio.get_running_loop()
+    started = loop.time() if started is None else started
+    try:
+        transport, protocol = await open_serial(_ProbeProtocol, port, bauds[0])
+    except Exception as e:
+        logger.debug(f"Autodetect: cannot open {port}: {e}")
+        return None
+    try:
+        for baud in bauds:
+            if transport.serial.baudrate != baud:
+                # Same fd, new line settings: no close/reopen per baud
+                transport.serial.baudrate = baud
+            protocol.buffer.clear()
+            protocol.reply = loop.create_future()
+            transport.write(probe_frame())
+            try:
+                header, crc_init, payload = await asyncio.wait_for(protocol.reply, probe_timeout)
+            except asyncio.TimeoutError:
+                continue
+            logger.info(f"Autodetect: gimbal on {port} at {baud} baud (header 0x{header:04x}, crc init 0x{crc_init:04x})")
+            return Detection(port, baud, header, crc_init, decode_firmware(payload), loop.time() - started)
+        return None
+    finally:
+        transport.close()
+
+
+class DetectionCache:
+    """Last known-good configuration per device id, persisted as JSON."""
+    def __init__(self, path: Optional[str] = CACHE_PATH):
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable autodetect cache {path}: {e}")
+
+    def get(self, device: str) -> Optional[Dict]:
+        return self.entries.get(device)
+
+    def put(self, device: str, detection: Detection):
+        self.entries[device] = {"port": detection.port, "baud": detection.baud,
+                                "header": detection.header, "crc_init": detection.crc_init}
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def _ordered_bauds(bauds: Sequence[int], first: Optional[int]) -> List[int]:
+    return [first] + [b for b in bauds if b != first] if first in bauds else list(bauds)
+
+
+async def detect(ports: Iterable[str], device: str = "default", cache: Optional[DetectionCache] = None,
+                 bauds: Sequence[int] = BAUDS, probe_timeout: float = 0.25) -> Optional[Detection]:
+    """
+    Probes `ports` concurrently and returns the first gimbal found (None if
+    none answered). The cached configuration for `device` is tried alone
+    first; on a miss its port and baud still go to the front of the queue.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    ports = list(dict.fromkeys(ports))
+    known = cache.get(device) if cache else None
+
+    result = None
+    if known and known["port"] in ports:
+        result = await probe_port(known["port"], [known["baud"]], probe_timeout, started)
+        if result is None:
+            logger.info(f"Autodetect: cached config for {device} ({known['port']} @ {known['baud']}) did not answer")
+    if result is None and ports:
+        preferred = known["baud"] if known else None
+        tasks = [asyncio.create_task(probe_port(port, _ordered_bauds(bauds, preferred), probe_timeout, started))
+                 for port in ports]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                result = await finished
+                if result is not None:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Let cancelled probes close their ports before returning
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    if result is not None and cache is not None:
+        cache.put(device, result)
+        await loop.run_in_executor(None, cache.save)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the port, baud and framing a SIYI gimbal answers on")
+    parser.add_argument("ports", nargs="*", help="candidate ports (default: every serial port found)")
+    parser.add_argument("--timeout", type=float, default=0.25, help="seconds to wait for a reply per baud")
+    parser.add_argument("--device", default="default", help="cache key for the known-good configuration")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    ports = args.ports
+    if not ports:
+        import serial.tools.list_ports
+        ports = [p.device for p in serial.tools.list_ports.comports()]
+    cache = None if args.no_cache else DetectionCache()
+
+    started = time.perf_counter()
+    result = asyncio.run(detect(ports, args.device, cache, probe_timeout=args.timeout))
+    if args.json:
+        print(json.dumps(result.to_dict() if result else None, indent=2))
+    elif result:
+        for key, value in result.to_dict().items():
+            print(f"{key}: {value}")
+    else:
+        print(f"No gimbal answered on {', '.join(ports) or 'any port'} ({time.perf_counter() - started:.2f}s)")
+    return 0 if result else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
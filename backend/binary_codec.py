@@ -0,0 +1,99 @@
+"""
+Binary framing for /ws/control, negotiated per client with
+{"type": "hello", "format": "binary"}. JSON stays the default.
+
+Every record starts with a one byte type; all fields are little endian.
+Server -> client:
+  0x01 ATTITUDE  base u32, version u32, yaw, pitch, roll, yaw_rate, pitch_rate, roll_rate f32
+  0x02 STATE     base u32, version u32, connected u8, the ATTITUDE angles f32 x6,
+                 last_ack_ts f64, retries u32, errors u32, crc_failures u32,
+                 resync_bytes u32, in_flight u16, srtt_ms f32, rto_ms f32
+Client -> server:
+  0x81 GIMBAL_RATE  yaw i8, pitch i8, speed u8
+  0x82 ZOOM         action u8 (0 stop, 1 in, 2 out)
+"""
+import math
+import struct
+from typing import Any, Dict, Iterable, Optional
+
+REC_ATTITUDE = 0x01
+REC_STATE = 0x02
+REC_GIMBAL_RATE = 0x81
+REC_ZOOM = 0x82
+
+ATTITUDE_RECORD = struct.Struct('<BII6f')
+STATE_RECORD = struct.Struct('<BIIB6fdIIIIHff')
+GIMBAL_RATE_RECORD = struct.Struct('<BbbB')
+ZOOM_RECORD = struct.Struct('<BB')
+
+ATTITUDE_FIELDS = ("yaw", "pitch", "roll", "yaw_rate", "pitch_rate", "roll_rate")
+STATE_FIELDS = frozenset(ATTITUDE_FIELDS + (
+    "connected", "last_ack_ts", "retries", "errors", "crc_failures",
+    "resync_bytes", "in_flight", "srtt_ms", "rto_ms",
+))
+
+ZOOM_ACTIONS = {0: "stop", 1: "in", 2: "out"}
+ZOOM_CODES = {v: k for k, v in ZOOM_ACTIONS.items()}
+
+
+def _f(value: Optional[float]) -> float:
+    return math.nan if value is None else float(value)
+
+
+def encode_state_delta(state: Dict[str, Any], changed: Iterable[str], base: int, version: int) -> Optional[bytes]:
+    """
+    Binary record for a state delta, or None if it touches keys the fixed
+    layouts don't carry (the caller then falls back to JSON).
+    """
+    changed = set(changed)
+    if not changed <= STATE_FIELDS:
+        return None
+    angles = [_f(state.get(name)) for name in ATTITUDE_FIELDS]
+    if changed <= set(ATTITUDE_FIELDS):
+        return ATTITUDE_RECORD.pack(REC_ATTITUDE, base, version, *angles)
+    return STATE_RECORD.pack(
+        REC_STATE, base, version,
+        1 if state.get("connected") else 0,
+        *angles,
+        _f(state.get("last_ack_ts")),
+        int(state.get("retries", 0)),
+        int(state.get("errors", 0)),
+        int(state.get("crc_failures", 0)),
+        int(state.get("resync_bytes", 0)),
+        int(state.get("in_flight", 0)),
+        _f(state.get("srtt_ms")),
+        _f(state.get("rto_ms")),
+    )
+
+
+def _unpack(record: struct.Struct, data: bytes) -> tuple:
+    if len(data) != record.size:
+        raise ValueError(f"Binary record 0x{data[0]:02x} is {len(data)} bytes, expected {record.size}")
+    return record.unpack(data)
+
+
+def decode_command(data: bytes) -> Dict[str, Any]:
+    """
+    Decodes a client command record into the equivalent JSON message.
+    Raises ValueError for anything malformed.
+    """
+    if not data:
+        raise ValueError("Empty binary message")
+    rec = data[0]
+    if rec == REC_GIMBAL_RATE:
+        _, yaw, pitch, speed = _unpack(GIMBAL_RATE_RECORD, data)
+        return {"type": "gimbal_rate", "yaw": yaw, "pitch": pitch, "speed": speed}
+    if rec == REC_ZOOM:
+        _, action = _unpack(ZOOM_RECORD, data)
+        if action not in ZOOM_ACTIONS:
+            raise ValueError(f"Unknown zoom action {action}")
+        return {"type": "zoom", "action": ZOOM_ACTIONS[action]}
+    raise ValueError(f"Unknown binary record type 0x{rec:02x}")
+
+
+def encode_gimbal_rate(yaw: int, pitch: int, speed: int) -> bytes:
+    return GIMBAL_RATE_RECORD.pack(REC_GIMBAL_RATE, yaw, pitch, speed)
+
+
+def encode_zoom(action: str) -> bytes:
+    return ZOOM_RECORD.pack(REC_ZOOM, ZOOM_CODES[action])
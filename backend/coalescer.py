@@ -0,0 +1,103 @@
+import logging
+import struct
+from typing import Any, Dict, Optional, Tuple
+
+from .tracing import Trace
+
+logger = logging.getLogger(__name__)
+
+# Discrete rate command ids
+CMD_UP = 1
+CMD_DOWN = 2
+CMD_RIGHT = 3
+CMD_LEFT = 4
+CMD_STOP = 5
+
+
+async def send_rate_intent(driver, yaw: float, pitch: float, speed: int, trace: Optional[Trace] = None):
+    """
+    Translates a gimbal_rate intent into discrete rotate commands.
+    Yaw: -1 (Left), 1 (Right) | Pitch: 1 (Up), -1 (Down)
+    Payload: 1 byte for speed (0-100)
+    A `trace` follows the first command sent.
+    """
+    if yaw == 0 and pitch == 0:
+        await driver.send_cmd(CMD_STOP, b'', expect_ack=False, trace=trace)
+        return
+
+    speed_byte = struct.pack('B', max(0, min(100, int(speed))))
+    if yaw == 1:
+        await driver.send_cmd(CMD_RIGHT, speed_byte, expect_ack=False, trace=trace)
+        trace = None
+    elif yaw == -1:
+        await driver.send_cmd(CMD_LEFT, speed_byte, expect_ack=False, trace=trace)
+        trace = None
+
+    if pitch == 1:
+        await driver.send_cmd(CMD_UP, speed_byte, expect_ack=False, trace=trace)
+    elif pitch == -1:
+        await driver.send_cmd(CMD_DOWN, speed_byte, expect_ack=False, trace=trace)
+    elif trace is not None:
+        trace.finish("no_command")  # Fractional intent: nothing maps to a rotate command
+
+
+class RateCoalescer:
+    """
+    Latest-wins stage between /ws/control and the driver for gimbal_rate.
+
+    Motion intents only overwrite the pending yaw/pitch/speed; the newest
+    one is sent by flush(), which DriverRegistry calls for every device on
+    its shared control tick (`hz`). A stop is never delayed: it discards
+    any pending motion and goes out immediately.
+    """
+    def __init__(self, driver, hz: float = 50.0):
+        self.driver = driver
+        self.hz = hz
+        self._pending: Optional[Tuple[float, float, int, Optional[Trace]]] = None  # (yaw, pitch, speed, trace)
+
+        # Counters
+        self.received = 0
+        self.superseded = 0  # Intents overwritten before they were flushed
+        self.flushed = 0
+        self.stops = 0
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hz": self.hz,
+            "received": self.received,
+            "superseded": self.superseded,
+            "flushed": self.flushed,
+            "stops": self.stops,
+            "pending": self._pending is not None,
+        }
+
+    async def submit(self, yaw: float, pitch: float, speed: int, trace: Optional[Trace] = None):
+        self.received += 1
+        pending_trace = None
+        if self._pending is not None:
+            self.superseded += 1
+            pending_trace = self._pending[3]
+
+        if yaw == 0 and pitch == 0:
+            self._pending = None
+            self.stops += 1
+            if pending_trace is not None:
+                pending_trace.finish("superseded")
+            await send_rate_intent(self.driver, 0, 0, 0, trace)
+            return
+
+        if pending_trace is not None:
+            if trace is None:
+                trace = pending_trace  # Measures until the intent that replaced it goes out
+            else:
+                pending_trace.finish("superseded")
+        self._pending = (yaw, pitch, speed, trace)
+
+    async def flush(self):
+        intent = self._pending
+        if intent is None:
+            return
+        self._pending = None
+        self.flushed += 1
+        await send_rate_intent(self.driver, *intent)
@@ -1,28 +1,218 @@
-from typing import List
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
 from fastapi import WebSocket
 import logging
 
+from . import metrics
+
 logger = logging.getLogger(__name__)
 
+
+def encode_message(message: dict) -> str:
+    # Same compact encoding as WebSocket.send_json
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+class ClientChannel:
+    """
+    Outgoing side of one WebSocket client: a bounded queue drained by its
+    own writer task, so a slow client only ever delays itself.
+    """
+    def __init__(self, websocket: WebSocket, max_queue: int, topics=()):
+        self.websocket = websocket
+        self.topics = set(topics)  # Devices this client is subscribed to
+        self.max_queue = max_queue
+        self.queue: Deque[Tuple[Union[str, bytes], bool, float]] = deque()  # (data, droppable, enqueued_at)
+        self._ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.binary = False  # Negotiated binary telemetry records
+
+        # Counters
+        self.sent = 0
+        self.dropped = 0
+        self.lag_last = 0.0
+        self.lag_max = 0.0
+
+    @property
+    def name(self) -> str:
+        client = getattr(self.websocket, "client", None)
+        return f"{client.host}:{client.port}" if client else hex(id(self.websocket))
+
+    def oldest_age(self, now: float) -> float:
+        return now - self.queue[0][2] if self.queue else 0.0
+
+    def enqueue(self, data: Union[str, bytes], droppable: bool, now: float) -> bool:
+        """Returns False if the queue is full of messages that can't be dropped."""
+        if len(self.queue) >= self.max_queue:
+            # Drop the oldest telemetry message to make room
+            for i, (_, can_drop, _) in enumerate(self.queue):
+                if can_drop:
+                    del self.queue[i]
+                    self.dropped += 1
+                    metrics.WS_DROPPED.inc()
+                    break
+            else:
+                return False
+        self.queue.append((data, droppable, now))
+        self._ready.set()
+        return True
+
+    async def run(self, on_error):
+        ws = self.websocket
+        sent_json, sent_binary = metrics.WS_SENT.labels("json"), metrics.WS_SENT.labels("binary")
+        while True:
+            if not self.queue:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            data, _, enqueued_at = self.queue.popleft()
+            try:
+                if isinstance(data, bytes):
+                    await ws.send_bytes(data)
+                    sent_binary.inc()
+                else:
+                    await ws.send_text(data)
+                    sent_json.inc()
+            except Exception as e:
+                on_error(self, e)
+                return
+            self.sent += 1
+            self.lag_last = time.monotonic() - enqueued_at
+            if self.lag_last > self.lag_max:
+                self.lag_max = self.lag_last
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "client": self.name,
+            "format": "binary" if self.binary else "json",
+            "devices": sorted(self.topics),
+            "queue": len(self.queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "lag_ms": round(self.lag_last * 1000, 2),
+            "lag_max_ms": round(self.lag_max * 1000, 2),
+        }
+
+
 class ConnectionManager:
-    def __init__(self):
+    """
+    WebSocket fan-out. Each broadcast is serialized once and queued to
+    every client; telemetry is dropped oldest-first for clients that can't
+    keep up, and clients that error or fall more than `max_lag` seconds
+    behind are evicted.
+
+    Broadcasts can be scoped to a topic (a device id); new clients are
+    subscribed to `default_topics`.
+    """
+    def __init__(self, max_queue: int = 64, max_lag: float = 2.0, default_topics=()):
         self.active_connections: List[WebSocket] = []
+        self.max_queue = max_queue
+        self.max_lag = max_lag
+        self.default_topics = tuple(default_topics)
+        self._channels: Dict[WebSocket, ClientChannel] = {}
+        self.evicted = 0
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
+        channel = ClientChannel(websocket, self.max_queue, self.default_topics)
+        channel.task = asyncio.create_task(channel.run(self._on_send_error))
+        self._channels[websocket] = channel
         self.active_connections.append(websocket)
         logger.info("New WebSocket connection")
 
     def disconnect(self, websocket: WebSocket):
+        channel = self._channels.pop(websocket, None)
+        if channel:
+            channel.closed = True
+            if channel.task and channel.task is not asyncio.current_task():
+                channel.task.cancel()
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
             logger.info("WebSocket disconnected")
 
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting to WS: {e}")
-                # Potentially remove connection?
-                pass
+    def set_format(self, websocket: WebSocket, fmt: str):
+        channel = self._channels.get(websocket)
+        if channel is None:
+            return
+        if fmt not in ("json", "binary"):
+            raise ValueError(f"Unknown format {fmt!r}")
+        channel.binary = fmt == "binary"
+
+    def subscribe(self, websocket: WebSocket, topics):
+        channel = self._channels.get(websocket)
+        if channel is not None:
+            channel.topics = set(topics)
+
+    def primary_topic(self, websocket: WebSocket) -> Optional[str]:
+        """The topic a client follows, if it follows exactly one."""
+        channel = self._channels.get(websocket)
+        if channel is not None and len(channel.topics) == 1:
+            return next(iter(channel.topics))
+        return None
+
+    def has_subscribers(self, topic: Optional[str] = None) -> bool:
+        if topic is None:
+            return bool(self._channels)
+        return any(topic in channel.topics for channel in self._channels.values())
+
+    async def broadcast(self, message: Union[dict, str, bytes], droppable: bool = True,
+                        binary: Optional[bytes] = None, topic: Optional[str] = None):
+        """
+        Queues `message` for every client (subscribed to `topic`, if given);
+        dicts are JSON encoded once. Clients that negotiated binary framing
+        get `binary` instead when given, as long as they follow a single
+        topic (binary records don't say which device they are about).
+        """
+        started = time.perf_counter()
+        data = None
+        now = time.monotonic()
+        for channel in list(self._channels.values()):
+            if topic is not None and topic not in channel.topics:
+                continue
+            if binary is not None and channel.binary and len(channel.topics) <= 1:
+                self._enqueue(channel, binary, droppable, now)
+                continue
+            if data is None:
+                data = encode_message(message) if isinstance(message, dict) else message
+            self._enqueue(channel, data, droppable, now)
+        metrics.BROADCAST_SECONDS.observe(time.perf_counter() - started)
+
+    async def send(self, websocket: WebSocket, message: Union[dict, str, bytes], droppable: bool = False):
+        """Queues `message` for one client, in order with broadcasts."""
+        channel = self._channels.get(websocket)
+        if channel is None:
+            return
+        data = encode_message(message) if isinstance(message, dict) else message
+        self._enqueue(channel, data, droppable, time.monotonic())
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [channel.stats() for channel in self._channels.values()]
+
+    def _enqueue(self, channel: ClientChannel, data, droppable: bool, now: float):
+        if channel.oldest_age(now) > self.max_lag:
+            self._evict(channel, f"lagging {channel.oldest_age(now):.1f}s behind")
+        elif not channel.enqueue(data, droppable, now):
+            self._evict(channel, "send queue full")
+
+    def _on_send_error(self, channel: ClientChannel, error: Exception):
+        self._evict(channel, f"send failed: {error}")
+
+    def _evict(self, channel: ClientChannel, reason: str):
+        if channel.closed:
+            return
+        logger.warning(f"Evicting WebSocket client {channel.name}: {reason}")
+        self.evicted += 1
+        websocket = channel.websocket
+        self.disconnect(websocket)
+        asyncio.create_task(self._close(websocket))
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=1011)
+        except Exception:
+            pass
@@ -0,0 +1,375 @@
+"""
+Driver daemon: owns every gimbal link in its own process so the web
+server can run several workers without touching the serial/UDP port.
+
+The daemon runs the DriverRegistry (drivers, control tick, angle and scan
+loops) and nothing else. Workers talk to it two ways:
+
+- state: each device's snapshot (driver state, angle/scan status, rate
+  stats, latest attitude) is published into a seqlock block in shared
+  memory (backend.shm_state) up to `publish_hz` times a second, so reads
+  never cross the socket;
+- commands: newline-delimited JSON over a Unix socket,
+  {"id", "op", "device", "args"} -> {"id", "result"} or {"id", "error", "kind"}.
+  Requests without an id are fire-and-forget (rate intents). set_angle
+  replies when the move starts and again with {"id", "final"} when it ends.
+  The daemon pushes {"devices": [...]} when the device list changes and
+  {"event", "topic"} for scan progress. Traced commands (backend.tracing)
+  carry the worker's stage marks in args["trace"] and get the trace
+  report as their final reply; loop time is CLOCK_MONOTONIC in both
+  processes, so the marks line up.
+
+    python -m backend.daemon [--socket PATH] [--shm-dir DIR] [--device ID ...]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import tempfile
+from typing import Any, Dict, List, Optional, Set
+
+from . import metrics
+from .logging_setup import setup_logging
+from .port_watcher import PortWatcher, SIYI_USB_IDS, parse_usb_ids
+from .registry import DriverRegistry, DEFAULT_DEVICE
+from .shm_state import SHM_DIR, SeqlockWriter, block_path
+from .telemetry import FIELDS
+from .tracing import Trace
+
+logger = logging.getLogger(__name__)
+
+SOCKET_PATH = os.environ.get("SIYI_DAEMON_SOCKET") or os.path.join(tempfile.gettempdir(), "siyi-daemon.sock")
+
+# Exceptions re-raised as themselves on the worker side; anything else becomes RuntimeError
+ERROR_KINDS = {"ValueError": ValueError, "KeyError": KeyError, "RuntimeError": RuntimeError}
+
+
+def encode(message: Dict[str, Any]) -> bytes:
+    return json.dumps(message, separators=(',', ':')).encode() + b'\n'
+
+
+def to_json(result: Any) -> Any:
+    """Query results: NamedTuples become dicts, raw attitude tuples get their field names."""
+    if hasattr(result, "_asdict"):
+        return result._asdict()
+    if isinstance(result, tuple):
+        return dict(zip(FIELDS, result))
+    return result
+
+
+def snapshot(device) -> Dict[str, Any]:
+    """Everything a worker reads synchronously about a device."""
+    driver = device.driver
+    latest = driver.attitude.latest()
+    return {
+        "info": device.info(),
+        "state": dict(driver.state),
+        "angle": device.angle.status(),
+        "scan": device.scan.status(),
+        "control": device.coalescer.stats,
+        "attitude": latest._asdict() if latest else None,
+        "attitude_stats": driver.attitude.window_stats(1.0),
+    }
+
+
+def _trace(args: Dict[str, Any]) -> Optional[Trace]:
+    value = args.get("trace")
+    return Trace(value["id"], marks=value["marks"]) if value else None
+
+
+class _Final:
+    """An op result whose request also gets a second, final reply."""
+    def __init__(self, result: Any, future: asyncio.Future):
+        self.result = result
+        self.future = future
+
+
+class DriverDaemon:
+    def __init__(self, socket_path: str = SOCKET_PATH, shm_dir: str = SHM_DIR, control_hz: float = 50.0,
+                 publish_hz: float = 50.0, flight_log_path: Optional[str] = None):
+        self.socket_path = socket_path
+        self.shm_dir = shm_dir
+        self.publish_interval = 1.0 / publish_hz
+        # The daemon stands in for the registry's WS manager: state goes out
+        # through shared memory, scan events to the connected workers
+        self.registry = DriverRegistry(self, control_hz=control_hz, state_hz=publish_hz,
+                                       flight_log_path=flight_log_path)
+        self._clients: Set[asyncio.StreamWriter] = set()
+        self._blocks: Dict[str, SeqlockWriter] = {}
+        self._published: Dict[str, bytes] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ConnectionManager interface used by the registry's devices
+    def has_subscribers(self, topic: Optional[str] = None) -> bool:
+        return False
+
+    async def broadcast(self, message, droppable: bool = True, binary: Optional[bytes] = None,
+                        topic: Optional[str] = None):
+        self._push({"event": message, "topic": topic})
+
+    def _push(self, message: Dict[str, Any]):
+        data = encode(message)
+        for writer in list(self._clients):
+            writer.write(data)
+
+    async def autoconnect(self, added, removed, ports, baud: int = 115200):
+        """PortWatcher callback: connects the default device to a newly plugged SIYI port."""
+        driver = self.registry.get_or_create(DEFAULT_DEVICE).driver
+        if driver.connected:
+            return
+        for port in added:
+            if port["siyi"]:
+                logger.info(f"Auto-connecting to SIYI gimbal on {port['device']}")
+                try:
+                    await driver.connect(port["device"], baud)
+                except Exception as e:
+                    logger.warning(f"Auto-connect to {port['device']} failed: {e}")
+                break
+
+    def devices(self) -> List[Dict[str, str]]:
+        return [{"id": device_id, "shm": block.path} for device_id, block in self._blocks.items()]
+
+    def _sync_blocks(self):
+        """One block per device; pushes the new list to workers when it changed."""
+        changed = False
+        for device_id, device in self.registry.devices.items():
+            if device_id not in self._blocks:
+                try:
+                    self._blocks[device_id] = SeqlockWriter(block_path(self.shm_dir, device_id))
+                except OSError as e:
+                    logger.error(f"No state block for {device_id}: {e}")
+                    continue
+                self._publish(device_id, device)
+                changed = True
+        for device_id in [d for d in self._blocks if d not in self.registry.devices]:
+            self._blocks.pop(device_id).close()
+            self._published.pop(device_id, None)
+            changed = True
+        if changed:
+            self._push({"devices": self.devices()})
+
+    def _publish(self, device_id: str, device):
+        data = json.dumps(snapshot(device), separators=(',', ':')).encode()
+        if data != self._published.get(device_id):
+            self._blocks[device_id].write(data)
+            self._published[device_id] = data
+
+    async def _publish_loop(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            try:
+                self._sync_blocks()  # Picks up devices created by auto-connect
+            except Exception as e:
+                logger.error(f"State block sync error: {e}")
+            for device_id, device in list(self.registry.devices.items()):
+                if device_id not in self._blocks:
+                    continue
+                try:
+                    self._publish(device_id, device)
+                except Exception as e:
+                    logger.error(f"State publish error on {device_id}: {e}")
+            next_tick += self.publish_interval
+            delay = next_tick - loop.time()
+            if delay < 0:
+                next_tick = loop.time()
+            await asyncio.sleep(max(0.0, delay))
+
+    async def start(self, device_ids=(DEFAULT_DEVICE,)):
+        for device_id in device_ids:
+            self.registry.get_or_create(device_id)
+        self._sync_blocks()
+        self.registry.start()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # Left over from a daemon that did not shut down
+        self._server = await asyncio.start_unix_server(self._serve_client, path=self.socket_path,
+                                                       limit=1 << 22)
+        self._task = asyncio.create_task(self._publish_loop())
+        logger.info(f"Driver daemon listening on {self.socket_path}, state blocks in {self.shm_dir}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._clients):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for device_id in list(self.registry.devices):
+            await self.registry.remove(device_id)
+        await self.registry.stop()
+        self._sync_blocks()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._clients.add(writer)
+        writer.write(encode({"devices": self.devices()}))
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    logger.warning(f"Bad daemon request: {e}")
+                    continue
+                # Each request runs on its own so a slow one (query, ACKed command)
+                # doesn't hold up rate intents queued behind it
+                task = asyncio.create_task(self._serve_request(request, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            logger.warning(f"Daemon client dropped: {e}")
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    async def _serve_request(self, request: Dict[str, Any], writer: asyncio.StreamWriter):
+        request_id = request.get("id")
+        try:
+            result = await self.handle(request.get("op"), request.get("device"), request.get("args") or {})
+        except Exception as e:
+            if request_id is None:
+                logger.warning(f"Daemon {request.get('op')} failed: {e}")
+            else:
+                writer.write(encode({"id": request_id, "error": str(e), "kind": type(e).__name__}))
+            return
+        if request_id is None:
+            return
+        if isinstance(result, _Final):
+            writer.write(encode({"id": request_id, "result": result.result}))
+            final = await result.future
+            if not writer.is_closing():
+                writer.write(encode({"id": request_id, "final": final}))
+        else:
+            writer.write(encode({"id": request_id, "result": result}))
+
+    def _device(self, device_id: Optional[str], create: bool = False):
+        device_id = device_id or DEFAULT_DEVICE
+        if create:
+            device = self.registry.get_or_create(device_id)
+            self._sync_blocks()
+            return device
+        device = self.registry.get(device_id)
+        if device is None:
+            raise KeyError(f"Unknown device: {device_id}")
+        return device
+
+    async def handle(self, op: str, device_id: Optional[str], args: Dict[str, Any]) -> Any:
+        """Runs one command; raises what the equivalent in-process call would."""
+        if op == "devices":
+            return self.devices()
+        if op == "ensure":
+            self._device(device_id, create=True)
+            return {"id": device_id, "shm": self._blocks[device_id].path}
+        if op == "create":
+            self.registry.create(device_id)
+            self._sync_blocks()
+            return {"id": device_id, "shm": self._blocks[device_id].path}
+        if op == "remove":
+            await self.registry.remove(device_id)
+            self._sync_blocks()
+            return None
+        if op == "group_rate":
+            return await self.registry.group_rate(args["devices"], args["yaw"], args["pitch"], args["speed"])
+        if op == "metrics":
+            return metrics.render()
+
+        device = self._device(device_id, create=op == "connect")
+        driver = device.driver
+        if op == "connect":
+            await driver.connect(**args)
+            self._publish(device.id, device)
+            return device.info()
+        if op == "disconnect":
+            await driver.disconnect()
+            self._publish(device.id, device)
+            return None
+        if op == "send_cmd":
+            trace = _trace(args)
+            ok = await driver.send_cmd(args["cmd_id"], bytes.fromhex(args.get("payload", "")),
+                                       expect_ack=args.get("expect_ack", True), timeout=args.get("timeout"),
+                                       retries=args.get("retries", 3), priority=args.get("priority"), trace=trace)
+            return ok if trace is None else _Final(ok, trace.done)
+        if op == "query":
+            return to_json(await driver.query(args["cmd_id"], max_age=args.get("max_age"),
+                                              timeout=args.get("timeout"), retries=args.get("retries", 2)))
+        if op == "attitude_stream":
+            return await driver.request_attitude_stream(args["hz"])
+        if op == "rate":
+            trace = _trace(args)
+            await device.coalescer.submit(args["yaw"], args["pitch"], args["speed"], trace)
+            return None if trace is None else _Final(None, trace.done)
+        if op == "take_over":
+            return await device.take_over()
+        if op == "set_angle":
+            done = await device.angle.set_target(args["yaw"], args["pitch"])
+            return _Final(device.angle.status(), done)
+        if op == "cancel_angle":
+            await device.angle.cancel(stop=args.get("stop", True), reason=args.get("reason", "cancelled"))
+            return device.angle.status()
+        if op == "scan_start":
+            await device.scan.start(args["steps"], args.get("repeat", 1))
+            return device.scan.status()
+        if op in ("scan_pause", "scan_resume", "scan_abort"):
+            await getattr(device.scan, op[len("scan_"):])()
+            return device.scan.status()
+        raise ValueError(f"Unknown op {op!r}")
+
+
+async def serve(args):
+    daemon = DriverDaemon(args.socket, args.shm_dir, control_hz=args.control_hz, publish_hz=args.publish_hz,
+                          flight_log_path=args.flight_log)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    await daemon.start(args.device or [DEFAULT_DEVICE])
+    if metrics.METRICS_ENABLED:
+        asyncio.create_task(metrics.monitor_loop_lag())
+    watcher = None
+    if args.autoconnect:
+        watcher = PortWatcher(interval=float(os.environ.get("SIYI_PORT_SCAN_INTERVAL", "2")),
+                              known_ids=SIYI_USB_IDS | parse_usb_ids(os.environ.get("SIYI_USB_IDS", "")),
+                              on_change=lambda added, removed, ports: daemon.autoconnect(added, removed, ports,
+                                                                                          args.baud))
+        watcher.start()
+    await stopping.wait()
+    logger.info("Driver daemon shutting down")
+    if watcher is not None:
+        watcher.stop()
+    await daemon.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the gimbal drivers in their own process for multi-worker serving")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Unix socket for commands (SIYI_DAEMON_SOCKET)")
+    parser.add_argument("--shm-dir", default=SHM_DIR, help="directory for the shared-memory state blocks")
+    parser.add_argument("--device", action="append", help="device id to create at start (repeatable)")
+    parser.add_argument("--control-hz", type=float, default=float(os.environ.get("SIYI_CONTROL_HZ", "50")))
+    parser.add_argument("--publish-hz", type=float, default=float(os.environ.get("SIYI_SHM_HZ", "50")),
+                        help="maximum state snapshots per second and device")
+    parser.add_argument("--flight-log", default=os.environ.get("SIYI_FLIGHT_LOG") or None)
+    parser.add_argument("--autoconnect", action="store_true", default=os.environ.get("SIYI_AUTOCONNECT", "0") == "1",
+                        help="connect the default device when a SIYI serial port appears (SIYI_AUTOCONNECT=1)")
+    parser.add_argument("--baud", type=int, default=int(os.environ.get("SIYI_BAUD", "115200")))
+    args = parser.parse_args(argv)
+    setup_logging()
+    asyncio.run(serve(args))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,227 @@
+"""
+Flight log: append-only binary recording of the raw gimbal link.
+
+Layout (little endian):
+
+    header   "SIYIFLG1" <H version> <H flags> <d start wall time> <q start monotonic ns> <I index_every> <4x>
+    record   <q t_ns> <B kind> <H length> + data
+    ...
+
+t_ns is nanoseconds since the start of the recording. kind is TX (0, one
+frame as written), RX (1, a serial chunk as delivered, garbage included),
+RX_DATAGRAM (2, one whole UDP datagram) or INDEX (0xFF).
+
+Every `index_every` records (and on close) an INDEX record is appended:
+
+    "SIYIIDX\\0" <Q previous index offset> <I count> + count * (<q t_ns> <Q offset>)
+
+listing the records written since the previous index. Readers mmap the
+file, find the last index with rfind on the marker and follow the back
+links, so opening and seeking a long recording never parses it in full;
+records after the last index (a recording cut short) are found by
+scanning forward from it.
+
+The event loop only packs a record and puts it on a queue; the writer
+thread does the file I/O and builds the index.
+"""
+import bisect
+import logging
+import mmap
+import queue
+import struct
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SIYIFLG1'
+VERSION = 1
+HEADER = struct.Struct('<8sHHdqI4x')
+RECORD = struct.Struct('<qBH')
+INDEX_MARKER = b'SIYIIDX\x00'
+INDEX_HEAD = struct.Struct('<8sQI')
+INDEX_ENTRY = struct.Struct('<qQ')
+
+TX = 0
+RX = 1
+RX_DATAGRAM = 2
+INDEX = 0xFF
+KINDS = {TX: "TX", RX: "RX", RX_DATAGRAM: "RX"}
+
+NO_INDEX = 0xFFFFFFFFFFFFFFFF
+
+
+class FlightLogWriter:
+    def __init__(self, path: str, index_every: int = 256):
+        self.path = path
+        self.index_every = index_every
+        self.records = 0
+        self.bytes = 0
+        self._start_ns = time.monotonic_ns()
+        self._queue: "queue.SimpleQueue[Optional[bytes]]" = queue.SimpleQueue()
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0, time.time(), self._start_ns, index_every))
+        self._thread = threading.Thread(target=self._writer, name="flight-log", daemon=True)
+        self._thread.start()
+        logger.info(f"Recording link traffic to {path}")
+
+    def record(self, kind: int, data: bytes):
+        # Timestamp taken here, on the loop; everything else happens in the writer
+        t_ns = time.monotonic_ns() - self._start_ns
+        self._queue.put(RECORD.pack(t_ns, kind, len(data)) + bytes(data))
+        self.records += 1
+        self.bytes += len(data)
+
+    def close(self):
+        if self._file is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        self._file = None
+        logger.info(f"Flight log {self.path} closed: {self.records} records, {self.bytes} bytes")
+
+    def _writer(self):
+        f = self._file
+        offset = HEADER.size
+        pending: List[Tuple[int, int]] = []  # (t_ns, offset) since the last index
+        last_index = NO_INDEX
+        done = False
+        while not done:
+            item = self._queue.get()
+            # Batch whatever else is already waiting before flushing
+            while True:
+                if item is None:
+                    done = True
+                    break
+                f.write(item)
+                pending.append((RECORD.unpack_from(item)[0], offset))
+                offset += len(item)
+                if len(pending) >= self.index_every:
+                    last_index, offset = self._write_index(f, pending, last_index, offset)
+                    pending = []
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if done and pending:
+                self._write_index(f, pending, last_index, offset)
+            f.flush()
+
+    @staticmethod
+    def _write_index(f, entries, last_index, offset) -> Tuple[int, int]:
+        body = bytearray(INDEX_HEAD.pack(INDEX_MARKER, last_index, len(entries)))
+        for t_ns, record_offset in entries:
+            body += INDEX_ENTRY.pack(t_ns, record_offset)
+        f.write(RECORD.pack(entries[-1][0], INDEX, len(body)))
+        f.write(body)
+        return offset, offset + RECORD.size + len(body)
+
+
+class FlightLogReader:
+    """
+    Memory-mapped reader. Record data is returned as memoryview slices of
+    the map (no copies); they are only valid until close().
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        magic, version, _, self.start_time, _, self.index_every = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a flight log")
+        if version != VERSION:
+            self.close()
+            raise ValueError(f"{path}: unsupported flight log version {version}")
+        self._times, self._offsets = self._load_index()
+
+    def close(self):
+        if self._map is None:
+            return
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # Record views still alive; the map goes away with the last of them
+            pass
+        self._file.close()
+        self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    @property
+    def duration(self) -> float:
+        return self._times[-1] / 1e9 if self._times else 0.0
+
+    def _find_last_index(self) -> int:
+        end = len(self._map)
+        while True:
+            pos = self._map.rfind(INDEX_MARKER, HEADER.size, end)
+            if pos < 0:
+                return -1
+            start = pos - RECORD.size
+            if start >= HEADER.size:
+                _, kind, length = RECORD.unpack_from(self._map, start)
+                _, _, count = INDEX_HEAD.unpack_from(self._map, pos)
+                if kind == INDEX and length == INDEX_HEAD.size + count * INDEX_ENTRY.size \
+                        and pos + length <= len(self._map):
+                    return start
+            end = pos  # Marker bytes inside record data, keep looking
+
+    def _load_index(self) -> Tuple[List[int], List[int]]:
+        blocks = []
+        index_at = self._find_last_index()
+        tail_from = HEADER.size
+        if index_at >= 0:
+            tail_from = index_at + RECORD.size + RECORD.unpack_from(self._map, index_at)[2]
+        while index_at >= 0:
+            body = index_at + RECORD.size
+            _, previous, count = INDEX_HEAD.unpack_from(self._map, body)
+            blocks.append(list(INDEX_ENTRY.iter_unpack(
+                self._map[body + INDEX_HEAD.size:body + INDEX_HEAD.size + count * INDEX_ENTRY.size])))
+            index_at = -1 if previous == NO_INDEX else previous
+
+        times, offsets = [], []
+        for block in reversed(blocks):
+            for t_ns, offset in block:
+                times.append(t_ns)
+                offsets.append(offset)
+        # Unindexed tail (recording not closed cleanly)
+        for t_ns, kind, offset in self._scan(tail_from):
+            if kind != INDEX:
+                times.append(t_ns)
+                offsets.append(offset)
+        return times, offsets
+
+    def _scan(self, offset: int) -> Iterator[Tuple[int, int, int]]:
+        size = len(self._map)
+        while offset + RECORD.size <= size:
+            t_ns, kind, length = RECORD.unpack_from(self._map, offset)
+            if offset + RECORD.size + length > size:
+                return  # Truncated last record
+            yield t_ns, kind, offset
+            offset += RECORD.size + length
+
+    def seek(self, t: float) -> int:
+        """Position of the first record at or after `t` seconds into the recording."""
+        return bisect.bisect_left(self._times, int(t * 1e9))
+
+    def records(self, start: float = 0.0, end: Optional[float] = None) -> Iterator[Tuple[float, int, memoryview]]:
+        """Yields (t seconds, kind, data) for records in [start, end)."""
+        stop = len(self._offsets) if end is None else bisect.bisect_left(self._times, int(end * 1e9))
+        view = self._view
+        for i in range(self.seek(start), stop):
+            offset = self._offsets[i]
+            t_ns, kind, length = RECORD.unpack_from(self._map, offset)
+            data_at = offset + RECORD.size
+            yield t_ns / 1e9, kind, view[data_at:data_at + length]
@@ -0,0 +1,195 @@
+import asyncio
+import collections
+import logging
+import random
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from . import metrics
+from .telemetry import CMD_FIRMWARE  # Answered by every gimbal; used as the probe
+
+logger = logging.getLogger(__name__)
+
+LINK_DOWN = "down"          # Not connected (or disconnected by the user)
+LINK_CONNECTED = "connected"
+LINK_DEGRADED = "degraded"  # Frames still arrive but loss or RTT is high, or the link went quiet
+LINK_LOST = "lost"          # Nothing received for `lost_after`; reconnecting
+LINK_STATES = (LINK_DOWN, LINK_CONNECTED, LINK_DEGRADED, LINK_LOST)
+
+
+class LinkMonitor:
+    """
+    Link health for one SiyiDriver, replacing the fixed 1 Hz heartbeat.
+
+    Any valid RX frame counts as liveness, so a probe (firmware version
+    request) only goes out after `idle` seconds without traffic. Loss
+    (lost transmissions / attempts) and ACK RTT come from the AckWindow
+    counters, sampled every tick into a `window`-second sliding window.
+
+    The link is "degraded" when loss or RTT cross their thresholds or
+    nothing has been heard for twice `idle`, and "lost" after `lost_after`
+    seconds of silence or when the transport closes under us. A lost link
+    is reopened with exponential backoff until frames arrive again.
+    """
+    def __init__(self, driver, idle: float = 1.0, lost_after: float = 3.0, window: float = 10.0,
+                 degraded_loss: float = 0.2, degraded_rtt: float = 0.25, tick: float = 0.1,
+                 backoff: Tuple[float, float] = (0.5, 10.0)):
+        self.driver = driver
+        self.idle = idle
+        self.lost_after = lost_after
+        self.window = window
+        self.degraded_loss = degraded_loss
+        self.degraded_rtt = degraded_rtt
+        self.tick = tick
+        self.backoff = backoff
+
+        self.status = LINK_DOWN
+        self.last_rx = 0.0
+        self.probes = 0
+        self.reconnects = 0
+        self._samples: Deque[Tuple[float, int, int, Optional[float]]] = collections.deque()  # (t, attempts, lost, rtt)
+        self._counts = (0, 0, 0)  # AckWindow (acked, retransmits, failures) at the last tick
+        self._probe: Optional[asyncio.Task] = None
+        self._restore: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self._delay = backoff[0]
+        self._lost_at: Optional[float] = None  # Loop time the link was declared lost, None while up
+        self._retry_at = 0.0
+        self._transport_lost = False
+
+    # --- Driver hooks ---
+
+    def on_rx(self):
+        """Called for every valid frame received."""
+        self.last_rx = asyncio.get_running_loop().time()
+
+    def on_transport_lost(self, exc: Optional[Exception]):
+        """Called by the transport protocol when the link closes without disconnect()."""
+        if self._task is None:
+            return
+        logger.warning(f"Link to {self.driver.port} closed: {exc or 'EOF'}")
+        self._transport_lost = True
+
+    # --- Lifecycle ---
+
+    def start(self):
+        self.stop()
+        loop = asyncio.get_running_loop()
+        self.last_rx = loop.time()  # Grace period: nothing heard yet is not a loss
+        self._samples.clear()
+        window = self.driver.ack_window
+        self._counts = (window.acked, window.retransmits, window.failures)
+        self._delay = self.backoff[0]
+        self._lost_at = None
+        self._transport_lost = False
+        self._set_status(LINK_CONNECTED)
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        for task in (self._task, self._probe, self._restore):
+            if task is not None and task is not asyncio.current_task():
+                task.cancel()
+        self._task = self._probe = self._restore = None
+        self._set_status(LINK_DOWN)
+
+    # --- Health ---
+
+    def stats(self) -> Dict[str, Any]:
+        attempts = sum(s[1] for s in self._samples)
+        lost = sum(s[2] for s in self._samples)
+        rtts = [s[3] for s in self._samples if s[3] is not None]
+        return {
+            "status": self.status,
+            "loss": lost / attempts if attempts else 0.0,
+            "rtt": sum(rtts) / len(rtts) if rtts else None,
+            "samples": attempts,
+        }
+
+    def _sample(self, now: float):
+        window = self.driver.ack_window
+        acked, retransmits, failures = window.acked, window.retransmits, window.failures
+        d_acked = acked - self._counts[0]
+        d_lost = (retransmits - self._counts[1]) + (failures - self._counts[2])
+        self._counts = (acked, retransmits, failures)
+        if d_acked or d_lost:
+            # Every command ends ACKed or failed; each retransmit is one more lost attempt
+            rtt = window.last_rtt if d_acked else None
+            self._samples.append((now, d_acked + d_lost, d_lost, rtt))
+        while self._samples and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+
+    def _classify(self, now: float) -> str:
+        silence = now - self.last_rx
+        if self._transport_lost or silence > self.lost_after:
+            return LINK_LOST
+        stats = self.stats()
+        if silence > 2 * self.idle or stats["loss"] > self.degraded_loss \
+                or (stats["rtt"] is not None and stats["rtt"] > self.degraded_rtt):
+            return LINK_DEGRADED
+        return LINK_CONNECTED
+
+    def _set_status(self, status: str):
+        state = self.driver.state
+        if status != self.status:
+            if status in (LINK_DEGRADED, LINK_LOST):
+                logger.warning(f"Link {self.driver.port or self.driver.device_id}: {self.status} -> {status}")
+            elif self.status != LINK_DOWN and status != LINK_DOWN:
+                logger.info(f"Link {self.driver.port or self.driver.device_id}: {self.status} -> {status}")
+            self.status = status
+            metrics.LINK_STATE.labels(self.driver.device_id).set(LINK_STATES.index(status))
+        state["link"] = status
+        stats = self.stats()
+        state["link_loss"] = round(stats["loss"], 2)
+        state["reconnects"] = self.reconnects
+
+    # --- Loop ---
+
+    async def _send_probe(self):
+        self.probes += 1
+        await self.driver.send_cmd(CMD_FIRMWARE, b'', expect_ack=True, retries=0)
+
+    async def _restore_stream(self):
+        try:
+            await self.driver.restore_stream()
+        except Exception as e:
+            logger.warning(f"Could not restore the attitude stream on {self.driver.port}: {e}")
+
+    async def _reconnect(self, now: float):
+        self.reconnects += 1
+        metrics.RECONNECTS.labels(self.driver.device_id).inc()
+        logger.info(f"Reconnecting to {self.driver.port} (attempt {self.reconnects})")
+        try:
+            await self.driver.reopen()
+            self._transport_lost = False
+        except Exception as e:
+            logger.warning(f"Reconnect to {self.driver.port} failed: {e}")
+        # Backoff keeps growing until a frame actually arrives; jitter avoids lockstep retries
+        self._retry_at = now + self._delay * random.uniform(0.8, 1.2)
+        self._delay = min(self.backoff[1], self._delay * 2)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.tick)
+            now = loop.time()
+            try:
+                self._sample(now)
+                if self._lost_at is not None and self.last_rx > self._lost_at:
+                    logger.info(f"Link {self.driver.port} recovered after {now - self._lost_at:.1f}s")
+                    self._lost_at = None
+                    self._delay = self.backoff[0]
+                    # A reopened (or restarted) gimbal isn't streaming what the session asked for
+                    self._restore = asyncio.create_task(self._restore_stream())
+                status = LINK_LOST if self._lost_at is not None else self._classify(now)
+                if status == LINK_LOST and self._lost_at is None:
+                    self._lost_at = self._retry_at = now
+                self._set_status(status)
+
+                if self._lost_at is not None and now >= self._retry_at:
+                    await self._reconnect(now)
+                elif now - self.last_rx >= self.idle and (self._probe is None or self._probe.done()):
+                    # Quiet link: ask for a reply. Also how a lost UDP link notices it is back
+                    self._probe = asyncio.create_task(self._send_probe())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Link monitor error: {e}")
@@ -0,0 +1,147 @@
+"""
+Logging pipeline that keeps formatting and I/O off the event loop.
+
+Log calls only enqueue the LogRecord (QueueHandler); a QueueListener thread
+formats and writes it. Per-frame traces go to the "siyi.trace" logger,
+which is off unless SIYI_TRACE=1 and rate limited per message template.
+
+Environment:
+    SIYI_LOG_LEVEL   root level (default INFO)
+    SIYI_LOG_FORMAT  "text" (default) or "json", one object per line
+    SIYI_TRACE       1 enables per-frame TX/RX/WS traces
+    SIYI_TRACE_RATE  traces per second per message template (default 20)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from typing import Dict, Optional, Tuple
+
+# Per-frame traces; callers guard with TRACE.isEnabledFor(logging.DEBUG)
+TRACE = logging.getLogger("siyi.trace")
+
+TEXT_FORMAT = "%(levelname)s:%(name)s:%(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class HexBytes:
+    """Defers bytes.hex() until a handler actually formats the record."""
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = bytes(data)
+
+    def __str__(self) -> str:
+        return self.data.hex()
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that enqueues the record as is. The stock prepare() calls
+    format() in the logging thread, which is the cost we want off the loop;
+    the listener formats instead. Records never leave the process, so
+    args and exc_info don't need to be made picklable.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Passes at most `rate` records per `period` seconds for each
+    (logger, message template) pair. The first record after a suppressed
+    stretch reports how many were dropped.
+    """
+    def __init__(self, rate: int = 20, period: float = 1.0):
+        super().__init__()
+        self.rate = rate
+        self.period = period
+        self._windows: Dict[Tuple[str, str], list] = {}  # key -> [window_start, passed, suppressed]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.period:
+            suppressed = window[2] if window else 0
+            window = self._windows[key] = [now, 0, 0]
+            if suppressed:
+                record.suppressed = suppressed
+        if window[1] >= self.rate:
+            window[2] += 1
+            return False
+        window[1] += 1
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} (+{suppressed} suppressed)" if suppressed else text
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg (+ exc, suppressed)."""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        return json.dumps(entry, separators=(",", ":"))
+
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None,
+                  trace: Optional[bool] = None, handler: Optional[logging.Handler] = None):
+    """
+    Routes the root logger through a queue to a listener thread writing to
+    `handler` (stderr by default). Safe to call again; the previous
+    listener is stopped first.
+    """
+    global _listener
+    level = level or os.environ.get("SIYI_LOG_LEVEL", "INFO")
+    fmt = fmt or os.environ.get("SIYI_LOG_FORMAT", "text")
+    if trace is None:
+        trace = os.environ.get("SIYI_TRACE", "0") == "1"
+
+    stop_logging()
+    if handler is None:
+        handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for old in [h for h in root.handlers if isinstance(h, logging.handlers.QueueHandler)]:
+        root.removeHandler(old)
+    root.addHandler(LazyQueueHandler(log_queue))
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+    TRACE.setLevel(logging.DEBUG if trace else logging.WARNING)
+    if not any(isinstance(f, RateLimitFilter) for f in TRACE.filters):
+        TRACE.addFilter(RateLimitFilter(int(os.environ.get("SIYI_TRACE_RATE", "20"))))
+
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Flushes and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -1,144 +1,481 @@
 import asyncio
 import logging
-from typing import Optional
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 import uvicorn
 import os
-import struct
+import json
 
-from .siyi_driver import SiyiDriver
 from .connection import ConnectionManager
+from .registry import DriverRegistry, DEFAULT_DEVICE
+from .remote import RemoteRegistry
+from .binary_codec import decode_command
+from . import metrics
+from .transports import SIYI_UDP_HOST, SIYI_UDP_PORT, TRANSPORTS
+from .logging_setup import setup_logging, TRACE
+from .port_watcher import PortWatcher, SIYI_USB_IDS, parse_usb_ids
+from .autodetect import DetectionCache, detect
+from .siyi_driver import QUERY_NAMES
+from .telemetry import FIELDS, CMD_FIRMWARE, CMD_STATUS
+from .tracing import trace_from
 
-# Configure Logging
-logging.basicConfig(level=logging.INFO)
+# Configure Logging: records are formatted and written off the event loop
+setup_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI()
-driver = SiyiDriver()
-manager = ConnectionManager()
+# New WS clients follow the default device until they subscribe elsewhere
+manager = ConnectionManager(default_topics=(DEFAULT_DEVICE,))
+# With SIYI_DAEMON_SOCKET the drivers run in the driver daemon (python -m
+# backend.daemon) and this process only serves clients, so uvicorn can run
+# several workers; see backend/remote.py
+DAEMON_SOCKET = os.environ.get("SIYI_DAEMON_SOCKET")
+if DAEMON_SOCKET:
+    registry = RemoteRegistry(DAEMON_SOCKET, manager,
+                              state_hz=float(os.environ.get("SIYI_STATE_HZ", "20")),
+                              keyframe_interval=float(os.environ.get("SIYI_KEYFRAME_INTERVAL", "10")))
+else:
+    # One driver per gimbal; SIYI_CONTROL_HZ is the shared control tick for
+    # coalesced gimbal_rate intents, state push is capped at SIYI_STATE_HZ per device
+    registry = DriverRegistry(manager,
+                              control_hz=float(os.environ.get("SIYI_CONTROL_HZ", "50")),
+                              state_hz=float(os.environ.get("SIYI_STATE_HZ", "20")),
+                              keyframe_interval=float(os.environ.get("SIYI_KEYFRAME_INTERVAL", "10")),
+                              # e.g. SIYI_FLIGHT_LOG=/var/log/siyi/{device}.flog records raw link traffic
+                              flight_log_path=os.environ.get("SIYI_FLIGHT_LOG") or None)
+# The unprefixed /api/... routes address this one
+registry.create(DEFAULT_DEVICE)
+metrics.WS_CLIENTS.set_function(lambda: len(manager.active_connections))
+
+# Serial ports are enumerated in a worker thread and cached; with
+# SIYI_AUTOCONNECT=1 the default device connects when a SIYI port appears
+AUTOCONNECT = os.environ.get("SIYI_AUTOCONNECT", "0") == "1"
+AUTOCONNECT_BAUD = int(os.environ.get("SIYI_BAUD", "115200"))
+
+
+async def on_ports_changed(added, removed, ports):
+    await manager.broadcast({"type": "ports", "added": added, "removed": removed, "ports": ports}, droppable=False)
+    driver = registry.get(DEFAULT_DEVICE).driver
+    # Under the driver daemon it auto-connects itself (--autoconnect), not every worker
+    if not AUTOCONNECT or DAEMON_SOCKET or driver.connected:
+        return
+    for port in added:
+        if port["siyi"]:
+            logger.info(f"Auto-connecting to SIYI gimbal on {port['device']}")
+            try:
+                await driver.connect(port["device"], AUTOCONNECT_BAUD)
+            except Exception as e:
+                logger.warning(f"Auto-connect to {port['device']} failed: {e}")
+            break
+
+port_watcher = PortWatcher(interval=float(os.environ.get("SIYI_PORT_SCAN_INTERVAL", "2")),
+                           known_ids=SIYI_USB_IDS | parse_usb_ids(os.environ.get("SIYI_USB_IDS", "")),
+                           on_change=on_ports_changed)
+
+# Last known-good port/baud per device (SIYI_AUTODETECT_CACHE overrides the path)
+autodetect_cache = DetectionCache()
+
+# Client message types counted by name in metrics; anything else is "other"
+WS_MESSAGE_TYPES = ("gimbal_rate", "group_rate", "set_angle", "subscribe", "hello", "state_request", "zoom")
 
 # Pydantic Models
 class ConnectRequest(BaseModel):
-    port: str
+    port: str = ""
     baud: int = 115200
+    transport: str = "serial"  # "serial" or "udp"
+    host: str = SIYI_UDP_HOST
+    udp_port: int = SIYI_UDP_PORT
 
 class RecordRequest(BaseModel):
     action: str  # "start", "stop", "toggle"
 
+class StreamRequest(BaseModel):
+    hz: float  # 0 stops the stream
+
+class AngleRequest(BaseModel):
+    yaw: float
+    pitch: float
+    wait: bool = False  # Reply when the move has finished, with its result
+
+class ScanRequest(BaseModel):
+    steps: List[Dict[str, Any]]  # goto / dwell / photo / raster / sweep, see backend/scan_engine.py
+    repeat: int = 1
+
+class DeviceRequest(BaseModel):
+    id: str
+
+class AutodetectRequest(BaseModel):
+    # Default: free ports with a SIYI USB id (SIYI_USB_IDS), plus the device's cached port
+    ports: Optional[List[str]] = None
+    all_ports: bool = False  # Probe every free serial port instead; writes to unrelated devices
+    connect: bool = True  # Connect the device to what was found
+    timeout: float = 0.25  # Per baud, per port
+
+def get_device(device_id: str):
+    device = registry.get(device_id)
+    if device is None:
+        raise HTTPException(status_code=404, detail=f"Unknown device: {device_id}")
+    return device
+
+def get_or_create_device(device_id: str):
+    try:
+        return registry.get_or_create(device_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # Mount Frontend (Static Files)
 
 
 # Background Task for State Broadcast
 @app.on_event("startup")
 async def startup_event():
-    asyncio.create_task(broadcast_state())
+    registry.start()
+    port_watcher.start()
+    if metrics.METRICS_ENABLED:
+        asyncio.create_task(metrics.monitor_loop_lag())
 
-async def broadcast_state():
-    while True:
-        # Broadcast driver state
-        state_msg = {"type": "state", "payload": driver.state}
-        await manager.broadcast(state_msg)
-        await asyncio.sleep(0.2)  # Update UI at 5Hz
+# REST Endpoints
+@app.get("/api/ports")
+async def list_ports(refresh: bool = False):
+    # Served from the watcher's cache; `refresh` forces a scan (still off the loop)
+    if refresh or not port_watcher.scanned:
+        await port_watcher.refresh(force=True)
+    ports = port_watcher.ports
+    return {"ports": [p["device"] for p in ports], "details": ports}
 
-import serial.tools.list_ports
+@app.get("/metrics")
+async def get_metrics():
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled (SIYI_METRICS=0)")
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
-# ...
+@app.get("/metrics/daemon")
+async def get_daemon_metrics():
+    # Link and control-loop metrics live in the driver daemon's process
+    if not DAEMON_SOCKET:
+        raise HTTPException(status_code=404, detail="No driver daemon (SIYI_DAEMON_SOCKET unset)")
+    try:
+        content = await registry.metrics()
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return Response(content=content, media_type=metrics.CONTENT_TYPE)
 
-# REST Endpoints
-@app.get("/api/ports")
-async def list_ports():
-    ports = serial.tools.list_ports.comports()
-    return {"ports": [p.device for p in ports]}
+@app.get("/api/devices")
+async def list_devices():
+    return {"devices": registry.info()}
+
+@app.post("/api/devices")
+async def add_device(req: DeviceRequest):
+    if req.id in registry:
+        raise HTTPException(status_code=409, detail=f"Device {req.id} already exists")
+    return get_or_create_device(req.id).info()
+
+@app.delete("/api/devices/{device_id}")
+async def remove_device(device_id: str):
+    get_device(device_id)
+    await registry.remove(device_id)
+    return {"status": "removed"}
 
+# Device routes answer both /api/... (default device) and /api/devices/{id}/...
 @app.post("/api/connect")
-async def connect_driver(req: ConnectRequest):
+@app.post("/api/devices/{device_id}/connect")
+async def connect_driver(req: ConnectRequest, device_id: str = DEFAULT_DEVICE):
+    if req.transport not in TRANSPORTS:
+        raise HTTPException(status_code=400, detail=f"Unknown transport: {req.transport}")
+    if req.transport == "serial" and not req.port:
+        raise HTTPException(status_code=400, detail="Serial transport needs a port")
+    driver = get_or_create_device(device_id).driver
     try:
-        await driver.connect(req.port, req.baud)
-        return {"status": "connected", "port": req.port}
+        await driver.connect(req.port, req.baud, transport=req.transport, host=req.host, udp_port=req.udp_port)
+        return {"status": "connected", "port": driver.port, "transport": req.transport, "device": device_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/autodetect")
+@app.post("/api/devices/{device_id}/autodetect")
+async def autodetect(req: AutodetectRequest, device_id: str = DEFAULT_DEVICE):
+    ports = req.ports
+    if ports is None:
+        if not port_watcher.scanned:
+            await port_watcher.refresh(force=True)
+        busy = {d.driver.port for d in registry.devices.values() if d.driver.connected}
+        known = autodetect_cache.get(device_id)
+        # Probing writes a frame at several bauds to each port; don't do that to
+        # arbitrary serial devices unless asked to
+        ports = [p["device"] for p in port_watcher.ports
+                 if p["device"] not in busy and (req.all_ports or p["siyi"] or (known and known["port"] == p["device"]))]
+        if not ports:
+            raise HTTPException(status_code=404, detail="No known SIYI port; list candidate ports or set all_ports")
+    result = await detect(ports, device_id, autodetect_cache, probe_timeout=req.timeout)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No gimbal answered on {len(ports)} port(s)")
+    response = {"detected": result.to_dict(), "connected": False, "device": device_id}
+    if req.connect and result.standard:
+        driver = get_or_create_device(device_id).driver
+        try:
+            await driver.connect(result.port, result.baud)
+            response["connected"] = True
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    return response
+
 @app.post("/api/disconnect")
-async def disconnect_driver():
-    await driver.disconnect()
+@app.post("/api/devices/{device_id}/disconnect")
+async def disconnect_driver(device_id: str = DEFAULT_DEVICE):
+    await get_device(device_id).driver.disconnect()
     return {"status": "disconnected"}
 
+@app.get("/api/clients")
+async def list_clients():
+    return {"clients": manager.stats(), "evicted": manager.evicted}
+
+@app.get("/api/control/stats")
+@app.get("/api/devices/{device_id}/control/stats")
+async def control_stats(device_id: str = DEFAULT_DEVICE):
+    return get_device(device_id).coalescer.stats
+
 @app.post("/api/gimbal/center")
-async def center_gimbal():
+@app.post("/api/devices/{device_id}/gimbal/center")
+async def center_gimbal(device_id: str = DEFAULT_DEVICE):
     # Command ID 0x00?? No, SDK says 0x01 is Center?
     # Research says 0 - Auto Centering
-    success = await driver.send_cmd(0, b'', expect_ack=True)
+    device = get_device(device_id)
+    await device.take_over()
+    success = await device.driver.send_cmd(0, b'', expect_ack=True)
     if not success:
         raise HTTPException(status_code=500, detail="Failed to send command")
     return {"status": "ok"}
 
 @app.post("/api/gimbal/stop")
-async def stop_gimbal():
+@app.post("/api/devices/{device_id}/gimbal/stop")
+async def stop_gimbal(device_id: str = DEFAULT_DEVICE):
     # ID 5 - Stop
-    success = await driver.send_cmd(5, b'', expect_ack=True)
+    device = get_device(device_id)
+    await device.take_over()
+    success = await device.driver.send_cmd(5, b'', expect_ack=True)
     return {"status": "ok"}
 
+@app.post("/api/gimbal/angle")
+@app.post("/api/devices/{device_id}/gimbal/angle")
+async def set_angle(req: AngleRequest, device_id: str = DEFAULT_DEVICE):
+    # Closed loop on the server; the move runs on after this returns unless `wait`
+    device = get_device(device_id)
+    try:
+        await device.scan.abort()
+        done = await device.angle.set_target(req.yaw, req.pitch)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if req.wait:
+        return await done
+    return {"status": "moving", **device.angle.status()}
+
+@app.get("/api/gimbal/angle")
+@app.get("/api/devices/{device_id}/gimbal/angle")
+async def angle_status(device_id: str = DEFAULT_DEVICE):
+    return get_device(device_id).angle.status()
+
+def query_json(result):
+    if hasattr(result, "_asdict"):
+        return result._asdict()
+    if isinstance(result, tuple):
+        return dict(zip(FIELDS, result))  # Attitude
+    return result
+
+@app.get("/api/gimbal/info")
+@app.get("/api/devices/{device_id}/gimbal/info")
+async def gimbal_info(device_id: str = DEFAULT_DEVICE):
+    # Firmware comes from the driver's query cache after the first read
+    driver = get_device(device_id).driver
+    try:
+        firmware, status = await asyncio.gather(driver.query(CMD_FIRMWARE), driver.query(CMD_STATUS))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"firmware": query_json(firmware), "status": status}
+
+@app.get("/api/gimbal/query/{name}")
+@app.get("/api/devices/{device_id}/gimbal/query/{name}")
+async def gimbal_query(name: str, max_age: Optional[float] = None, device_id: str = DEFAULT_DEVICE):
+    if name not in QUERY_NAMES:
+        raise HTTPException(status_code=404, detail=f"Unknown query {name!r}, expected one of {sorted(QUERY_NAMES)}")
+    driver = get_device(device_id).driver
+    try:
+        result = await driver.query(QUERY_NAMES[name], max_age=max_age)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {name: query_json(result)}
+
+@app.post("/api/scan")
+@app.post("/api/devices/{device_id}/scan")
+async def start_scan(req: ScanRequest, device_id: str = DEFAULT_DEVICE):
+    # Runs on the server; progress is pushed to the device's WS clients as "scan" messages
+    scan = get_device(device_id).scan
+    try:
+        await scan.start(req.steps, req.repeat)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return scan.status()
+
+@app.get("/api/scan")
+@app.get("/api/devices/{device_id}/scan")
+async def scan_status(device_id: str = DEFAULT_DEVICE):
+    return get_device(device_id).scan.status()
+
+@app.post("/api/scan/{action}")
+@app.post("/api/devices/{device_id}/scan/{action}")
+async def control_scan(action: str, device_id: str = DEFAULT_DEVICE):
+    scan = get_device(device_id).scan
+    actions = {"pause": scan.pause, "resume": scan.resume, "abort": scan.abort}
+    if action not in actions:
+        raise HTTPException(status_code=404, detail=f"Unknown scan action {action!r}")
+    try:
+        await actions[action]()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return scan.status()
+
+@app.get("/api/gimbal/attitude")
+@app.get("/api/devices/{device_id}/gimbal/attitude")
+async def get_attitude(window: float = 1.0, device_id: str = DEFAULT_DEVICE):
+    driver = get_device(device_id).driver
+    latest = driver.attitude.latest()
+    return {
+        "latest": latest._asdict() if latest else None,
+        "stats": driver.attitude.window_stats(window),
+    }
+
+@app.post("/api/gimbal/attitude/stream")
+@app.post("/api/devices/{device_id}/gimbal/attitude/stream")
+async def attitude_stream(req: StreamRequest, device_id: str = DEFAULT_DEVICE):
+    driver = get_device(device_id).driver
+    try:
+        hz = await driver.request_attitude_stream(req.hz)
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"status": "ok", "hz": hz}
+
 @app.post("/api/camera/photo")
-async def take_photo():
+@app.post("/api/devices/{device_id}/camera/photo")
+async def take_photo(device_id: str = DEFAULT_DEVICE):
     # ID 12 - Take Picture
-    success = await driver.send_cmd(12, b'', expect_ack=True)
+    success = await get_device(device_id).driver.send_cmd(12, b'', expect_ack=True)
     return {"status": "ok"}
 
 @app.post("/api/camera/record")
-async def record_video(req: RecordRequest):
+@app.post("/api/devices/{device_id}/camera/record")
+async def record_video(req: RecordRequest, device_id: str = DEFAULT_DEVICE):
     # ID 13 - Record (Toggle)
     # The protocol only has "Record Video" (13) which usually toggles.
     # We might not be able to enforce "start" vs "stop" without checking state.
     # For now, just send the toggle command.
-    success = await driver.send_cmd(13, b'', expect_ack=True)
+    success = await get_device(device_id).driver.send_cmd(13, b'', expect_ack=True)
     return {"status": "ok", "action": "toggle"}
 
+async def report_angle_result(websocket: WebSocket, device_id: str, done: asyncio.Future):
+    result = await done
+    await manager.send(websocket, {"type": "angle_result", "device": device_id, **result})
+
+async def report_trace(websocket: WebSocket, device_id: str, trace, timeout: float = 5.0):
+    # Echoes the stage timings of a traced command to the client that sent it
+    try:
+        await asyncio.wait_for(asyncio.shield(trace.done), timeout)
+    except asyncio.TimeoutError:
+        trace.finish("timeout")
+    await manager.send(websocket, {"device": device_id, **trace.done.result()})
+
 # WebSocket Endpoint
 @app.websocket("/ws/control")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
+        # Late joiners start from a full snapshot, deltas follow
+        await registry.get(DEFAULT_DEVICE).broadcaster.send_keyframe(websocket)
         while True:
-            data = await websocket.receive_json()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes") is not None:
+                # Binary command record, same semantics as its JSON form
+                try:
+                    data = decode_command(message["bytes"])
+                except ValueError as e:
+                    logger.warning(f"Bad binary WS message: {e}")
+                    continue
+            else:
+                data = json.loads(message["text"])
             msg_type = data.get("type")
-            logger.info(f"WS Recv: {msg_type} {data}")
-            
+            if TRACE.isEnabledFor(logging.DEBUG):
+                TRACE.debug("WS Recv %s %s", msg_type, data)
+            metrics.WS_RECEIVED.labels(msg_type if msg_type in WS_MESSAGE_TYPES else "other").inc()
+
+            # Messages may name a device; binary records and older clients
+            # address the device the client follows
+            device_id = data.get("device") or manager.primary_topic(websocket) or DEFAULT_DEVICE
+            device = registry.get(device_id)
+            if device is None and msg_type not in ("hello", "subscribe", "group_rate"):
+                await manager.send(websocket, {"type": "error", "device": device_id, "detail": "Unknown device"})
+                continue
+
             if msg_type == "gimbal_rate":
                 # {yaw: -1..1, pitch: -1..1, speed: 0..100}
                 yaw = float(data.get("yaw", 0))
                 pitch = float(data.get("pitch", 0))
                 speed = int(data.get("speed", 50))
-                
-                # Discrete Control Logic
-                # Yaw: -1 (Left), 1 (Right) | Pitch: 1 (Up), -1 (Down)
-                # Discrete Control Logic
-                # Yaw: -1 (Left), 1 (Right) | Pitch: 1 (Up), -1 (Down)
-                # Payload: 1 byte for speed (0-100)
-                speed_byte = struct.pack('B', speed) # Use the speed from UI
-                
-                if yaw == 1:
-                     # Rotate Right (ID 3)
-                     await driver.send_cmd(3, speed_byte, expect_ack=False)
-                elif yaw == -1:
-                     # Rotate Left (ID 4)
-                     await driver.send_cmd(4, speed_byte, expect_ack=False)
-                
-                if pitch == 1:
-                     # Rotate Up (ID 1)
-                     await driver.send_cmd(1, speed_byte, expect_ack=False)
-                elif pitch == -1:
-                     # Rotate Down (ID 2)
-                     await driver.send_cmd(2, speed_byte, expect_ack=False)
-                     
-                if yaw == 0 and pitch == 0:
-                     # Stop (ID 5)
-                     await driver.send_cmd(5, b'', expect_ack=False)
-                
+                trace = trace_from(data)
+                if device.angle.active or device.scan.active:
+                    # Manual input takes over from a closed-loop move or scan
+                    await device.take_over()
+                await device.coalescer.submit(yaw, pitch, speed, trace)
+                if trace is not None:
+                    asyncio.create_task(report_trace(websocket, device_id, trace))
+
+            elif msg_type == "set_angle":
+                # {yaw, pitch} in degrees; an angle_result message follows when the move ends
+                try:
+                    await device.scan.abort()
+                    done = await device.angle.set_target(float(data.get("yaw", 0)), float(data.get("pitch", 0)))
+                except RuntimeError as e:
+                    await manager.send(websocket, {"type": "error", "device": device_id, "detail": str(e)})
+                    continue
+                asyncio.create_task(report_angle_result(websocket, device_id, done))
+
+            elif msg_type == "group_rate":
+                # Same intent to several gimbals, flushed on one control tick
+                # {devices: [...], yaw, pitch, speed}
+                missing = await registry.group_rate(data.get("devices", []),
+                                                    float(data.get("yaw", 0)),
+                                                    float(data.get("pitch", 0)),
+                                                    int(data.get("speed", 50)))
+                if missing:
+                    await manager.send(websocket, {"type": "error", "devices": missing, "detail": "Unknown device"})
+
+            elif msg_type == "subscribe":
+                # {devices: [...]}; a keyframe for each starts the new streams
+                device_ids = [d for d in data.get("devices", []) if d in registry]
+                manager.subscribe(websocket, device_ids)
+                for d in device_ids:
+                    await registry.get(d).broadcaster.send_keyframe(websocket)
+                await manager.send(websocket, {"type": "subscribed", "devices": device_ids})
+
+            elif msg_type == "hello":
+                # Format negotiation: {"type": "hello", "format": "json"|"binary"}
+                fmt = data.get("format", "json")
+                if fmt not in ("json", "binary"):
+                    fmt = "json"
+                manager.set_format(websocket, fmt)
+                await manager.send(websocket, {"type": "hello", "format": fmt})
+
+            elif msg_type == "state_request":
+                # Client missed a delta
+                await device.broadcaster.send_keyframe(websocket)
+
             elif msg_type == "zoom":
                 # {action: "in"|"out"|"stop"}
                 action = data.get("action")
+                trace = trace_from(data)
                 cmd_id = None
                 if action == "in":
                     cmd_id = 6 # Zoom +1
@@ -150,10 +487,17 @@ async def websocket_endpoint(websocket: WebSocket):
                     # Or just stop sending zoom commands.
                     pass
                 
+                if trace is not None:
+                    asyncio.create_task(report_trace(websocket, device_id, trace))
+                    if not cmd_id:
+                        trace.finish("no_command")
                 if cmd_id:
-                     await driver.send_cmd(cmd_id, b'', expect_ack=True)
+                     await device.driver.send_cmd(cmd_id, b'', expect_ack=True, trace=trace)
 
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Also covers clients evicted by the manager mid-receive
         manager.disconnect(websocket)
 
 # Mount Frontend (Static Files) - Must be last to avoid capturing API/WS routes
@@ -0,0 +1,318 @@
+"""
+In-process metrics with Prometheus text exposition (served at /metrics).
+
+Everything runs on the event loop thread, so counters are plain integer
+adds on preallocated children: no locks, no allocation after a label set
+is first seen. SIYI_METRICS=0 at startup swaps every metric for a no-op.
+"""
+import asyncio
+import bisect
+import logging
+import math
+import os
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.environ.get("SIYI_METRICS", "1") != "0"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers sub-millisecond local work up to multi-second ACK timeouts
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value) -> str:
+    # Label values may come from clients (device ids); the exposition format needs these escaped
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        """Reads the value from `function` at scrape time instead."""
+        self.function = function
+
+    def get(self) -> float:
+        return self.function() if self.function is not None else self.value
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, object] = {}
+        if not self.labelnames:
+            self._default = self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def remove(self, *values):
+        """Drops the series for `values`, or every series whose leading labels are `values`."""
+        for key in [k for k in self._children if k[:len(values)] == values]:
+            del self._children[key]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._default.value += amount
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default.value = value
+
+    def inc(self, amount: float = 1):
+        self._default.value += amount
+
+    def dec(self, amount: float = 1):
+        self._default.value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        self._default.function = function
+
+    def _render_child(self, values, child):
+        try:
+            value = child.get()
+        except Exception as e:
+            logger.warning(f"Gauge {self.name} callback failed: {e}")
+            return []
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def _render_child(self, values, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), child.counts):
+            cumulative += count
+            le = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class _NullMetric:
+    """Stands in for any metric or child when metrics are disabled."""
+    def labels(self, *values):
+        return self
+
+    def remove(self, *values):
+        pass
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def dec(self, amount: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def set_function(self, function):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+
+_NULL = _NullMetric()
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _add(self, metric: _Metric):
+        if not self.enabled:
+            return _NULL
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry(METRICS_ENABLED)
+
+# Driver link
+TX_FRAMES = REGISTRY.counter("siyi_tx_frames_total", "Frames written to the gimbal link", ("device", "cmd"))
+TX_BYTES = REGISTRY.counter("siyi_tx_bytes_total", "Bytes written to the gimbal link", ("device", "cmd"))
+RX_FRAMES = REGISTRY.counter("siyi_rx_frames_total", "Valid frames received from the gimbal", ("device", "cmd"))
+CRC_FAILURES = REGISTRY.counter("siyi_crc_failures_total", "Received frames with a bad CRC", ("device",))
+RESYNC_BYTES = REGISTRY.counter("siyi_resync_bytes_total", "Received bytes skipped while hunting for a frame", ("device",))
+IN_FLIGHT = REGISTRY.gauge("siyi_ack_in_flight", "Commands waiting for an ACK", ("device",))
+LINK_STATE = REGISTRY.gauge("siyi_link_state", "Link health: 0 down, 1 connected, 2 degraded, 3 lost", ("device",))
+RECONNECTS = REGISTRY.counter("siyi_reconnects_total", "Automatic transport reopen attempts", ("device",))
+DEVICE_METRICS = (TX_FRAMES, TX_BYTES, RX_FRAMES, CRC_FAILURES, RESYNC_BYTES, IN_FLIGHT, LINK_STATE, RECONNECTS)
+
+# ACK window
+ACK_RTT = REGISTRY.histogram("siyi_ack_rtt_seconds", "Command to ACK round trip (first transmissions only)")
+RETRANSMITS = REGISTRY.counter("siyi_retransmits_total", "Command frames sent again after an ACK timeout")
+ACK_FAILURES = REGISTRY.counter("siyi_ack_failures_total", "Commands given up on after all retries")
+
+# WebSocket
+WS_CLIENTS = REGISTRY.gauge("siyi_ws_clients", "Connected WebSocket clients")
+WS_RECEIVED = REGISTRY.counter("siyi_ws_messages_received_total", "WebSocket messages received", ("type",))
+WS_SENT = REGISTRY.counter("siyi_ws_messages_sent_total", "WebSocket messages delivered to clients", ("format",))
+WS_DROPPED = REGISTRY.counter("siyi_ws_messages_dropped_total", "Telemetry messages dropped for slow clients")
+BROADCAST_SECONDS = REGISTRY.histogram("siyi_broadcast_seconds", "Time to encode and queue one broadcast")
+
+# Angle controller
+ANGLE_MOVES = REGISTRY.counter("siyi_angle_moves_total", "Closed-loop angle moves by outcome", ("result",))
+ANGLE_SETTLE_SECONDS = REGISTRY.histogram("siyi_angle_settle_seconds", "Time for an angle move to settle",
+                                          buckets=(0.1, 0.25, 0.5, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0))
+ANGLE_OVERSHOOT_DEGREES = REGISTRY.histogram("siyi_angle_overshoot_degrees", "Worst-axis overshoot of settled moves",
+                                             buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0))
+
+# Scan engine
+SCAN_STEP_ERROR = REGISTRY.histogram("siyi_scan_step_error_seconds", "Scan step start time minus its planned time",
+                                     buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1))
+
+# Command tracing (WS messages carrying a "trace" field)
+TRACE_STAGE = REGISTRY.histogram("siyi_trace_stage_seconds",
+                                 "Per-stage latency of traced commands: coalesce, tx_queue, link, server",
+                                 ("stage",))
+TRACES = REGISTRY.counter("siyi_traces_total", "Traced commands by outcome", ("result",))
+
+# Event loop
+LOOP_LAG = REGISTRY.histogram("siyi_event_loop_lag_seconds", "Delay of a timer callback past its deadline")
+
+
+async def monitor_loop_lag(interval: float = 0.25):
+    """Samples event-loop lag: how late a sleep(interval) wakes up."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
+
+
+def remove_device(device_id: str):
+    """Stops exporting a removed device's series."""
+    for metric in DEVICE_METRICS:
+        metric.remove(device_id)
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# USB VID:PID pairs treated as a SIYI gimbal. The UART-over-USB of the
+# A8 mini / ZR10 enumerates as the STM32 virtual COM port; extend with
+# SIYI_USB_IDS="0483:5740,10c4:ea60" for other adapters.
+SIYI_USB_IDS = {(0x0483, 0x5740)}
+
+# Directory whose mtime changes whenever a device node appears or goes away
+DEV_DIR = "/dev"
+
+
+def parse_usb_ids(text: str) -> set:
+    ids = set()
+    for item in text.split(","):
+        item = item.strip()
+        if item:
+            vid, pid = item.split(":")
+            ids.add((int(vid, 16), int(pid, 16)))
+    return ids
+
+
+def _comports() -> list:
+    # Imported here so the UDP-only setup works without pyserial installed
+    import serial.tools.list_ports
+    return serial.tools.list_ports.comports()
+
+
+def _dev_fingerprint() -> Optional[int]:
+    try:
+        return os.stat(DEV_DIR).st_mtime_ns
+    except OSError:
+        return None  # No /dev (Windows): every scan enumerates
+
+
+class PortWatcher:
+    """
+    Background serial port discovery. Enumerating ports walks sysfs (or
+    the registry on Windows) and can take tens of milliseconds, so scans
+    run in the default thread pool and `ports` serves the cached result.
+    A periodic scan first compares the mtime of /dev and skips the
+    enumeration when no device node was added or removed.
+
+    `on_change(added, removed, ports)` is awaited after every scan that
+    changed the list; entries are the dicts from `ports`.
+    """
+    def __init__(self, interval: float = 2.0, known_ids: Iterable[Tuple[int, int]] = SIYI_USB_IDS,
+                 on_change: Optional[Callable[[List[dict], List[dict], List[dict]], Awaitable[None]]] = None,
+                 lister: Callable[[], list] = _comports, fingerprint: Callable[[], Optional[int]] = _dev_fingerprint):
+        self.interval = interval
+        self.known_ids = set(known_ids)
+        self.on_change = on_change
+        self.lister = lister
+        self.fingerprint = fingerprint
+        self.scanned = False  # At least one enumeration done
+        self.scans = 0  # Full enumerations, for stats/tests
+        self._ports: Dict[str, dict] = {}
+        self._fingerprint: Optional[int] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ports(self) -> List[dict]:
+        return sorted(self._ports.values(), key=lambda p: (not p["siyi"], p["device"]))
+
+    def describe(self, port) -> Dict[str, Any]:
+        vid, pid = getattr(port, "vid", None), getattr(port, "pid", None)
+        return {
+            "device": port.device,
+            "description": getattr(port, "description", None),
+            "hwid": getattr(port, "hwid", None),
+            "vid": f"{vid:04x}" if vid is not None else None,
+            "pid": f"{pid:04x}" if pid is not None else None,
+            "serial_number": getattr(port, "serial_number", None),
+            "manufacturer": getattr(port, "manufacturer", None),
+            "siyi": (vid, pid) in self.known_ids,
+        }
+
+    def _scan(self, previous: Optional[int], force: bool):
+        # Runs in a worker thread
+        fingerprint = self.fingerprint()
+        if not force and fingerprint is not None and fingerprint == previous:
+            return None
+        return fingerprint, [self.describe(p) for p in self.lister()]
+
+    async def refresh(self, force: bool = False) -> Tuple[List[dict], List[dict]]:
+        """Rescans (off the loop) and returns (added, removed)."""
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(None, self._scan, self._fingerprint, force or not self.scanned)
+            if result is None:
+                return [], []
+            self._fingerprint, found = result
+            self.scanned = True
+            self.scans += 1
+            current = {p["device"]: p for p in found}
+            added = [p for device, p in current.items() if device not in self._ports]
+            removed = [p for device, p in self._ports.items() if device not in current]
+            self._ports = current
+        for port in added:
+            logger.info(f"Serial port added: {port['device']} ({port['description']})" + (" [SIYI]" if port["siyi"] else ""))
+        for port in removed:
+            logger.info(f"Serial port removed: {port['device']}")
+        if (added or removed) and self.on_change:
+            try:
+                await self.on_change(added, removed, self.ports)
+            except Exception as e:
+                logger.error(f"Port change handler failed: {e}")
+        return added, removed
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Serial port scan failed: {e}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import re
+from typing import Dict, Iterable, List, Optional
+
+from . import metrics
+from .siyi_driver import SiyiDriver
+from .coalescer import RateCoalescer
+from .angle_control import AngleController
+from .scan_engine import ScanEngine
+from .state_broadcast import StateBroadcaster
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEVICE = "default"
+# Device ids end up in file names (state blocks, flight logs) and metric labels
+DEVICE_ID = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+
+def check_device_id(device_id: str):
+    if not isinstance(device_id, str) or not DEVICE_ID.fullmatch(device_id):
+        raise ValueError(f"Invalid device id {device_id!r}: use 1-64 letters, digits, '_' or '-'")
+
+
+class Device:
+    """
+    One gimbal: its driver plus the per-device rate coalescer, angle
+    controller, scan engine and state broadcaster.
+    """
+    def __init__(self, device_id: str, manager, control_hz: float, state_hz: float, keyframe_interval: float,
+                 flight_log_path: Optional[str] = None):
+        self.id = device_id
+        self.driver = SiyiDriver(device_id=device_id)
+        self.coalescer = RateCoalescer(self.driver, hz=control_hz)
+        self.angle = AngleController(self.driver, hz=control_hz)
+        # Progress goes to the clients following this device
+        self.scan = ScanEngine(self.driver, self.angle,
+                               on_event=lambda message: manager.broadcast(dict(message, device=device_id),
+                                                                          droppable=False, topic=device_id))
+        self.broadcaster = StateBroadcaster(self.driver.state, manager, max_hz=state_hz,
+                                            keyframe_interval=keyframe_interval, device_id=device_id)
+        if flight_log_path:
+            self.driver.start_recording(flight_log_path.format(device=device_id))
+
+    async def take_over(self):
+        """Manual input (rates, center, stop) ends a running scan and any closed-loop move."""
+        await self.scan.abort()
+        await self.angle.cancel(stop=False)
+
+    def info(self) -> Dict[str, object]:
+        return {
+            "id": self.id,
+            "connected": self.driver.connected,
+            "transport": self.driver.link_type,
+            "port": self.driver.port,
+        }
+
+
+class DriverRegistry:
+    """
+    All gimbals served by this process, in one event loop.
+
+    Each device has its own SiyiDriver (seq space, ACK window, transmit
+    scheduler). Rate coalescers of all devices are flushed by a single
+    control tick, so a group command reaches every gimbal in the same tick.
+
+    `flight_log_path` (may contain "{device}") records each driver's raw link
+    traffic, see backend.flightlog.
+    """
+    def __init__(self, manager, control_hz: float = 50.0, state_hz: float = 20.0, keyframe_interval: float = 10.0,
+                 flight_log_path: Optional[str] = None):
+        self.manager = manager
+        self.control_hz = control_hz
+        self.state_hz = state_hz
+        self.keyframe_interval = keyframe_interval
+        self.flight_log_path = flight_log_path
+        self.devices: Dict[str, Device] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._started = False
+
+    def __contains__(self, device_id: str) -> bool:
+        return device_id in self.devices
+
+    def get(self, device_id: str) -> Optional[Device]:
+        return self.devices.get(device_id)
+
+    def create(self, device_id: str) -> Device:
+        check_device_id(device_id)
+        if device_id in self.devices:
+            raise ValueError(f"Device {device_id!r} already exists")
+        device = Device(device_id, self.manager, self.control_hz, self.state_hz, self.keyframe_interval,
+                        self.flight_log_path)
+        self.devices[device_id] = device
+        if self._started:
+            device.broadcaster.start()
+        logger.info(f"Added device {device_id}")
+        return device
+
+    def get_or_create(self, device_id: str) -> Device:
+        return self.devices.get(device_id) or self.create(device_id)
+
+    async def remove(self, device_id: str):
+        device = self.devices.pop(device_id, None)
+        if device is None:
+            return
+        await device.broadcaster.stop()
+        await device.scan.abort()
+        await device.angle.cancel(stop=device.driver.connected)
+        if device.driver.connected:
+            await device.driver.disconnect()
+        device.driver.stop_recording()
+        metrics.remove_device(device_id)
+        logger.info(f"Removed device {device_id}")
+
+    def info(self) -> List[Dict[str, object]]:
+        return [device.info() for device in self.devices.values()]
+
+    async def group_rate(self, device_ids: Iterable[str], yaw: float, pitch: float, speed: int) -> List[str]:
+        """
+        Submits the same motion intent to several devices; they all go out
+        on the next control tick (stops immediately). Like any manual input it
+        ends their scans and angle moves first. Returns unknown ids.
+        """
+        missing = [d for d in device_ids if d not in self.devices]
+        targets = [self.devices[d] for d in device_ids if d in self.devices]
+        await asyncio.gather(*(d.take_over() for d in targets))
+        # Stops are sent from submit(); gather so they leave together too
+        await asyncio.gather(*(d.coalescer.submit(yaw, pitch, speed) for d in targets))
+        return missing
+
+    def start(self):
+        self._started = True
+        for device in self.devices.values():
+            device.broadcaster.start()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._control_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for device in list(self.devices.values()):
+            await device.broadcaster.stop()
+        self._started = False
+
+    async def _control_loop(self):
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / self.control_hz
+        next_tick = loop.time()
+        while True:
+            devices = list(self.devices.values())
+            results = await asyncio.gather(*(d.coalescer.flush() for d in devices), return_exceptions=True)
+            for device, result in zip(devices, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Rate flush error on {device.id}: {result}")
+            next_tick += interval
+            delay = next_tick - loop.time()
+            if delay < 0:
+                # Fell behind (e.g. a slow write); realign instead of bursting
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
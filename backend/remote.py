@@ -0,0 +1,489 @@
+"""
+Worker side of the driver daemon (backend.daemon).
+
+RemoteRegistry has the DriverRegistry interface main.py uses, with
+devices whose driver, coalescer, angle controller and scan engine are
+proxies: commands go to the daemon over its Unix socket, synchronous
+reads (connected, status(), stats, latest attitude) come from the
+device's shared-memory snapshot. Each worker mirrors the snapshot's
+driver state into a local StateStore, so its own StateBroadcaster sends
+the usual keyframes and deltas to the WS clients it serves.
+"""
+import asyncio
+import itertools
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .daemon import ERROR_KINDS, encode
+from .registry import check_device_id
+from .shm_state import SeqlockReader
+from .state_broadcast import StateBroadcaster, StateStore
+from .telemetry import AttitudeSample
+from .tracing import Trace
+
+logger = logging.getLogger(__name__)
+
+
+class DaemonClient:
+    """One connection to the daemon: request/reply by id, plus pushed messages."""
+    def __init__(self, path: str, on_message=None):
+        self.path = path
+        self.on_message = on_message
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._finals: Dict[int, asyncio.Future] = {}
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self):
+        reader, self._writer = await asyncio.open_unix_connection(self.path, limit=1 << 22)
+        self._task = asyncio.create_task(self._read_loop(reader))
+        logger.info(f"Connected to driver daemon at {self.path}")
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def call(self, op: str, device: Optional[str] = None, **args) -> Any:
+        """Runs `op` in the daemon and returns its result; its exception is raised here."""
+        result, _ = await self._request(op, device, args, final=False)
+        return result
+
+    async def call_final(self, op: str, device: Optional[str] = None, **args) -> Tuple[Any, asyncio.Future]:
+        """For ops that reply twice: the first result and a future for the final one."""
+        return await self._request(op, device, args, final=True)
+
+    def notify(self, op: str, device: Optional[str] = None, **args):
+        """Fire-and-forget; dropped (and logged) while the daemon is unreachable."""
+        if not self.connected:
+            logger.debug(f"Daemon unreachable, dropped {op}")
+            return
+        self._writer.write(encode({"op": op, "device": device, "args": args}))
+
+    async def _request(self, op: str, device: Optional[str], args: Dict[str, Any], final: bool):
+        if not self.connected:
+            raise RuntimeError("Driver daemon not connected")
+        loop = asyncio.get_running_loop()
+        request_id = next(self._ids)
+        reply = self._pending[request_id] = loop.create_future()
+        # Kept here: the final reply can arrive (and be popped) before we resume
+        done = None
+        if final:
+            done = self._finals[request_id] = loop.create_future()
+        self._writer.write(encode({"id": request_id, "op": op, "device": device, "args": args}))
+        try:
+            result = await reply
+        except BaseException:
+            self._pending.pop(request_id, None)
+            self._finals.pop(request_id, None)
+            raise
+        return result, done
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                request_id = message.get("id")
+                if request_id is None:
+                    if self.on_message is not None:
+                        self.on_message(message)
+                elif "final" in message:
+                    final = self._finals.pop(request_id, None)
+                    if final is not None and not final.done():
+                        final.set_result(message["final"])
+                else:
+                    reply = self._pending.pop(request_id, None)
+                    if reply is None or reply.done():
+                        continue
+                    if "error" in message:
+                        reply.set_exception(ERROR_KINDS.get(message.get("kind"), RuntimeError)(message["error"]))
+                    else:
+                        reply.set_result(message["result"])
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Driver daemon connection error: {e}")
+        finally:
+            logger.warning("Lost the driver daemon connection")
+            if self._writer is not None:
+                self._writer.close()
+            for reply in self._pending.values():
+                if not reply.done():
+                    reply.set_exception(RuntimeError("Driver daemon connection lost"))
+            for final in self._finals.values():
+                if not final.done():
+                    final.set_result({"status": "error", "error": "Driver daemon connection lost"})
+            self._pending.clear()
+            self._finals.clear()
+
+
+def trace_args(trace: Trace) -> Dict[str, Any]:
+    return {"id": trace.id, "marks": trace.marks}
+
+
+def _follow(trace: Trace, final: asyncio.Future):
+    """Completes a worker-side trace with the report the daemon finished it with."""
+    def done(future: asyncio.Future):
+        report = future.result()
+        if trace.done.done():
+            return
+        if report.get("type") != "trace":
+            trace.finish("error")  # Lost the daemon before the command finished
+        else:
+            trace.done.set_result(dict(report, id=trace.id, client_ts=trace.client_ts))
+    final.add_done_callback(done)
+
+
+class RemoteAttitude:
+    def __init__(self, device: "RemoteDevice"):
+        self.device = device
+
+    def latest(self) -> Optional[AttitudeSample]:
+        sample = self.device.snapshot.get("attitude")
+        return AttitudeSample(**sample) if sample else None
+
+    def window_stats(self, seconds: float, now: Optional[float] = None) -> Dict[str, object]:
+        # Published for a fixed one second window
+        return self.device.snapshot.get("attitude_stats") or {"count": 0, "window": 1.0}
+
+
+class RemoteDriver:
+    def __init__(self, device: "RemoteDevice"):
+        self.device = device
+        self.attitude = RemoteAttitude(device)
+
+    @property
+    def state(self) -> StateStore:
+        return self.device.state
+
+    @property
+    def connected(self) -> bool:
+        return bool(self.device.info().get("connected"))
+
+    @property
+    def port(self) -> str:
+        return self.device.info().get("port", "")
+
+    @property
+    def link_type(self) -> str:
+        return self.device.info().get("transport", "serial")
+
+    async def connect(self, port: str = "", baud: int = 115200, transport: str = "serial", **kwargs):
+        info = await self.device.call("connect", port=port, baud=baud, transport=transport, **kwargs)
+        self.device.snapshot["info"] = info
+
+    async def disconnect(self):
+        await self.device.call("disconnect")
+        self.device.snapshot["info"] = dict(self.device.info(), connected=False)
+
+    async def send_cmd(self, cmd_id: int, payload: bytes = b'', expect_ack: bool = True,
+                       timeout: Optional[float] = None, retries: int = 3, priority: Optional[int] = None,
+                       trace: Optional[Trace] = None) -> bool:
+        # Like SiyiDriver.send_cmd, failures (here: no daemon) return False
+        args = dict(cmd_id=cmd_id, payload=payload.hex(), expect_ack=expect_ack, timeout=timeout, retries=retries,
+                    priority=priority)
+        try:
+            if trace is None:
+                return await self.device.call("send_cmd", **args)
+            ok, final = await self.device.client.call_final("send_cmd", self.device.id, trace=trace_args(trace),
+                                                            **args)
+        except RuntimeError as e:
+            logger.error(f"Error sending command: {e}")
+            if trace is not None:
+                trace.finish("error")
+            return False
+        _follow(trace, final)
+        return ok
+
+    async def query(self, cmd_id: int, max_age: Optional[float] = None, timeout: Optional[float] = None,
+                    retries: int = 2) -> Any:
+        """Same as SiyiDriver.query, but decoded results arrive as dicts."""
+        return await self.device.call("query", cmd_id=cmd_id, max_age=max_age, timeout=timeout, retries=retries)
+
+    async def request_attitude_stream(self, hz: float) -> int:
+        return await self.device.call("attitude_stream", hz=hz)
+
+
+class RemoteCoalescer:
+    def __init__(self, device: "RemoteDevice"):
+        self.device = device
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return self.device.snapshot.get("control", {})
+
+    async def submit(self, yaw: float, pitch: float, speed: int, trace: Optional[Trace] = None):
+        # Coalesced in the daemon: no point waiting for each intent's reply
+        if trace is None:
+            self.device.client.notify("rate", self.device.id, yaw=yaw, pitch=pitch, speed=speed)
+            return
+        try:
+            _, final = await self.device.client.call_final("rate", self.device.id, yaw=yaw, pitch=pitch, speed=speed,
+                                                           trace=trace_args(trace))
+        except RuntimeError:
+            trace.finish("error")
+            return
+        _follow(trace, final)
+
+
+class RemoteAngle:
+    def __init__(self, device: "RemoteDevice"):
+        self.device = device
+
+    @property
+    def active(self) -> bool:
+        return bool(self.status().get("active"))
+
+    def status(self) -> Dict[str, Any]:
+        return self.device.snapshot.get("angle") or {"active": False, "target": None, "last_result": None}
+
+    async def set_target(self, yaw: float, pitch: float) -> asyncio.Future:
+        status, done = await self.device.client.call_final("set_angle", self.device.id, yaw=yaw, pitch=pitch)
+        self.device.snapshot["angle"] = status
+        return done
+
+    async def cancel(self, stop: bool = True, reason: str = "cancelled"):
+        self.device.snapshot["angle"] = await self.device.call("cancel_angle", stop=stop, reason=reason)
+
+
+class RemoteScan:
+    def __init__(self, device: "RemoteDevice"):
+        self.device = device
+
+    @property
+    def state(self) -> str:
+        return self.status().get("state", "idle")
+
+    @property
+    def active(self) -> bool:
+        return self.state in ("running", "paused")
+
+    def status(self) -> Dict[str, Any]:
+        return self.device.snapshot.get("scan") or {"state": "idle"}
+
+    async def _op(self, op: str, **args):
+        self.device.snapshot["scan"] = await self.device.call(op, **args)
+
+    async def start(self, steps: List[Dict[str, Any]], repeat: int = 1):
+        await self._op("scan_start", steps=steps, repeat=repeat)
+
+    async def pause(self):
+        await self._op("scan_pause")
+
+    async def resume(self):
+        await self._op("scan_resume")
+
+    async def abort(self):
+        await self._op("scan_abort")
+
+
+class RemoteDevice:
+    """A daemon-owned gimbal as seen from a worker."""
+    def __init__(self, device_id: str, client: DaemonClient, manager, state_hz: float, keyframe_interval: float):
+        self.id = device_id
+        self.client = client
+        self.snapshot: Dict[str, Any] = {}
+        self.state = StateStore()
+        self.driver = RemoteDriver(self)
+        self.coalescer = RemoteCoalescer(self)
+        self.angle = RemoteAngle(self)
+        self.scan = RemoteScan(self)
+        self.broadcaster = StateBroadcaster(self.state, manager, max_hz=state_hz,
+                                            keyframe_interval=keyframe_interval, device_id=device_id)
+        self._reader: Optional[SeqlockReader] = None
+        self._seq = -1
+
+    async def call(self, op: str, **args) -> Any:
+        return await self.client.call(op, self.id, **args)
+
+    async def take_over(self):
+        await self.call("take_over")
+
+    def info(self) -> Dict[str, object]:
+        return self.snapshot.get("info") or {"id": self.id, "connected": False, "transport": "serial", "port": ""}
+
+    def attach(self, path: str):
+        """(Re)maps the device's state block, e.g. after the daemon restarted."""
+        self.detach()
+        self._reader = SeqlockReader(path)
+        self._seq = -1
+        self.poll()
+
+    def detach(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self.snapshot.get("info"):
+            self.snapshot["info"] = dict(self.snapshot["info"], connected=False)
+        if "connected" in self.state:
+            self.state["connected"] = False
+
+    def poll(self):
+        """Takes the newest snapshot if one was published since the last poll."""
+        if self._reader is None:
+            return
+        self._seq, snapshot = self._reader.read(self._seq)
+        if snapshot is not None:
+            self.snapshot = snapshot
+            self.state.update(snapshot["state"])
+
+
+class RemoteRegistry:
+    """
+    DriverRegistry stand-in for web workers when the drivers run in the
+    daemon. Devices appear as the daemon reports them; create() attaches
+    locally right away and has the daemon create the device on the next
+    round trip. The connection is retried every `retry` seconds.
+    """
+    def __init__(self, socket_path: str, manager, state_hz: float = 20.0, keyframe_interval: float = 10.0,
+                 poll_hz: float = 100.0, retry: float = 1.0):
+        self.manager = manager
+        self.state_hz = state_hz
+        self.keyframe_interval = keyframe_interval
+        self.poll_interval = 1.0 / poll_hz
+        self.retry = retry
+        self.client = DaemonClient(socket_path, on_message=self._on_message)
+        self.devices: Dict[str, RemoteDevice] = {}
+        self._attached: Dict[str, str] = {}  # device id -> block path
+        self._task: Optional[asyncio.Task] = None
+        self._started = False
+        self._ready = asyncio.Event()
+
+    def __contains__(self, device_id: str) -> bool:
+        return device_id in self.devices
+
+    def get(self, device_id: str) -> Optional[RemoteDevice]:
+        return self.devices.get(device_id)
+
+    def create(self, device_id: str) -> RemoteDevice:
+        check_device_id(device_id)
+        if device_id in self.devices:
+            raise ValueError(f"Device {device_id!r} already exists")
+        device = self._add(device_id)
+        if self.client.connected:
+            asyncio.create_task(self._ensure(device_id))
+        return device
+
+    def get_or_create(self, device_id: str) -> RemoteDevice:
+        return self.devices.get(device_id) or self.create(device_id)
+
+    async def remove(self, device_id: str):
+        if device_id not in self.devices:
+            return
+        await self.client.call("remove", device_id)
+        await self._drop(device_id)
+
+    def info(self) -> List[Dict[str, object]]:
+        return [device.info() for device in self.devices.values()]
+
+    async def group_rate(self, device_ids: Iterable[str], yaw: float, pitch: float, speed: int) -> List[str]:
+        return await self.client.call("group_rate", devices=list(device_ids), yaw=yaw, pitch=pitch, speed=speed)
+
+    async def metrics(self) -> str:
+        """The daemon's own metrics (link, ACK window, control loop)."""
+        return await self.client.call("metrics")
+
+    async def wait_ready(self, timeout: Optional[float] = None):
+        """Waits until the daemon is connected and the device list synced."""
+        await asyncio.wait_for(self._ready.wait(), timeout)
+
+    def start(self):
+        self._started = True
+        for device in self.devices.values():
+            device.broadcaster.start()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.client.close()
+        for device in self.devices.values():
+            await device.broadcaster.stop()
+            device.detach()
+        self._started = False
+
+    def _add(self, device_id: str) -> RemoteDevice:
+        device = RemoteDevice(device_id, self.client, self.manager, self.state_hz, self.keyframe_interval)
+        self.devices[device_id] = device
+        if self._started:
+            device.broadcaster.start()
+        return device
+
+    async def _drop(self, device_id: str):
+        device = self.devices.pop(device_id, None)
+        self._attached.pop(device_id, None)
+        if device is not None:
+            await device.broadcaster.stop()
+            device.detach()
+
+    def _attach(self, device_id: str, path: str):
+        device = self.devices.get(device_id) or self._add(device_id)
+        if self._attached.get(device_id) != path or device._reader is None:
+            device.attach(path)
+            self._attached[device_id] = path
+
+    async def _ensure(self, device_id: str):
+        try:
+            entry = await self.client.call("ensure", device_id)
+        except RuntimeError as e:
+            logger.warning(f"Daemon could not create {device_id}: {e}")
+            return
+        if device_id in self.devices:
+            self._attach(entry["id"], entry["shm"])
+
+    def _on_message(self, message: Dict[str, Any]):
+        if "devices" in message:
+            listed = {entry["id"]: entry["shm"] for entry in message["devices"]}
+            for device_id, path in listed.items():
+                self._attach(device_id, path)
+            for device_id in [d for d in self._attached if d not in listed]:
+                asyncio.create_task(self._drop(device_id))  # Removed through another worker
+        elif "event" in message:
+            asyncio.create_task(self.manager.broadcast(message["event"], droppable=False, topic=message["topic"]))
+
+    async def _run(self):
+        warned = False
+        while True:
+            if not self.client.connected:
+                self._ready.clear()
+                self._attached.clear()
+                for device in self.devices.values():
+                    device.detach()
+                try:
+                    await self.client.connect()
+                    self._on_message({"devices": await self.client.call("devices")})
+                    # Devices created here before the daemon was reachable
+                    await asyncio.gather(*(self._ensure(d) for d in list(self.devices)))
+                    self._ready.set()
+                    warned = False
+                except (OSError, RuntimeError) as e:
+                    if not warned:
+                        logger.warning(f"Driver daemon unreachable at {self.client.path}: {e}; retrying")
+                        warned = True
+                    await asyncio.sleep(self.retry)
+                    continue
+            for device in list(self.devices.values()):
+                try:
+                    device.poll()
+                except Exception as e:
+                    logger.error(f"State block read error on {device.id}: {e}")
+            await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,150 @@
+"""
+Replays a flight log through the protocol stack for offline analysis.
+
+RX bytes go through the same receive path as in the field (SerialProtocol
+for serial chunks, DatagramLink for UDP datagrams) into a disconnected
+SiyiDriver, so its state, attitude history and counters end up where they
+were in the field. TX frames are decoded too and matched
+with the ACKs that answered them to get the recorded RTTs.
+
+    python -m backend.replay flight.log [--speed 1] [--start S] [--end S] [--frames] [--json]
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, Optional
+
+from .flightlog import KINDS, RX, RX_DATAGRAM, TX, FlightLogReader
+from .siyi_driver import SiyiDriver, SerialProtocol
+from .siyi_protocol import FrameParser, SiyiPacket
+from .transports import DatagramLink
+
+
+def _percentile(ordered, p):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class Replay:
+    """
+    Feeds recorded traffic into `driver` (a fresh SiyiDriver by default).
+    `on_frame(t, kind, packet)` sees every decoded frame in order.
+    """
+    def __init__(self, driver: Optional[SiyiDriver] = None, on_frame=None):
+        self.driver = driver or SiyiDriver()
+        self.on_frame = on_frame
+        self._t = 0.0
+        self.rx = SerialProtocol(self._on_rx_packet, self.driver._on_parser_stats)
+        self.rx_datagrams = DatagramLink(self._on_rx_packet, self.driver._on_parser_stats)
+        self.tx = FrameParser(self._on_tx_packet)
+        self.frames = {TX: 0, RX: 0}
+        self.cmd_counts: Dict[str, int] = {}
+        self._sent_at: Dict[int, float] = {}  # seq -> first TX time, for frames that asked for an ACK
+        self.rtts = []
+        self.retransmits = 0
+        self.unanswered = 0
+
+    def _on_tx_packet(self, packet: SiyiPacket):
+        self.frames[TX] += 1
+        key = f"TX 0x{packet.cmd_id:02x}"
+        self.cmd_counts[key] = self.cmd_counts.get(key, 0) + 1
+        if packet.need_ack:
+            if packet.seq in self._sent_at:
+                self.retransmits += 1
+            else:
+                self._sent_at[packet.seq] = self._t
+        if self.on_frame:
+            self.on_frame(self._t, TX, packet)
+
+    def _on_rx_packet(self, packet: SiyiPacket):
+        self.frames[RX] += 1
+        key = f"RX 0x{packet.cmd_id:02x}"
+        self.cmd_counts[key] = self.cmd_counts.get(key, 0) + 1
+        if packet.is_ack:
+            sent_at = self._sent_at.pop(packet.seq, None)
+            if sent_at is not None:
+                self.rtts.append(self._t - sent_at)
+        self.driver._on_packet_received(packet)
+        if self.on_frame:
+            self.on_frame(self._t, RX, packet)
+
+    def feed(self, t: float, kind: int, data):
+        self._t = t
+        if kind == TX:
+            self.tx.feed(data)
+        elif kind == RX:
+            self.rx.data_received(data)
+        elif kind == RX_DATAGRAM:
+            self.rx_datagrams.datagram_received(bytes(data), None)
+
+    async def run(self, reader: FlightLogReader, speed: Optional[float] = None,
+                  start: float = 0.0, end: Optional[float] = None):
+        """Replays [start, end); `speed` 1.0 is real time, None is as fast as possible."""
+        loop = asyncio.get_running_loop()
+        origin = loop.time()
+        for t, kind, data in reader.records(start, end):
+            if speed:
+                delay = origin + (t - start) / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self.feed(t, kind, data)
+        self.unanswered = len(self._sent_at)
+
+    def summary(self) -> Dict[str, Any]:
+        rtts = sorted(self.rtts)
+        parser, link = self.rx.parser, self.rx_datagrams
+        state = dict(self.driver.state)
+        state.pop("tx_queue", None)
+        return {
+            "frames": {KINDS[k]: v for k, v in self.frames.items()},
+            "commands": dict(sorted(self.cmd_counts.items())),
+            "rx_crc_failures": parser.crc_failures + link.crc_failures,
+            "rx_resync_bytes": parser.resync_bytes + link.resync_bytes,
+            "retransmits": self.retransmits,
+            "unanswered": self.unanswered,
+            "rtt_ms": {f"p{p}": round(_percentile(rtts, p) * 1000, 2) if rtts else None for p in (50, 90, 99)},
+            "attitude_samples": len(self.driver.attitude),
+            "state": state,
+        }
+
+
+async def replay_file(path: str, speed: Optional[float] = None, start: float = 0.0,
+                      end: Optional[float] = None, on_frame=None) -> Dict[str, Any]:
+    with FlightLogReader(path) as reader:
+        replay = Replay(on_frame=on_frame)
+        started = time.perf_counter()
+        await replay.run(reader, speed, start, end)
+        result = replay.summary()
+        result["duration_s"] = round(reader.duration, 3)
+        result["replay_s"] = round(time.perf_counter() - started, 3)
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a SIYI flight log")
+    parser.add_argument("path")
+    parser.add_argument("--speed", type=float, default=0.0, help="1 = real time, 0 = as fast as possible")
+    parser.add_argument("--start", type=float, default=0.0, help="seconds into the recording")
+    parser.add_argument("--end", type=float, default=None)
+    parser.add_argument("--frames", action="store_true", help="print every decoded frame")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    def print_frame(t, kind, packet):
+        flag = "ack" if packet.is_ack else "cmd"
+        print(f"{t:10.6f} {KINDS[kind]} {flag} seq={packet.seq} cmd=0x{packet.cmd_id:02x} "
+              f"payload={packet.payload.hex()}")
+
+    result = asyncio.run(replay_file(args.path, args.speed or None, args.start, args.end,
+                                     print_frame if args.frames else None))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        for key, value in result.items():
+            print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
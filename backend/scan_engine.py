@@ -0,0 +1,287 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from . import metrics
+from .coalescer import CMD_STOP
+
+logger = logging.getLogger(__name__)
+
+CMD_PHOTO = 12
+
+STEP_TYPES = ("goto", "dwell", "photo")
+PATTERN_TYPES = ("raster", "sweep")
+
+# Move outcomes that end the program: someone else took the gimbal, or it stopped answering
+FATAL_MOVES = ("superseded", "cancelled", "no_feedback", "error")
+
+
+def _pair(step: Dict[str, Any], key: str) -> List[float]:
+    value = step.get(key)
+    if not isinstance(value, (list, tuple)) or len(value) != 2:
+        raise ValueError(f"{step['type']}: '{key}' must be [from, to]")
+    return [float(value[0]), float(value[1])]
+
+
+def _linspace(start: float, end: float, count: int) -> List[float]:
+    if count == 1:
+        return [(start + end) / 2]
+    return [start + (end - start) * i / (count - 1) for i in range(count)]
+
+
+def _point(yaw: float, pitch: float, dwell: float, photo: bool) -> List[Dict[str, Any]]:
+    steps = [{"type": "goto", "yaw": yaw, "pitch": pitch}]
+    if dwell > 0:
+        steps.append({"type": "dwell", "seconds": dwell})
+    if photo:
+        steps.append({"type": "photo"})
+    return steps
+
+
+def expand(steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Validates a program and expands patterns into goto/dwell/photo steps.
+
+    goto   {yaw, pitch}
+    dwell  {seconds}
+    photo  {}
+    raster {yaw: [from, to], pitch: [from, to], rows, cols, dwell=0, photo=false}
+           serpentine grid, row by row from the first pitch
+    sweep  {yaw: [from, to], pitch, cycles=1, dwell=0, photo=false}
+           back and forth between the two yaw ends
+    """
+    program = []
+    for step in steps:
+        kind = step.get("type")
+        if kind == "goto":
+            program.append({"type": "goto", "yaw": float(step["yaw"]), "pitch": float(step["pitch"])})
+        elif kind == "dwell":
+            seconds = float(step["seconds"])
+            if seconds < 0:
+                raise ValueError("dwell: seconds must be >= 0")
+            program.append({"type": "dwell", "seconds": seconds})
+        elif kind == "photo":
+            program.append({"type": "photo"})
+        elif kind == "raster":
+            yaws, pitches = _pair(step, "yaw"), _pair(step, "pitch")
+            rows, cols = int(step.get("rows", 2)), int(step.get("cols", 2))
+            if rows < 1 or cols < 1:
+                raise ValueError("raster: rows and cols must be >= 1")
+            dwell, photo = float(step.get("dwell", 0)), bool(step.get("photo", False))
+            for row, pitch in enumerate(_linspace(pitches[0], pitches[1], rows)):
+                columns = _linspace(yaws[0], yaws[1], cols)
+                if row % 2:
+                    columns.reverse()  # Serpentine: no fly-back at the end of a row
+                for yaw in columns:
+                    program.extend(_point(yaw, pitch, dwell, photo))
+        elif kind == "sweep":
+            yaws = _pair(step, "yaw")
+            pitch = float(step.get("pitch", 0))
+            dwell, photo = float(step.get("dwell", 0)), bool(step.get("photo", False))
+            for _ in range(int(step.get("cycles", 1))):
+                for yaw in yaws:
+                    program.extend(_point(yaw, pitch, dwell, photo))
+        else:
+            raise ValueError(f"Unknown step type {kind!r}, expected one of {STEP_TYPES + PATTERN_TYPES}")
+    if not program:
+        raise ValueError("Empty program")
+    return program
+
+
+class ScanEngine:
+    """
+    Runs a scripted program (see expand()) on the server, so sweeps and
+    patrols don't depend on a browser holding buttons over the network.
+
+    Timed steps run against a monotonic schedule: each dwell ends at an
+    absolute loop-time deadline, so delays never accumulate across steps.
+    A goto takes as long as the move needs and re-anchors the schedule
+    when it settles. Each step records its planned and actual start; the
+    difference is the timing error, also exported as a histogram.
+
+    pause() stops the gimbal and freezes the schedule, resume() shifts it
+    by the paused time and repeats an interrupted goto; abort() ends the program.
+    """
+    def __init__(self, driver, angle, on_event: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None):
+        self.driver = driver
+        self.angle = angle
+        self.on_event = on_event
+        self.state = "idle"  # idle | running | paused | done | aborted | failed
+        self.program: List[Dict[str, Any]] = []
+        self.repeat = 1
+        self.index = -1
+        self.reports: List[Dict[str, Any]] = []
+        self.error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._resumed = asyncio.Event()
+        self._paused = asyncio.Event()
+        self._paused_at: Optional[float] = None
+        self._shift = 0.0  # Total paused time, added to every planned time
+
+    @property
+    def active(self) -> bool:
+        return self.state in ("running", "paused")
+
+    def status(self) -> Dict[str, Any]:
+        errors = [abs(r["error_ms"]) for r in self.reports]
+        return {
+            "state": self.state,
+            "steps": len(self.program),
+            "repeat": self.repeat,
+            "index": self.index,
+            "error": self.error,
+            "timing": {
+                "max_error_ms": round(max(errors), 3) if errors else None,
+                "mean_error_ms": round(sum(errors) / len(errors), 3) if errors else None,
+            },
+            "reports": self.reports[-50:],
+        }
+
+    async def start(self, steps: List[Dict[str, Any]], repeat: int = 1):
+        """Validates and starts a program. Raises ValueError for a bad program, RuntimeError if busy."""
+        if self.active:
+            raise RuntimeError("A scan is already running")
+        if not self.driver.connected:
+            raise RuntimeError("Gimbal not connected")
+        self.program = expand(steps)
+        self.repeat = max(1, int(repeat))
+        self.index = -1
+        self.reports = []
+        self.error = None
+        self._shift = 0.0
+        self._paused_at = None
+        self._paused.clear()
+        self._resumed.set()
+        self.state = "running"
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Scan started: {len(self.program)} steps x {self.repeat}")
+
+    async def pause(self):
+        if self.state != "running":
+            raise RuntimeError(f"Cannot pause a scan that is {self.state}")
+        self.state = "paused"
+        self._paused_at = asyncio.get_running_loop().time()
+        self._resumed.clear()
+        self._paused.set()
+        await self.angle.cancel(reason="paused")
+        await self._emit()
+
+    async def resume(self):
+        if self.state != "paused":
+            raise RuntimeError(f"Cannot resume a scan that is {self.state}")
+        self._shift += asyncio.get_running_loop().time() - self._paused_at
+        self._paused_at = None
+        self.state = "running"
+        self._paused.clear()
+        self._resumed.set()
+        await self._emit()
+
+    async def abort(self):
+        task = self._task
+        if not self.active or task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _emit(self, report: Optional[Dict[str, Any]] = None):
+        if self.on_event is None:
+            return
+        message = {"type": "scan", "state": self.state, "index": self.index, "steps": len(self.program)}
+        if report is not None:
+            message["report"] = report
+        try:
+            await self.on_event(message)
+        except Exception as e:
+            logger.debug(f"Scan event not delivered: {e}")
+
+    async def _wait_until(self, deadline: float):
+        """Sleeps until `deadline` (plus any pause time accrued meanwhile)."""
+        loop = asyncio.get_running_loop()
+        while True:
+            if self.state == "paused":
+                await self._resumed.wait()
+            remaining = deadline + self._shift - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                # Wakes early only to handle a pause
+                await asyncio.wait_for(self._paused.wait(), remaining)
+            except asyncio.TimeoutError:
+                return
+
+    async def _goto(self, step: Dict[str, Any]) -> Dict[str, Any]:
+        while True:
+            if self.state == "paused":
+                await self._resumed.wait()
+            done = await self.angle.set_target(step["yaw"], step["pitch"])
+            paused = asyncio.ensure_future(self._paused.wait())
+            try:
+                await asyncio.wait({done, paused}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                paused.cancel()
+            if self.state == "paused" and not done.done():
+                # Paused while the move was being set up, after pause() cancelled the old one
+                await self.angle.cancel(reason="paused")
+            result = await done  # pause() cancels the move, which resolves it
+            if result["status"] == "paused":
+                continue  # Fly the whole move again after resume
+            return result
+
+    async def _run_step(self, step: Dict[str, Any], planned: float) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        await self._wait_until(planned)
+        started = loop.time()
+        report = {
+            "index": self.index,
+            "type": step["type"],
+            "error_ms": round((started - (planned + self._shift)) * 1000, 3),
+        }
+        if step["type"] == "goto":
+            result = await self._goto(step)
+            report["result"] = result["status"]
+            report["settle_time_s"] = result["settle_time_s"]
+            if result["status"] in FATAL_MOVES:
+                raise RuntimeError(f"Move to yaw={step['yaw']} pitch={step['pitch']} ended: {result['status']}")
+        elif step["type"] == "photo":
+            report["result"] = "ok" if await self.driver.send_cmd(CMD_PHOTO, b'', expect_ack=True) else "no_ack"
+        elif step["type"] == "dwell":
+            await self._wait_until(planned + step["seconds"])
+            report["end_error_ms"] = round((loop.time() - (planned + step["seconds"] + self._shift)) * 1000, 3)
+        report["duration_s"] = round(loop.time() - started, 4)
+        metrics.SCAN_STEP_ERROR.observe(abs(report["error_ms"]) / 1000)
+        return report
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        # Planned start of the next step, in schedule time (pauses excluded)
+        planned = loop.time()
+        try:
+            for _ in range(self.repeat):
+                for index, step in enumerate(self.program):
+                    self.index = index
+                    report = await self._run_step(step, planned)
+                    self.reports.append(report)
+                    await self._emit(report)
+                    if step["type"] == "goto":
+                        planned = loop.time() - self._shift  # Moves take what they take: re-anchor
+                    elif step["type"] == "dwell":
+                        planned += step["seconds"]
+                    else:
+                        planned = max(planned, loop.time() - self._shift)
+            self.state = "done"
+        except asyncio.CancelledError:
+            self.state = "aborted"
+            await self.angle.cancel(stop=False, reason="aborted")
+            await self.driver.send_cmd(CMD_STOP, b'', expect_ack=False)
+        except Exception as e:
+            logger.error(f"Scan failed at step {self.index}: {e}")
+            self.state = "failed"
+            self.error = str(e)
+            await self.angle.cancel(reason="aborted")
+        finally:
+            self._task = None
+            logger.info(f"Scan {self.state} after {len(self.reports)} steps")
+            await self._emit()
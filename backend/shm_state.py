@@ -0,0 +1,122 @@
+"""
+Single-writer, many-reader state blocks in shared memory.
+
+A block is a file (under /dev/shm where available) mapped with mmap:
+
+    magic "SIYISHM1" | capacity u32 | pad u32 | seq u64 | length u32 | pad u32 | payload[capacity]
+
+and guarded by a seqlock. The writer makes `seq` odd, writes length and
+payload, then makes it even again. A reader copies the payload between
+two reads of `seq` and keeps the copy only if both reads are the same
+even number, so it never sees a half-written snapshot and never blocks
+the writer. Payloads are JSON.
+"""
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Any, Optional, Tuple
+
+MAGIC = b"SIYISHM1"
+_HEAD = struct.Struct('<8sII')
+_SEQ = struct.Struct('<Q')
+_LEN = struct.Struct('<I')
+SEQ_OFFSET = _HEAD.size
+LEN_OFFSET = SEQ_OFFSET + _SEQ.size
+DATA_OFFSET = LEN_OFFSET + 8
+DEFAULT_CAPACITY = 64 * 1024
+
+SHM_DIR = os.environ.get("SIYI_SHM_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+
+
+def block_path(directory: str, device_id: str) -> str:
+    return os.path.join(directory, f"siyi-{device_id}.state")
+
+
+class SeqlockWriter:
+    """Owns a block: creates (or replaces) the file and publishes snapshots into it."""
+    def __init__(self, path: str, capacity: int = DEFAULT_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        # Built aside and renamed into place: readers still mapping a block from
+        # a previous run keep their (now unlinked) file instead of seeing it
+        # truncated under them, which would be a SIGBUS
+        tmp = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, DATA_OFFSET + capacity)
+            self._mm = mmap.mmap(fd, DATA_OFFSET + capacity)
+        finally:
+            os.close(fd)
+        _HEAD.pack_into(self._mm, 0, MAGIC, capacity, 0)
+        os.replace(tmp, path)
+        self.seq = 0
+        self.publishes = 0
+
+    def write(self, data: bytes):
+        if len(data) > self.capacity:
+            raise ValueError(f"Snapshot of {len(data)} bytes does not fit the {self.capacity} byte block")
+        mm = self._mm
+        _SEQ.pack_into(mm, SEQ_OFFSET, self.seq + 1)  # Odd: write in progress
+        _LEN.pack_into(mm, LEN_OFFSET, len(data))
+        mm[DATA_OFFSET:DATA_OFFSET + len(data)] = data
+        self.seq += 2
+        _SEQ.pack_into(mm, SEQ_OFFSET, self.seq)
+        self.publishes += 1
+
+    def publish(self, snapshot: Any):
+        self.write(json.dumps(snapshot, separators=(',', ':')).encode())
+
+    def close(self, unlink: bool = True):
+        self._mm.close()
+        if unlink:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class SeqlockReader:
+    """Maps a block read-only; read() returns the newest consistent snapshot."""
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.capacity, _ = _HEAD.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path} is not a state block")
+        self.retries = 0  # Reads that raced the writer and went round again
+
+    @property
+    def seq(self) -> int:
+        return _SEQ.unpack_from(self._mm, SEQ_OFFSET)[0]
+
+    def read_bytes(self, spins: int = 1000) -> Tuple[int, Optional[bytes]]:
+        """(seq, payload); payload is None before the first publish."""
+        mm = self._mm
+        for attempt in range(spins):
+            before = _SEQ.unpack_from(mm, SEQ_OFFSET)[0]
+            if before & 1 == 0:
+                length = _LEN.unpack_from(mm, LEN_OFFSET)[0]
+                data = mm[DATA_OFFSET:DATA_OFFSET + min(length, self.capacity)]
+                if _SEQ.unpack_from(mm, SEQ_OFFSET)[0] == before:
+                    return before, (data if before else None)
+            self.retries += 1
+            if attempt % 64 == 63:
+                time.sleep(0)  # The writer was preempted mid-write: let it run
+        raise TimeoutError(f"No consistent snapshot in {self.path} after {spins} tries")
+
+    def read(self, since: int = -1) -> Tuple[int, Any]:
+        """(seq, snapshot); snapshot is None if nothing newer than `since` was published."""
+        if self.seq == since:
+            return since, None
+        seq, data = self.read_bytes()
+        if data is None or seq == since:
+            return seq, None
+        return seq, json.loads(data)
+
+    def close(self):
+        self._mm.close()
@@ -0,0 +1,344 @@
+"""
+SIYI gimbal simulator for tests and load runs without hardware.
+
+Serves the SIYI protocol on a pseudo-terminal (point the driver's serial
+transport at the printed /dev/pts path) and/or a UDP socket. Commands are
+ACKed with configurable latency, jitter and loss, rate commands (ids 1-5)
+move a simulated attitude, attitude (cmd 22) is streamed at the rate asked
+for with cmd 0x25, and garbage or corrupted frames can be injected into the
+outgoing stream to exercise resync.
+
+    python -m backend.simulator --pty --udp-port 37260 --latency 0.01 --loss 0.05
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .siyi_protocol import FrameParser, SiyiPacket
+from .telemetry import (ATTITUDE_STRUCT, CMD_ATTITUDE, CMD_DATA_STREAM, CMD_FIRMWARE, CMD_STATUS,
+                        FIRMWARE_STRUCT, MAX_RATE, PITCH_LIMITS, STREAM_ATTITUDE, STREAM_RATES,
+                        YAW_LIMITS)
+
+logger = logging.getLogger(__name__)
+
+CMD_CENTER = 0
+CMD_UP = 1
+CMD_DOWN = 2
+CMD_RIGHT = 3
+CMD_LEFT = 4
+CMD_STOP = 5
+
+FIRMWARE_VERSION = (0x00030201, 0x00030402, 0x00010000)  # board, gimbal, zoom
+
+
+def _clamp(value: float, limits: Tuple[float, float]) -> float:
+    return max(limits[0], min(limits[1], value))
+
+
+class GimbalSimulator:
+    """
+    Protocol-level A8 mini stand-in.
+
+    `latency` + uniform(0, `jitter`) delays every reply, `loss` is the
+    probability that an incoming frame is dropped unanswered. Each outgoing
+    frame is preceded by random garbage with probability `garbage_rate` and
+    has one byte flipped (bad CRC) with probability `corrupt_rate`.
+    """
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, loss: float = 0.0,
+                 garbage_rate: float = 0.0, corrupt_rate: float = 0.0, stream_hz: float = 0.0,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.garbage_rate = garbage_rate
+        self.corrupt_rate = corrupt_rate
+        self.stream_hz = stream_hz
+        self.random = random.Random(seed)
+
+        # Simulated attitude, degrees and degrees per second
+        self.yaw = 0.0
+        self.pitch = 0.0
+        self.roll = 0.0
+        self.yaw_rate = 0.0
+        self.pitch_rate = 0.0
+        self._t = time.monotonic()
+
+        self.seq = 0
+        self._sinks: List[Callable[[bytes], None]] = []
+        self._stream_task: Optional[asyncio.Task] = None
+        self._closers: List[Callable[[], None]] = []
+
+        # Counters
+        self.rx_frames = 0
+        self.dropped = 0
+        self.acks = 0
+        self.commands: Dict[int, int] = {}
+        self.garbage_bytes = 0
+        self.corrupted = 0
+
+    # --- Motion model ---
+
+    def advance(self, now: Optional[float] = None):
+        """Integrates the current rates up to `now`, stopping at the mechanical limits."""
+        now = time.monotonic() if now is None else now
+        dt = now - self._t
+        self._t = now
+        if dt <= 0:
+            return
+        self.yaw = _clamp(self.yaw + self.yaw_rate * dt, YAW_LIMITS)
+        self.pitch = _clamp(self.pitch + self.pitch_rate * dt, PITCH_LIMITS)
+        if self.yaw in YAW_LIMITS:
+            self.yaw_rate = 0.0
+        if self.pitch in PITCH_LIMITS:
+            self.pitch_rate = 0.0
+
+    def attitude_payload(self) -> bytes:
+        self.advance()
+        values = (self.yaw, self.pitch, self.roll, self.yaw_rate, self.pitch_rate, 0.0)
+        return ATTITUDE_STRUCT.pack(*(int(round(v * 10)) for v in values))
+
+    def _apply(self, packet: SiyiPacket) -> bytes:
+        """Executes a command; returns the payload of the reply."""
+        cmd_id = packet.cmd_id
+        payload = packet.payload
+        self.advance()
+        if cmd_id in (CMD_UP, CMD_DOWN, CMD_RIGHT, CMD_LEFT):
+            rate = MAX_RATE * (payload[0] if payload else 50) / 100.0
+            if cmd_id == CMD_UP:
+                self.pitch_rate = rate
+            elif cmd_id == CMD_DOWN:
+                self.pitch_rate = -rate
+            elif cmd_id == CMD_RIGHT:
+                self.yaw_rate = rate
+            else:
+                self.yaw_rate = -rate
+        elif cmd_id == CMD_STOP:
+            self.yaw_rate = self.pitch_rate = 0.0
+        elif cmd_id == CMD_CENTER:
+            self.yaw = self.pitch = 0.0
+            self.yaw_rate = self.pitch_rate = 0.0
+        elif cmd_id == CMD_DATA_STREAM:
+            if len(payload) >= 2 and payload[0] == STREAM_ATTITUDE:
+                self.stream_hz = STREAM_RATES.get(payload[1], 0)
+                self._restart_stream()
+        elif cmd_id == CMD_ATTITUDE:
+            return self.attitude_payload()
+        elif cmd_id == CMD_STATUS:
+            # reserved, hdr_sta, reserved, record_sta, motion_mode
+            return bytes([0, 0, 0, 0, 1])
+        elif cmd_id == CMD_FIRMWARE:
+            return FIRMWARE_STRUCT.pack(*FIRMWARE_VERSION)
+        return b''
+
+    # --- Frame I/O ---
+
+    def on_packet(self, packet: SiyiPacket):
+        self.rx_frames += 1
+        if self.loss and self.random.random() < self.loss:
+            self.dropped += 1
+            return
+        self.commands[packet.cmd_id] = self.commands.get(packet.cmd_id, 0) + 1
+        reply = self._apply(packet)
+        if packet.need_ack or reply:
+            self.acks += 1
+            frame = SiyiPacket(seq=packet.seq, cmd_id=packet.cmd_id, payload=reply, is_ack=True).encode()
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+            if delay > 0:
+                asyncio.get_running_loop().call_later(delay, self.emit, frame)
+            else:
+                self.emit(frame)
+
+    def emit(self, frame: bytes):
+        """Sends a frame to every endpoint, applying garbage/corruption injection."""
+        if self.corrupt_rate and self.random.random() < self.corrupt_rate:
+            corrupted = bytearray(frame)
+            corrupted[self.random.randrange(2, len(corrupted))] ^= 0xFF
+            frame = bytes(corrupted)
+            self.corrupted += 1
+        if self.garbage_rate and self.random.random() < self.garbage_rate:
+            frame = self.garbage(self.random.randint(1, 16)) + frame
+        for sink in list(self._sinks):
+            sink(frame)
+
+    def garbage(self, count: int) -> bytes:
+        """Random bytes, with a stray STX now and then so the parser has to resync."""
+        data = bytearray(self.random.getrandbits(8) for _ in range(count))
+        if count >= 3 and self.random.random() < 0.5:
+            data[0:2] = b'\x55\x66'
+        self.garbage_bytes += count
+        return bytes(data)
+
+    def inject_garbage(self, count: int = 32):
+        for sink in list(self._sinks):
+            sink(self.garbage(count))
+
+    def _next_seq(self) -> int:
+        self.seq = (self.seq + 1) % 65536
+        return self.seq
+
+    # --- Attitude stream ---
+
+    def _restart_stream(self):
+        if self._stream_task:
+            self._stream_task.cancel()
+            self._stream_task = None
+        if self.stream_hz > 0:
+            self._stream_task = asyncio.get_running_loop().create_task(self._stream())
+
+    async def _stream(self):
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / self.stream_hz
+        next_tick = loop.time()
+        while True:
+            self.emit(SiyiPacket(seq=self._next_seq(), cmd_id=CMD_ATTITUDE, payload=self.attitude_payload()).encode())
+            next_tick += interval
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+
+    # --- Endpoints ---
+
+    async def serve_udp(self, host: str = "127.0.0.1", port: int = 0) -> Tuple[str, int]:
+        """Listens for SIYI datagrams; replies go to the last peer. Returns the bound address."""
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _SimDatagram(self), local_addr=(host, port))
+        self._closers.append(transport.close)
+        self._restart_stream()
+        return transport.get_extra_info("sockname")[:2]
+
+    def serve_pty(self) -> str:
+        """Opens a pseudo-terminal pair and serves the master side. Returns the slave path."""
+        import tty
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        os.set_blocking(master, False)
+        loop = asyncio.get_running_loop()
+        parser = FrameParser(self.on_packet)
+
+        def on_readable():
+            try:
+                data = os.read(master, 4096)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # Slave side closed by every user
+                return
+            parser.feed(data)
+
+        def write(data: bytes):
+            try:
+                os.write(master, data)
+            except (BlockingIOError, OSError) as e:
+                logger.debug(f"pty write dropped: {e}")
+
+        def close():
+            loop.remove_reader(master)
+            self._sinks.remove(write)
+            os.close(master)
+            os.close(slave)
+
+        loop.add_reader(master, on_readable)
+        self._sinks.append(write)
+        self._closers.append(close)
+        self._restart_stream()
+        path = os.ttyname(slave)
+        logger.info(f"Simulator serving on {path}")
+        return path
+
+    def close(self):
+        if self._stream_task:
+            self._stream_task.cancel()
+            self._stream_task = None
+        for closer in self._closers:
+            closer()
+        self._closers.clear()
+        self._sinks.clear()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "rx_frames": self.rx_frames,
+            "dropped": self.dropped,
+            "acks": self.acks,
+            "commands": dict(self.commands),
+            "garbage_bytes": self.garbage_bytes,
+            "corrupted": self.corrupted,
+            "attitude": {"yaw": round(self.yaw, 1), "pitch": round(self.pitch, 1)},
+        }
+
+
+class _SimDatagram(asyncio.DatagramProtocol):
+    def __init__(self, sim: GimbalSimulator):
+        self.sim = sim
+        self.transport = None
+        self.peer = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.sim._sinks.append(self._send)
+
+    def connection_lost(self, exc):
+        if self._send in self.sim._sinks:
+            self.sim._sinks.remove(self._send)
+
+    def _send(self, data: bytes):
+        if self.peer is not None and not self.transport.is_closing():
+            self.transport.sendto(data, self.peer)
+
+    def datagram_received(self, data: bytes, addr):
+        self.peer = addr
+        view = memoryview(data)
+        offset = 0
+        while offset < len(data):
+            packet, consumed = SiyiPacket.decode(view[offset:])
+            if consumed == 0:
+                break
+            if packet is not None:
+                self.sim.on_packet(packet)
+            offset += consumed
+
+
+async def _main(args):
+    sim = GimbalSimulator(latency=args.latency, jitter=args.jitter, loss=args.loss,
+                          garbage_rate=args.garbage, corrupt_rate=args.corrupt,
+                          stream_hz=args.stream_hz, seed=args.seed)
+    if args.pty:
+        print(f"serial: {sim.serve_pty()}", flush=True)
+    if args.udp_port is not None:
+        host, port = await sim.serve_udp(args.host, args.udp_port)
+        print(f"udp: {host}:{port}", flush=True)
+    try:
+        while True:
+            await asyncio.sleep(args.stats_interval)
+            logger.info(f"Simulator stats: {sim.stats()}")
+    finally:
+        sim.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SIYI A8 mini protocol simulator")
+    parser.add_argument("--pty", action="store_true", help="serve on a pseudo-terminal")
+    parser.add_argument("--udp-port", type=int, default=None, help="serve on this UDP port (0 picks one)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--latency", type=float, default=0.005, help="reply latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra uniform reply delay, seconds")
+    parser.add_argument("--loss", type=float, default=0.0, help="probability an incoming frame is dropped")
+    parser.add_argument("--garbage", type=float, default=0.0, help="probability of garbage before a frame")
+    parser.add_argument("--corrupt", type=float, default=0.0, help="probability a frame gets a bad CRC")
+    parser.add_argument("--stream-hz", type=float, default=0.0, help="initial attitude stream rate")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--stats-interval", type=float, default=5.0)
+    args = parser.parse_args(argv)
+    if not args.pty and args.udp_port is None:
+        parser.error("pick at least one of --pty / --udp-port")
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -2,165 +2,455 @@ import asyncio
 import logging
 import time
 from typing import Optional, Callable, Dict, Any, List
-import serial_asyncio
-import serial
-from .siyi_protocol import SiyiPacket
+from .siyi_protocol import SiyiPacket, FrameParser, encode_frame
+from .ack_window import AckWindow
+from .tx_scheduler import TxScheduler, TxPriority, priority_for
+from .state_broadcast import StateStore
+from . import metrics
+from .flightlog import FlightLogWriter, RX, TX
+from .link_health import LinkMonitor, LINK_DOWN
+from .logging_setup import TRACE, HexBytes
+from .transports import open_serial, open_udp, SIYI_UDP_HOST, SIYI_UDP_PORT, TRANSPORTS
+from .tracing import Trace
+from .telemetry import (AttitudeHistory, decode_attitude, decode_firmware, decode_status, stream_rate_code,
+                        STREAM_RATES, STREAM_ATTITUDE, CMD_ATTITUDE, CMD_STATUS, CMD_DATA_STREAM, CMD_FIRMWARE)
 
 logger = logging.getLogger(__name__)
 
+# Commands query() can decode: cmd_id -> (name, decoder, cache TTL in seconds).
+# Firmware never changes while connected; status is only cached briefly to
+# absorb bursts of identical reads, attitude not at all. (The SDK's hardware
+# id query, 0x02, is the rotate-down command in this command table.)
+QUERIES = {
+    CMD_FIRMWARE: ("firmware", decode_firmware, 3600.0),
+    CMD_STATUS: ("status", decode_status, 0.5),
+    CMD_ATTITUDE: ("attitude", decode_attitude, 0.0),
+}
+QUERY_NAMES = {name: cmd_id for cmd_id, (name, _, _) in QUERIES.items()}
+
 class SiyiDriver:
-    def __init__(self):
+    def __init__(self, max_in_flight: int = 8, attitude_capacity: int = 2048, device_id: str = "default"):
+        self.device_id = device_id  # Metrics label
         self.transport = None
         self.protocol = None
         self.connected = False
+        self.link_type = "serial"
         self.port = ""
         self.baud = 115200
+        self.udp_endpoint = (SIYI_UDP_HOST, SIYI_UDP_PORT)
         
         self.seq = 0
-        self.ack_futures: Dict[int, asyncio.Future] = {}  # seq -> Future
-        self.state: Dict[str, Any] = {
+        self.attitude = AttitudeHistory(attitude_capacity)
+        self.scheduler = TxScheduler(self._write, baud=self.baud,
+                                     stats_callback=self._on_scheduler_stats)
+        self.ack_window = AckWindow(self._submit, max_in_flight=max_in_flight,
+                                    stats_callback=self._on_ack_stats)
+        # Versioned so the server can broadcast only what changed
+        self.state = StateStore({
             "connected": False,
+            "transport": self.link_type,
             "yaw": 0.0,
             "pitch": 0.0,
             "roll": 0.0,
+            "yaw_rate": 0.0,
+            "pitch_rate": 0.0,
+            "roll_rate": 0.0,
+            "attitude_stream_hz": 0,
+            "motion_mode": "unknown",
             "zoom_state": "unknown",
             "record_state": "unknown",
             "last_ack_ts": 0,
             "retries": 0,
-            "errors": 0
-        }
+            "errors": 0,
+            "crc_failures": 0,
+            "resync_bytes": 0,
+            "in_flight": 0,
+            "srtt_ms": None,
+            "rto_ms": round(self.ack_window.rto * 1000, 1),
+            "tx_queue": self.scheduler.snapshot(),
+            "link": LINK_DOWN,
+            "link_loss": 0.0,
+            "reconnects": 0,
+        })
+        self._parser_counts = (0, 0)  # (crc_failures, resync_bytes) already counted in metrics
+        self.recorder: Optional[FlightLogWriter] = None
         self._stop_event = asyncio.Event()
         self._read_task = None
-        self._heartbeat_task = None
+        self._queries: Dict[int, asyncio.Future] = {}  # cmd_id -> in-flight query
+        self._query_tasks = set()  # Their request loops; referenced so they can't be collected mid-flight
+        self._traced: Dict[int, Trace] = {}  # seq -> traced fire-and-forget frame, ACK matched passively
+        self._ack_at = 0.0
+        self._stream_request = 0.0  # Attitude rate asked for this session, restored after a reopen
+        self._query_cache: Dict[int, tuple] = {}  # cmd_id -> (received_at, result)
+        # Liveness, loss/RTT and auto-reconnect; replaces the fixed-rate heartbeat
+        self.link = LinkMonitor(self)
 
-    async def connect(self, port: str, baud: int = 115200):
+    async def connect(self, port: str = "", baud: int = 115200, transport: str = "serial",
+                      host: str = SIYI_UDP_HOST, udp_port: int = SIYI_UDP_PORT):
+        """
+        Opens the link to the gimbal. `transport` is "serial" (port + baud)
+        or "udp" (host + udp_port, one frame per datagram).
+        """
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Unknown transport {transport!r}, expected one of {TRANSPORTS}")
         if self.connected:
             await self.disconnect()
             
-        self.port = port
+        self.link_type = transport
         self.baud = baud
+        self.port = f"{host}:{udp_port}" if transport == "udp" else port
+        self.udp_endpoint = (host, udp_port)
         
         try:
-            loop = asyncio.get_running_loop()
-            self.transport, self.protocol = await serial_asyncio.create_serial_connection(
-                loop, 
-                lambda: SerialProtocol(self._on_packet_received),
-                port, 
-                baudrate=baud
-            )
+            await self._open()
             self.connected = True
             self.state["connected"] = True
+            self.state["transport"] = transport
+            self.state["attitude_stream_hz"] = 0  # Possibly a different (or power cycled) gimbal: not streaming yet
+            self._stream_request = 0.0
+            self.attitude.clear()
+            self._query_cache.clear()  # Possibly a different gimbal now
             self._stop_event.clear()
-            self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
-            logger.info(f"Connected to {port} at {baud}")
+            self.link.start()
+            logger.info(f"Connected to {self.port} over {transport}" + (f" at {baud}" if transport == "serial" else ""))
         except Exception as e:
             logger.error(f"Failed to connect: {e}")
             self.state["errors"] += 1
             raise e
 
-    async def disconnect(self):
-        if self._heartbeat_task:
-            self._heartbeat_task.cancel()
+    async def _open(self):
+        if self.link_type == "udp":
+            # Ethernet link, no UART byte budget to respect
+            self.scheduler.set_baud(None)
+            self.transport, self.protocol = await open_udp(
+                self._on_packet_received, self._on_parser_stats, *self.udp_endpoint
+            )
+        else:
+            self.scheduler.set_baud(self.baud)
+            self.transport, self.protocol = await open_serial(
+                lambda: SerialProtocol(self._on_packet_received, self._on_parser_stats),
+                self.port,
+                self.baud
+            )
+        self.protocol.recorder = self.recorder
+        self.protocol.on_lost = self.link.on_transport_lost
+        self._parser_counts = (0, 0)
+
+    def _close_transport(self):
+        if self.protocol is not None:
+            self.protocol.on_lost = None  # Our own close, not a lost link
         if self.transport:
             self.transport.close()
+        self.transport = self.protocol = None
+
+    async def reopen(self):
+        """
+        Closes and reopens the transport with the last connect() settings,
+        keeping the session (used by the link monitor to recover a lost link).
+        Commands in flight fail; raises if the port can't be opened.
+        """
+        self._close_transport()
+        self.ack_window.clear()
+        self.scheduler.clear()
+        self._drop_traced()
+        self.state["attitude_stream_hz"] = 0  # The gimbal may have restarted
+        await self._open()
+
+    async def disconnect(self):
+        self.link.stop()
+        self._close_transport()
+        self.ack_window.clear()
+        self.scheduler.clear()
+        self._drop_traced()
+        self._drop_queries()
         self.connected = False
         self.state["connected"] = False
+        self.state["attitude_stream_hz"] = 0
+        self._stream_request = 0.0
         logger.info("Disconnected")
 
+    def start_recording(self, path: str) -> FlightLogWriter:
+        """Records raw TX frames and RX bytes to a flight log at `path` (see backend.flightlog)."""
+        self.stop_recording()
+        self.recorder = FlightLogWriter(path)
+        if self.protocol is not None:
+            self.protocol.recorder = self.recorder
+        return self.recorder
+
+    def stop_recording(self):
+        if self.recorder is None:
+            return
+        if self.protocol is not None:
+            self.protocol.recorder = None
+        self.recorder.close()
+        self.recorder = None
+
     def _on_packet_received(self, packet: SiyiPacket):
+        metrics.RX_FRAMES.labels(self.device_id, packet.cmd_id).inc()
+        self.link.on_rx()
         # Handle ACKs
         if packet.is_ack:
-            # Check seq in futures
-            if packet.seq in self.ack_futures:
-                fut = self.ack_futures.pop(packet.seq)
-                if not fut.done():
-                    fut.set_result(packet)
+            self._ack_at = asyncio.get_running_loop().time()  # Traced commands stamp their ACK with this
+            if not self.ack_window.on_ack(packet) and self._traced:
+                trace = self._traced.pop(packet.seq, None)
+                if trace is not None:
+                    trace.mark("ack", self._ack_at)
+                    trace.finish()
             self.state["last_ack_ts"] = time.time()
         
         # Handle Data Packets (e.g. status)
         self._parse_state_packet(packet)
+        if packet.cmd_id in QUERIES and packet.payload:
+            self._on_query_response(packet)
+
+    def _on_ack_stats(self, window: AckWindow):
+        self.state["retries"] = window.retransmits
+        self.state["in_flight"] = window.in_flight
+        metrics.IN_FLIGHT.labels(self.device_id).set(window.in_flight)
+        self.state["srtt_ms"] = round(window.srtt * 1000, 1) if window.srtt is not None else None
+        self.state["rto_ms"] = round(window.rto * 1000, 1)
+
+    def _on_scheduler_stats(self, scheduler: TxScheduler):
+        self.state["tx_queue"] = scheduler.snapshot()
+
+    def _on_parser_stats(self, parser):
+        # FrameParser (serial) or DatagramLink (udp), same counter names
+        self.state["crc_failures"] = parser.crc_failures
+        self.state["resync_bytes"] = parser.resync_bytes
+        crc_seen, resync_seen = self._parser_counts
+        metrics.CRC_FAILURES.labels(self.device_id).inc(parser.crc_failures - crc_seen)
+        metrics.RESYNC_BYTES.labels(self.device_id).inc(parser.resync_bytes - resync_seen)
+        self._parser_counts = (parser.crc_failures, parser.resync_bytes)
 
     def _parse_state_packet(self, packet: SiyiPacket):
-        # Command ID 0x0D (13) is often status or similar, or specific ID?
-        # Based on research:
         # Acquire Attitude Data ID: 0x16 (22)
         # Gimbal Status Information ID: 0x0F (15)
-        
-        # Assuming we get Attitude Data (ID 22)
-        if packet.cmd_id == 22: # Attitude
-            # Payload validation needed. Assuming standard float/int packing
-            pass 
-        elif packet.cmd_id == 15: # Status
-            pass
-
-    async def send_cmd(self, cmd_id: int, payload: bytes = b'', expect_ack: bool = True, timeout: float = 1.0, retries: int = 3) -> bool:
+        if packet.cmd_id == CMD_ATTITUDE:
+            values = decode_attitude(packet.payload)
+            if values is None:
+                return
+            self.attitude.append(time.monotonic(), values)
+            state = self.state
+            state["yaw"], state["pitch"], state["roll"] = values[0], values[1], values[2]
+            state["yaw_rate"], state["pitch_rate"], state["roll_rate"] = values[3], values[4], values[5]
+        elif packet.cmd_id == CMD_STATUS:
+            for key, value in decode_status(packet.payload).items():
+                self.state[key] = value
+
+    async def request_attitude_stream(self, hz: float) -> int:
+        """
+        Asks the gimbal to push attitude (cmd 22) at the closest supported
+        rate; 0 stops the stream. Returns the rate actually requested.
+        """
+        code = stream_rate_code(hz)
+        ok = await self.send_cmd(CMD_DATA_STREAM, bytes([STREAM_ATTITUDE, code]), expect_ack=True)
+        if not ok:
+            raise RuntimeError("Gimbal did not acknowledge the stream request")
+        self.state["attitude_stream_hz"] = STREAM_RATES[code]
+        self._stream_request = hz
+        return STREAM_RATES[code]
+
+    async def restore_stream(self):
+        """Asks again for the attitude stream this session had, e.g. after reopen()."""
+        if self._stream_request and not self.state["attitude_stream_hz"]:
+            await self.request_attitude_stream(self._stream_request)
+
+    def _on_query_response(self, packet: SiyiPacket):
+        # Correlated by cmd id: replies don't reliably echo the request seq.
+        # Unsolicited replies (e.g. to link probes) still refresh the cache.
+        cmd_id = packet.cmd_id
+        pending = self._queries.get(cmd_id)
+        if pending is None and not QUERIES[cmd_id][2]:
+            return
+        result = QUERIES[cmd_id][1](packet.payload)
+        if result is None:
+            return
+        self._query_cache[cmd_id] = (time.monotonic(), result)
+        if pending is not None:
+            # Unregister now: a caller resuming on this result may query again at once
+            del self._queries[cmd_id]
+            if not pending.done():
+                pending.set_result(result)
+
+    async def query(self, cmd_id: int, max_age: Optional[float] = None, timeout: Optional[float] = None,
+                    retries: int = 2):
+        """
+        Asks the gimbal for one of the QUERIES commands and returns the decoded
+        reply (FirmwareVersion, status dict, attitude tuple).
+
+        A cached reply younger than `max_age` (default: the command's TTL) is
+        returned without touching the link, and concurrent calls for the same
+        command share one request. Raises RuntimeError when not connected or
+        when no reply arrives after `retries` resends.
+        """
+        if cmd_id not in QUERIES:
+            raise ValueError(f"No decoder for cmd 0x{cmd_id:02x}")
+        name, _, ttl = QUERIES[cmd_id]
+        max_age = ttl if max_age is None else max_age
+        cached = self._query_cache.get(cmd_id)
+        if cached is not None and time.monotonic() - cached[0] <= max_age:
+            return cached[1]
+
+        pending = self._queries.get(cmd_id)
+        if pending is None:
+            if not self.connected:
+                raise RuntimeError("Gimbal not connected")
+            pending = asyncio.get_running_loop().create_future()
+            self._queries[cmd_id] = pending
+            task = asyncio.create_task(self._run_query(cmd_id, pending, timeout, retries))
+            self._query_tasks.add(task)
+            task.add_done_callback(self._query_tasks.discard)
+        # Shielded: one caller giving up must not cancel the shared request
+        result = await asyncio.shield(pending)
+        if result is None:
+            raise RuntimeError(f"No reply to {name} query")
+        return result
+
+    async def _run_query(self, cmd_id: int, pending: asyncio.Future, timeout: Optional[float], retries: int):
+        try:
+            for _ in range(retries + 1):
+                # The reply is the answer; a separate ACK would only cost an ACK window slot
+                if not await self.send_cmd(cmd_id, b'', expect_ack=False):
+                    break
+                try:
+                    await asyncio.wait_for(asyncio.shield(pending), timeout or max(self.ack_window.rto, 0.2))
+                    return
+                except asyncio.TimeoutError:
+                    continue
+        finally:
+            if self._queries.get(cmd_id) is pending:
+                del self._queries[cmd_id]
+            if not pending.done():
+                pending.set_result(None)
+
+    def _drop_queries(self):
+        """Cancels the query loops; their callers get no reply (RuntimeError)."""
+        for task in self._query_tasks:
+            task.cancel()
+        queries, self._queries = self._queries, {}
+        for pending in queries.values():
+            if not pending.done():
+                pending.set_result(None)
+
+    def _next_seq(self) -> int:
+        # Skip seqs still waiting for an ACK so a wrapped counter can't alias them
+        while True:
+            self.seq = (self.seq + 1) % 65536
+            if self.seq not in self.ack_window:
+                return self.seq
+
+    def _write(self, data: bytes):
+        # Only the scheduler calls this; everything else goes through _submit
+        if self.transport is None:
+            return  # Link down between reopen attempts; the ACK timer handles the loss
+        if TRACE.isEnabledFor(logging.DEBUG):
+            TRACE.debug("TX %s %s", self.device_id, HexBytes(data))
+        if self.recorder is not None:
+            self.recorder.record(TX, data)
+        cmd_id = data[7]
+        metrics.TX_FRAMES.labels(self.device_id, cmd_id).inc()
+        metrics.TX_BYTES.labels(self.device_id, cmd_id).inc(len(data))
+        self.transport.write(data)
+
+    def _submit(self, data: bytes, priority: int, on_sent: Optional[Callable[[float], None]] = None):
+        self.scheduler.submit(data, priority, on_sent)
+
+    async def send_cmd(self, cmd_id: int, payload: bytes = b'', expect_ack: bool = True, timeout: Optional[float] = None, retries: int = 3,
+                       priority: Optional[int] = None, trace: Optional[Trace] = None) -> bool:
+        """
+        Sends a command. With expect_ack the call waits for the ACK, but other
+        commands keep flowing meanwhile (up to max_in_flight outstanding).
+        `timeout` fixes the per-attempt ACK timeout; None uses the adaptive RTO.
+        `priority` overrides the TxPriority class derived from cmd_id.
+        A `trace` is stamped at dispatch, transmit and ACK (see backend.tracing).
+        """
         if not self.connected:
+            if trace is not None:
+                trace.finish("not_connected")
             return False
-            
-        for attempt in range(retries + 1):
-            self.seq = (self.seq + 1) % 65536
-            seq = self.seq
-            
-            packet = SiyiPacket(seq=seq, cmd_id=cmd_id, payload=payload, need_ack=expect_ack)
-            encoded = packet.encode()
-            
-            if expect_ack:
-                fut = asyncio.get_running_loop().create_future()
-                self.ack_futures[seq] = fut
-                
-            try:
-                logger.info(f"TX: {encoded.hex()}")
-                self.transport.write(encoded)
-                if not expect_ack:
-                    return True
-                
-                await asyncio.wait_for(fut, timeout)
+
+        if priority is None:
+            priority = priority_for(cmd_id)
+        seq = self._next_seq()
+        if trace is not None:
+            trace.mark("dispatch")
+            if not expect_ack:
+                # Asks for an ACK to time the link, but goes out in order like any
+                # fire-and-forget frame: no window slot, no retransmit, nobody waits
+                encoded = encode_frame(seq, cmd_id, payload, need_ack=True)
+                self._traced[seq] = trace
+                self._submit(encoded, priority, on_sent=lambda t: self._on_traced_sent(seq, trace, t, timeout))
+                return True
+        encoded = encode_frame(seq, cmd_id, payload, need_ack=expect_ack)
+        try:
+            if not expect_ack:
+                self._submit(encoded, priority)
                 return True
-            except asyncio.TimeoutError:
-                logger.warning(f"Timeout waiting for ACK (seq={seq}, attempt={attempt+1})")
-                self.state["retries"] += 1
-                if seq in self.ack_futures:
-                    del self.ack_futures[seq]
-            except Exception as e:
-                logger.error(f"Error sending command: {e}")
-                self.state["errors"] += 1
-                return False
-                
-        return False
-
-    async def _heartbeat_loop(self):
-        while self.connected:
-            try:
-                # Send Acquire FW Version or Gimbal Status as heartbeat
-                # CMD ID 0x12 (18) = Acquire Firmware Version
-                await self.send_cmd(18, b'', expect_ack=True, timeout=2.0)
-            except Exception as e:
-                logger.error(f"Heartbeat error: {e}")
-            await asyncio.sleep(1.0) # 1Hz
+            if trace is not None:
+                return await self._send_traced(seq, encoded, priority, trace, timeout, retries)
+            ack = await self.ack_window.send(seq, encoded, timeout=timeout, retries=retries, tag=priority)
+        except Exception as e:
+            logger.error(f"Error sending command: {e}")
+            self.state["errors"] += 1
+            return False
+        return ack is not None
+
+    async def _send_traced(self, seq: int, encoded: bytes, priority: int, trace: Trace,
+                           timeout: Optional[float], retries: int) -> bool:
+        try:
+            ack = await self.ack_window.send(seq, encoded, timeout=timeout, retries=retries, tag=priority,
+                                             on_sent=lambda t: trace.mark("tx", t))
+        except Exception:
+            trace.finish("error")
+            raise
+        if ack is None:
+            trace.finish("no_ack")
+            return False
+        trace.mark("ack", self._ack_at)
+        trace.finish()
+        return True
+
+    def _on_traced_sent(self, seq: int, trace: Trace, sent_at: float, timeout: Optional[float]):
+        trace.mark("tx", sent_at)
+        rto = self.ack_window.rto if timeout is None else timeout
+        asyncio.get_running_loop().call_later(rto, self._on_traced_timeout, seq, trace)
+
+    def _drop_traced(self):
+        """Fails traced frames whose ACK can no longer come (queue dropped or link closed)."""
+        traced, self._traced = self._traced, {}
+        for trace in traced.values():
+            trace.finish("error")
+
+    def _on_traced_timeout(self, seq: int, trace: Trace):
+        if self._traced.get(seq) is trace:
+            del self._traced[seq]
+        trace.finish("no_ack")
 
 class SerialProtocol(asyncio.Protocol):
-    def __init__(self, packet_callback: Callable[[SiyiPacket], None]):
+    def __init__(self, packet_callback: Callable[[SiyiPacket], None],
+                 stats_callback: Optional[Callable[[FrameParser], None]] = None):
         self.callback = packet_callback
-        self.buffer = bytearray()
+        self.stats_callback = stats_callback
+        self.parser = FrameParser(packet_callback)
         self.transport = None
+        self.recorder: Optional[FlightLogWriter] = None
+        self.on_lost: Optional[Callable[[Optional[Exception]], None]] = None  # Set by the driver
 
     def connection_made(self, transport):
         self.transport = transport
 
-    def data_received(self, data):
-        # logger.info(f"RX: {data.hex()}")  # Debug: Verify we get ANY bytes
-        self.buffer.extend(data)
-        self._process_buffer()
+    def connection_lost(self, exc):
+        # Unplugged adapter, closed pty, ...
+        if self.on_lost:
+            self.on_lost(exc)
 
-    def _process_buffer(self):
-        while True:
-            packet, consumed = SiyiPacket.decode(self.buffer)
-            if consumed == 0:
-                break
-            
-            # Remove consumed bytes
-            # Note: consumed can be 1 (invalid header) or full packet len
-            del self.buffer[:consumed]
-            
-            if packet:
-                self.callback(packet)
+    def data_received(self, data):
+        if TRACE.isEnabledFor(logging.DEBUG):
+            TRACE.debug("RX %s", HexBytes(data))
+        if self.recorder is not None:
+            self.recorder.record(RX, data)
+        parser = self.parser
+        errors_before = parser.resync_bytes + parser.crc_failures
+        parser.feed(data)
+        if self.stats_callback and parser.resync_bytes + parser.crc_failures != errors_before:
+            self.stats_callback(parser)
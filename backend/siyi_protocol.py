@@ -1,12 +1,23 @@
+import binascii
+import os
 import struct
-from dataclasses import dataclass, field
-from typing import Optional, List, Tuple
+from dataclasses import dataclass
+from typing import Optional, List, Tuple, Sequence, Dict, Callable
 
 # Constants
 HEADER = 0x6655  # Low byte 0x55, High byte 0x66 (0x6655 as LE is 55 66)
 MIN_PACKET_LEN = 10  # STX(2) + CTRL(1) + LEN(2) + SEQ(2) + CMD(1) + CRC(2)
+STX_BYTES = struct.pack('<H', HEADER)  # b'\x55\x66'
+MAX_PAYLOAD_LEN = 4096  # Anything larger is treated as a corrupt length field
 
-@dataclass
+# Precompiled frame layout: STX(2) CTRL(1) Data_len(2) SEQ(2) CMD_ID(1) | DATA(N) | CRC16(2)
+FRAME_HEAD = struct.Struct('<HBHHB')
+FRAME_CRC = struct.Struct('<H')
+FRAME_SEQ = struct.Struct('<H')
+HEAD_LEN = FRAME_HEAD.size  # 8
+
+
+@dataclass(frozen=True, slots=True)
 class SiyiPacket:
     seq: int
     cmd_id: int
@@ -14,32 +25,48 @@ class SiyiPacket:
     need_ack: bool = False
     is_ack: bool = False
 
+    @property
+    def ctrl(self) -> int:
+        ctrl = 0
+        if self.need_ack:
+            ctrl |= 1
+        if self.is_ack:
+            ctrl |= 2
+        return ctrl
+
+    @property
+    def frame_size(self) -> int:
+        return MIN_PACKET_LEN + len(self.payload)
+
     def encode(self) -> bytes:
         """
         Encodes the packet into bytes according to SIYI SDK protocol.
         Format: STX(2) CTRL(1) Data_len(2) SEQ(2) CMD_ID(1) DATA(N) CRC16(2)
         STX is 0x5566 (0x55 then 0x66)
         """
-        stx_bytes = struct.pack('<H', HEADER)  # 0x55, 0x66
-        
-        ctrl = 0
-        if self.need_ack:
-            ctrl |= 1
-        if self.is_ack:
-            ctrl |= 2
-            
+        buf = bytearray(MIN_PACKET_LEN + len(self.payload))
+        self.encode_into(buf)
+        return bytes(buf)
+
+    def encode_into(self, buffer: bytearray, offset: int = 0) -> int:
+        """
+        Writes the encoded frame into `buffer` at `offset` without building
+        intermediate bytes objects. Returns the number of bytes written.
+        """
         length = len(self.payload)
-        # Length is 2 bytes, little endian
-        
-        # Header part for CRC calculation: CTRL + Data_len + SEQ + CMD_ID + DATA
-        # Note: STX is NOT included in CRC16 calculation usually, but SIYI docs say:
-        # "CRC16 is calculated from CTRL to DATA."
-        
-        header_body = struct.pack('<BHHB', ctrl, length, self.seq, self.cmd_id)
-        content = header_body + self.payload
-        
-        crc = SiyiCRC.calculate(content)
-        return stx_bytes + content + struct.pack('<H', crc)
+        body_end = offset + HEAD_LEN + length
+        if len(buffer) < body_end + 2:
+            raise ValueError(f"Buffer too small for {MIN_PACKET_LEN + length} byte frame at offset {offset}")
+
+        FRAME_HEAD.pack_into(buffer, offset, HEADER, self.ctrl, length, self.seq, self.cmd_id)
+        if length:
+            buffer[offset + HEAD_LEN:body_end] = self.payload
+
+        # "CRC16 is calculated from CTRL to DATA." (STX excluded)
+        with memoryview(buffer) as view:
+            crc = SiyiCRC.calculate(view[offset + 2:body_end])
+        FRAME_CRC.pack_into(buffer, body_end, crc)
+        return body_end + 2 - offset
 
     @classmethod
     def decode(cls, data: bytes) -> Tuple[Optional['SiyiPacket'], int]:
@@ -52,15 +79,11 @@ class SiyiPacket:
         if len(data) < MIN_PACKET_LEN:
             return None, 0
             
-        # Check Header
-        stx = struct.unpack('<H', data[0:2])[0]
+        stx, ctrl, length, seq, cmd_id = FRAME_HEAD.unpack_from(data)
         if stx != HEADER:
             # Shift buffer by 1 to find next potential header
             return None, 1
             
-        ctrl = data[2]
-        length = struct.unpack('<H', data[3:5])[0]
-        
         expected_total_len = MIN_PACKET_LEN + length
         if len(data) < expected_total_len:
             # Not enough data yet
@@ -68,44 +91,298 @@ class SiyiPacket:
             
         # Extract content for CRC check
         content_end = expected_total_len - 2
-        content = data[2:content_end]
-        received_crc = struct.unpack('<H', data[content_end:expected_total_len])[0]
+        received_crc = FRAME_CRC.unpack_from(data, content_end)[0]
         
-        calculated_crc = SiyiCRC.calculate(content)
+        calculated_crc = SiyiCRC.calculate(data[2:content_end])
         if calculated_crc != received_crc:
             # CRC failed, skip header and try again
             return None, 2 
             
-        # Parse fields
-        seq = struct.unpack('<H', data[5:7])[0]
-        cmd_id = data[7]
-        payload = data[8:content_end]
-        
         packet = cls(
             seq=seq,
             cmd_id=cmd_id,
-            payload=payload,
+            payload=bytes(data[HEAD_LEN:content_end]),  # data may be a view into a reused buffer
             need_ack=bool(ctrl & 1),
             is_ack=bool(ctrl & 2)
         )
         return packet, expected_total_len
 
 
+class FrameParser:
+    """
+    Incremental frame parser for a SIYI byte stream.
+
+    Incoming bytes are appended to one buffer and consumed through a read
+    cursor; STX is located with bytearray.find and the consumed prefix is
+    only compacted once it grows past `compact_threshold`.
+
+    The CRC is checked on a memoryview of the buffer. Only the payload of a
+    valid frame is copied out, as bytes, so packets stay valid after the
+    buffer is compacted or reused.
+    """
+    def __init__(self, callback: Callable[[SiyiPacket], None], compact_threshold: int = 4096):
+        self.callback = callback
+        self.compact_threshold = compact_threshold
+        self._buf = bytearray()
+        self._pos = 0
+
+        # Counters
+        self.frames = 0
+        self.resync_bytes = 0  # Bytes skipped while hunting for a valid frame
+        self.crc_failures = 0
+
+    @property
+    def pending(self) -> int:
+        """Number of buffered bytes not yet consumed."""
+        return len(self._buf) - self._pos
+
+    def feed(self, data: bytes):
+        self._append(data)
+
+        buf = self._buf
+        end = len(buf)
+        pos = self._pos
+        mv = memoryview(buf)
+        try:
+            while end - pos >= MIN_PACKET_LEN:
+                start = buf.find(STX_BYTES, pos)
+                if start < 0:
+                    # Keep a trailing 0x55, it may be the first half of the next STX
+                    keep = 1 if buf[end - 1] == STX_BYTES[0] else 0
+                    self.resync_bytes += end - pos - keep
+                    pos = end - keep
+                    break
+                if start != pos:
+                    self.resync_bytes += start - pos
+                    pos = start
+                    if end - pos < MIN_PACKET_LEN:
+                        break
+
+                length = buf[pos + 3] | (buf[pos + 4] << 8)
+                if length > MAX_PAYLOAD_LEN:
+                    self.resync_bytes += 2
+                    pos += 2
+                    continue
+                total = MIN_PACKET_LEN + length
+                if end - pos < total:
+                    break
+
+                content_end = pos + total - 2
+                received_crc = buf[content_end] | (buf[content_end + 1] << 8)
+                if SiyiCRC.calculate(mv[pos + 2:content_end]) != received_crc:
+                    # Same policy as SiyiPacket.decode: skip the header and resync
+                    self.crc_failures += 1
+                    self.resync_bytes += 2
+                    pos += 2
+                    continue
+
+                ctrl = buf[pos + 2]
+                packet = SiyiPacket(
+                    seq=buf[pos + 5] | (buf[pos + 6] << 8),
+                    cmd_id=buf[pos + 7],
+                    payload=bytes(mv[pos + 8:content_end]),
+                    need_ack=bool(ctrl & 1),
+                    is_ack=bool(ctrl & 2)
+                )
+                pos += total
+                self.frames += 1
+                self._pos = pos
+                self.callback(packet)
+        finally:
+            self._pos = pos
+            mv.release()
+
+    def reset(self):
+        self._buf = bytearray()
+        self._pos = 0
+
+    def _append(self, data: bytes):
+        buf = self._buf
+        pos = self._pos
+        if pos == len(buf):
+            del buf[:]
+            self._pos = 0
+        elif pos >= self.compact_threshold:
+            del buf[:pos]
+            self._pos = 0
+        buf.extend(data)
+
+
+def _crc16_reference(data: bytes, init: int = 0x0000) -> int:
+    """Bit-by-bit CRC16-CCITT. Slow, kept as the reference for equivalence tests."""
+    crc = init
+    for byte in data:
+        crc ^= (byte << 8)
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = (crc << 1) ^ 0x1021
+            else:
+                crc = crc << 1
+        crc &= 0xFFFF
+    return crc
+
+
+def _build_crc_table(poly: int = 0x1021) -> Tuple[int, ...]:
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ poly) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+        table.append(crc)
+    return tuple(table)
+
+
+CRC_TABLE = _build_crc_table()
+
+
+def _crc16_table(data: bytes, init: int = 0x0000) -> int:
+    """Byte-at-a-time CRC16-CCITT using the precomputed 256-entry table."""
+    crc = init
+    table = CRC_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFF00) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+def _crc16_native(data: bytes, init: int = 0x0000) -> int:
+    # binascii.crc_hqx is the same CRC (poly 0x1021, no reflection) implemented in C.
+    return binascii.crc_hqx(data, init)
+
+
+_CRC_ENGINES = {
+    "native": _crc16_native,
+    "table": _crc16_table,
+    "reference": _crc16_reference,
+}
+
+# Engine is picked once at import time: SIYI_CRC_ENGINE=native|table|reference
+CRC_ENGINE = os.environ.get("SIYI_CRC_ENGINE", "native").lower()
+if CRC_ENGINE not in _CRC_ENGINES:
+    raise ValueError(f"Unknown SIYI_CRC_ENGINE {CRC_ENGINE!r}, expected one of {sorted(_CRC_ENGINES)}")
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, batch calls fall back to the scalar engine
+    np = None
+
+# SIYI_CRC_BATCH=0 disables the NumPy batch path even when NumPy is installed
+CRC_BATCH_NUMPY = np is not None and os.environ.get("SIYI_CRC_BATCH", "1") != "0"
+
+
 class SiyiCRC:
     """
     CRC16-CCITT implementation for SIYI SDK.
     Poly: 0x1021
     Initial value: 0x0000
     """
+    engine = CRC_ENGINE
+    _calculate = staticmethod(_CRC_ENGINES[CRC_ENGINE])
+
+    @staticmethod
+    def calculate(data: bytes, init: int = 0x0000) -> int:
+        return SiyiCRC._calculate(data, init)
+
+    @staticmethod
+    def calculate_reference(data: bytes, init: int = 0x0000) -> int:
+        return _crc16_reference(data, init)
+
+    @staticmethod
+    def calculate_batch(chunks: Sequence[bytes], init: int = 0x0000) -> List[int]:
+        """
+        CRC of many independent buffers in one call.
+        With NumPy, buffers of equal length are processed column-wise, one
+        table lookup per byte position for the whole group.
+        """
+        if not CRC_BATCH_NUMPY or len(chunks) < 2:
+            calc = SiyiCRC._calculate
+            return [calc(chunk, init) for chunk in chunks]
+
+        results = [0] * len(chunks)
+        groups: Dict[int, List[int]] = {}
+        for i, chunk in enumerate(chunks):
+            groups.setdefault(len(chunk), []).append(i)
+
+        table = _np_crc_table()
+        for length, indices in groups.items():
+            crc = np.full(len(indices), init, dtype=np.uint16)
+            if length:
+                rows = np.frombuffer(b''.join(bytes(chunks[i]) for i in indices), dtype=np.uint8)
+                rows = rows.reshape(len(indices), length)
+                for col in range(length):
+                    crc = (crc << 8) ^ table[(crc >> 8) ^ rows[:, col]]
+            for i, value in zip(indices, crc.tolist()):
+                results[i] = value
+        return results
+
     @staticmethod
-    def calculate(data: bytes) -> int:
-        crc = 0x0000
-        for byte in data:
-            crc ^= (byte << 8)
-            for _ in range(8):
-                if crc & 0x8000:
-                    crc = (crc << 1) ^ 0x1021
-                else:
-                    crc = crc << 1
-            crc &= 0xFFFF
-        return crc
+    def verify_batch(frames: Sequence[bytes], init: int = 0x0000) -> List[bool]:
+        """
+        Checks the trailing CRC16 of many complete frames (STX..CRC) at once.
+        Frames shorter than MIN_PACKET_LEN are reported as invalid.
+        """
+        valid = [len(f) >= MIN_PACKET_LEN for f in frames]
+        candidates = [i for i, ok in enumerate(valid) if ok]
+        crcs = SiyiCRC.calculate_batch([frames[i][2:-2] for i in candidates], init)
+        for i, crc in zip(candidates, crcs):
+            frame = frames[i]
+            valid[i] = crc == (frame[-2] | (frame[-1] << 8))
+        return valid
+
+
+_NP_CRC_TABLE = None
+
+
+def _np_crc_table():
+    global _NP_CRC_TABLE
+    if _NP_CRC_TABLE is None:
+        _NP_CRC_TABLE = np.array(CRC_TABLE, dtype=np.uint16)
+    return _NP_CRC_TABLE
+
+
+# Payload-less commands: center, stop, zoom in/out, photo, record, firmware version (heartbeat)
+CACHED_CMD_IDS = (0, 5, 6, 7, 12, 13, 0x12)
+
+
+class FrameCache:
+    """
+    Fully encoded frames for payload-less commands.
+    Only SEQ and CRC change between sends; the CRC is resumed from the
+    precomputed CRC of CTRL + Data_len.
+    """
+    def __init__(self, cmd_ids: Sequence[int] = CACHED_CMD_IDS):
+        self._templates: Dict[Tuple[int, bool], Tuple[bytearray, memoryview, int]] = {}
+        for cmd_id in cmd_ids:
+            self._template(cmd_id, False)
+            self._template(cmd_id, True)
+
+    def _template(self, cmd_id: int, need_ack: bool) -> Tuple[bytearray, memoryview, int]:
+        key = (cmd_id, need_ack)
+        entry = self._templates.get(key)
+        if entry is None:
+            frame = bytearray(MIN_PACKET_LEN)
+            SiyiPacket(seq=0, cmd_id=cmd_id, need_ack=need_ack).encode_into(frame)
+            view = memoryview(frame)
+            # Templates are never resized, so the SEQ+CMD view can live as long as the frame
+            entry = (frame, view[5:8], SiyiCRC.calculate(view[2:5]))
+            self._templates[key] = entry
+        return entry
+
+    def encode(self, seq: int, cmd_id: int, need_ack: bool = False) -> bytes:
+        frame, seq_cmd, prefix_crc = self._template(cmd_id, need_ack)
+        FRAME_SEQ.pack_into(frame, 5, seq)
+        FRAME_CRC.pack_into(frame, 8, SiyiCRC.calculate(seq_cmd, prefix_crc))
+        # Hand out a copy: transports may hold on to the written object
+        return bytes(frame)
+
+
+FRAME_CACHE = FrameCache()
+
+
+def encode_frame(seq: int, cmd_id: int, payload: bytes = b'', need_ack: bool = False) -> bytes:
+    """Encodes a command frame, using FRAME_CACHE when there is no payload."""
+    if not payload:
+        return FRAME_CACHE.encode(seq, cmd_id, need_ack)
+    return SiyiPacket(seq=seq, cmd_id=cmd_id, payload=payload, need_ack=need_ack).encode()
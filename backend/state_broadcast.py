@@ -0,0 +1,160 @@
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from .binary_codec import encode_state_delta
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore(dict):
+    """
+    dict that versions every change.
+
+    Each assignment that actually changes a value bumps `version` and
+    records it against the key, so consumers can ask for just the keys
+    changed since a version they have already seen. Nested values are
+    treated as opaque: replace them, don't mutate them in place.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+        self._versions: Dict[str, int] = dict.fromkeys(self, 0)
+        self._listeners: List[Callable[[], None]] = []
+
+    def __setitem__(self, key, value):
+        if key in self and dict.__getitem__(self, key) == value:
+            return
+        dict.__setitem__(self, key, value)
+        self.version += 1
+        self._versions[key] = self.version
+        for listener in self._listeners:
+            listener()
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def changes_since(self, version: int) -> Dict[str, Any]:
+        return {key: self[key] for key, v in self._versions.items() if v > version}
+
+    def subscribe(self, listener: Callable[[], None]):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+
+class StateBroadcaster:
+    """
+    Pushes driver state to WebSocket clients only when it changes.
+
+    Changes are coalesced to at most `max_hz` ticks per broadcaster (one per
+    device), each fanned out to every subscriber at once. A client following
+    one device therefore gets at most `max_hz` deltas a second; one following
+    N devices can get N times that, plus the keyframes it asks for. Deltas
+    are {"type": "state_delta", "base", "version", "payload"}; the payload
+    holds every key changed after `base`, so a client at any version in
+    [base, version) can apply it, others ask for a keyframe. Full snapshots
+    ({"type": "state"}) go to new clients on connect and to everyone every
+    `keyframe_interval` seconds if anything changed. Idle ticks send nothing.
+    Clients on binary framing get deltas as fixed-layout records whenever
+    the changed keys fit one (see binary_codec).
+
+    With a `device_id`, messages carry {"device": id} and only go to
+    clients subscribed to that device.
+    """
+    def __init__(self, state: StateStore, manager, max_hz: float = 20.0, keyframe_interval: float = 10.0,
+                 device_id: Optional[str] = None):
+        self.state = state
+        self.manager = manager
+        self.device_id = device_id
+        self.min_interval = 1.0 / max_hz
+        self.keyframe_interval = keyframe_interval
+        self._changed = asyncio.Event()
+        self._sent_version = state.version
+        self._keyframe_version = -1
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.deltas_sent = 0
+        self.keyframes_sent = 0
+
+    def keyframe(self) -> Dict[str, Any]:
+        message = {"type": "state", "version": self.state.version, "payload": dict(self.state)}
+        if self.device_id is not None:
+            message["device"] = self.device_id
+        return message
+
+    async def send_keyframe(self, websocket):
+        # Through the manager so it stays ordered with queued broadcasts
+        await self.manager.send(websocket, self.keyframe())
+        self.keyframes_sent += 1
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self.state.subscribe(self._changed.set)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self.state.unsubscribe(self._changed.set)
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        last_sent = 0.0
+        last_keyframe = loop.time()
+        while True:
+            timeout = max(0.0, last_keyframe + self.keyframe_interval - loop.time())
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            # Coalesce bursts of changes into one message per interval
+            wait = last_sent + self.min_interval - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._changed.clear()
+
+            try:
+                now = loop.time()
+                version = self.state.version
+                if not self.manager.has_subscribers(self.device_id):
+                    self._sent_version = version
+                    last_keyframe = now
+                    continue
+                if now - last_keyframe >= self.keyframe_interval:
+                    last_keyframe = now
+                    if version == self._keyframe_version:
+                        continue  # Idle since the last keyframe
+                    self._keyframe_version = version
+                    message = self.keyframe()
+                    binary = None
+                    self.keyframes_sent += 1
+                else:
+                    delta = self.state.changes_since(self._sent_version)
+                    if not delta:
+                        continue
+                    message = {
+                        "type": "state_delta",
+                        "base": self._sent_version,
+                        "version": version,
+                        "payload": delta,
+                    }
+                    if self.device_id is not None:
+                        message["device"] = self.device_id
+                    binary = encode_state_delta(self.state, delta, self._sent_version, version)
+                    self.deltas_sent += 1
+                await self.manager.broadcast(message, binary=binary, topic=self.device_id)
+                self._sent_version = version
+                last_sent = loop.time()
+            except Exception as e:
+                logger.error(f"State broadcast error: {e}")
@@ -0,0 +1,193 @@
+import math
+import struct
+import time
+from array import array
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+
+# Command ids
+CMD_STATUS = 15       # Gimbal status information (0x0F)
+CMD_ATTITUDE = 22     # Attitude data (0x16)
+CMD_FIRMWARE = 0x12   # Firmware versions
+CMD_DATA_STREAM = 0x25  # Request the gimbal to push a data stream
+
+STREAM_ATTITUDE = 1
+
+# Attitude payload: yaw, pitch, roll, yaw/pitch/roll angular velocity.
+# int16 little endian, 0.1 degree (or degree/s) per unit.
+ATTITUDE_STRUCT = struct.Struct('<hhhhhh')
+
+# data_freq byte of the stream request -> Hz
+STREAM_RATES = {0: 0, 1: 2, 2: 4, 3: 5, 4: 10, 5: 20, 6: 50, 7: 100}
+
+# Firmware payload: camera board, gimbal and zoom versions, uint32 each;
+# the low three bytes are major.minor.patch
+FIRMWARE_STRUCT = struct.Struct('<III')
+
+RECORD_STATES = {0: "off", 1: "recording", 2: "no_card", 3: "data_loss"}
+MOTION_MODES = {0: "lock", 1: "follow", 2: "fpv"}
+
+# A8 mini mechanical range in degrees, and the rate (deg/s) of a rotate
+# command at speed byte 100; rotate speed scales linearly below that
+YAW_LIMITS = (-135.0, 135.0)
+PITCH_LIMITS = (-90.0, 25.0)
+MAX_RATE = 90.0
+
+FIELDS = ("yaw", "pitch", "roll", "yaw_rate", "pitch_rate", "roll_rate")
+
+
+class AttitudeSample(NamedTuple):
+    t: float  # time.monotonic()
+    yaw: float
+    pitch: float
+    roll: float
+    yaw_rate: float
+    pitch_rate: float
+    roll_rate: float
+
+
+def decode_attitude(payload: bytes) -> Optional[Tuple[float, ...]]:
+    """Returns (yaw, pitch, roll, yaw_rate, pitch_rate, roll_rate) in degrees, or None if too short."""
+    if len(payload) < ATTITUDE_STRUCT.size:
+        return None
+    return tuple(v / 10.0 for v in ATTITUDE_STRUCT.unpack_from(payload))
+
+
+class FirmwareVersion(NamedTuple):
+    camera: str
+    gimbal: str
+    zoom: str
+
+
+def _version(value: int) -> str:
+    return f"{(value >> 16) & 0xFF}.{(value >> 8) & 0xFF}.{value & 0xFF}"
+
+
+def decode_firmware(payload: bytes) -> Optional[FirmwareVersion]:
+    if len(payload) < FIRMWARE_STRUCT.size:
+        return None
+    return FirmwareVersion(*(_version(v) for v in FIRMWARE_STRUCT.unpack_from(payload)))
+
+
+def decode_status(payload: bytes) -> Dict[str, str]:
+    """
+    Gimbal status: reserved, hdr_sta, reserved, record_sta, motion_mode, ...
+    Missing trailing fields are left out.
+    """
+    status = {}
+    if len(payload) > 3:
+        status["record_state"] = RECORD_STATES.get(payload[3], "unknown")
+    if len(payload) > 4:
+        status["motion_mode"] = MOTION_MODES.get(payload[4], "unknown")
+    return status
+
+
+def stream_rate_code(hz: float) -> int:
+    """Closest data_freq code for the requested rate (0 turns the stream off)."""
+    if hz <= 0:
+        return 0
+    return min((code for code in STREAM_RATES if code), key=lambda code: abs(STREAM_RATES[code] - hz))
+
+
+class AttitudeHistory:
+    """
+    Fixed-size ring buffer of attitude samples.
+
+    Each field is its own preallocated array('d') column, so appending
+    never allocates and a column can be exposed as a memoryview (e.g. for
+    numpy.frombuffer) without copying. Window queries walk backwards from
+    the newest sample and stop at the window edge.
+    """
+    def __init__(self, capacity: int = 2048):
+        self.capacity = capacity
+        self._t = array('d', bytes(8 * capacity))
+        self._cols = [array('d', bytes(8 * capacity)) for _ in FIELDS]
+        self._head = 0  # Next write position
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, t: float, values: Tuple[float, ...]):
+        i = self._head
+        self._t[i] = t
+        for col, value in zip(self._cols, values):
+            col[i] = value
+        self._head = (i + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def clear(self):
+        self._head = 0
+        self._count = 0
+
+    def _sample(self, i: int) -> AttitudeSample:
+        return AttitudeSample(self._t[i], *(col[i] for col in self._cols))
+
+    def latest(self) -> Optional[AttitudeSample]:
+        if not self._count:
+            return None
+        return self._sample((self._head - 1) % self.capacity)
+
+    def iter_window(self, seconds: float, now: Optional[float] = None) -> Iterator[AttitudeSample]:
+        """Yields samples newer than `now - seconds`, newest first."""
+        if now is None:
+            now = time.monotonic()
+        cutoff = now - seconds
+        i = self._head
+        for _ in range(self._count):
+            i = (i - 1) % self.capacity
+            if self._t[i] < cutoff:
+                break
+            yield self._sample(i)
+
+    def window_stats(self, seconds: float, now: Optional[float] = None) -> Dict[str, object]:
+        """Count, mean, min, max and standard deviation per field over the last `seconds`."""
+        if now is None:
+            now = time.monotonic()
+        cutoff = now - seconds
+        n = 0
+        mean = [0.0] * len(FIELDS)
+        m2 = [0.0] * len(FIELDS)
+        lo = [math.inf] * len(FIELDS)
+        hi = [-math.inf] * len(FIELDS)
+        oldest = newest = None
+
+        i = self._head
+        for _ in range(self._count):
+            i = (i - 1) % self.capacity
+            t = self._t[i]
+            if t < cutoff:
+                break
+            if newest is None:
+                newest = t
+            oldest = t
+            n += 1
+            # Welford's running mean/variance
+            for k, col in enumerate(self._cols):
+                v = col[i]
+                delta = v - mean[k]
+                mean[k] += delta / n
+                m2[k] += delta * (v - mean[k])
+                if v < lo[k]:
+                    lo[k] = v
+                if v > hi[k]:
+                    hi[k] = v
+
+        result: Dict[str, object] = {"count": n, "window": seconds}
+        if n:
+            span = newest - oldest
+            result["rate_hz"] = round((n - 1) / span, 2) if span > 0 else None
+            for k, name in enumerate(FIELDS):
+                result[name] = {
+                    "mean": mean[k],
+                    "min": lo[k],
+                    "max": hi[k],
+                    "std": math.sqrt(m2[k] / n),
+                }
+        return result
+
+    def column(self, name: str) -> memoryview:
+        """Zero-copy view of a raw column ("t" or one of FIELDS), in ring order."""
+        if name == "t":
+            return memoryview(self._t)
+        return memoryview(self._cols[FIELDS.index(name)])
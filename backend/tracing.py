@@ -0,0 +1,83 @@
+"""
+Opt-in latency tracing of control commands.
+
+A WS control message may carry {"trace": {"id": ..., "t": <client clock>}}
+(or just an id). The server then stamps the command with event-loop
+time at each stage:
+
+    recv      message taken off the WebSocket
+    dispatch  send_cmd called (after the coalescer's control tick for rates)
+    tx        frame handed to the transport by the TX scheduler
+    ack       ACK from the gimbal processed
+
+and derives the spans coalesce (recv..dispatch), tx_queue
+(dispatch..tx), link (tx..ack) and server (recv..last stage), exported as
+siyi_trace_stage_seconds{stage}. The finished report is echoed to the
+client as a "trace" message with the client's timestamp, so the UI can
+show the full round trip. Untraced commands pay one dict lookup.
+"""
+import asyncio
+import os
+from typing import Any, Dict, Optional
+
+from . import metrics
+
+TRACING_ENABLED = os.environ.get("SIYI_TRACING", "1") != "0"
+
+STAGES = ("recv", "dispatch", "tx", "ack")
+SPANS = (("coalesce", "recv", "dispatch"), ("tx_queue", "dispatch", "tx"), ("link", "tx", "ack"))
+
+
+class Trace:
+    """Stage timestamps (loop time, seconds) of one traced command."""
+    __slots__ = ("id", "client_ts", "marks", "done")
+
+    def __init__(self, trace_id: Any, client_ts: Optional[float] = None, marks: Optional[Dict[str, float]] = None):
+        self.id = trace_id
+        self.client_ts = client_ts
+        self.marks: Dict[str, float] = dict(marks or {})
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()  # Resolves to report()
+
+    def mark(self, stage: str, t: Optional[float] = None):
+        """Records `stage` once; the first time wins (e.g. over a retransmit)."""
+        if stage not in self.marks:
+            self.marks[stage] = asyncio.get_running_loop().time() if t is None else t
+
+    def spans(self) -> Dict[str, float]:
+        spans = {name: self.marks[end] - self.marks[start]
+                 for name, start, end in SPANS if start in self.marks and end in self.marks}
+        if "recv" in self.marks:
+            spans["server"] = max(self.marks.values()) - self.marks["recv"]
+        return spans
+
+    def report(self, result: str) -> Dict[str, Any]:
+        return {
+            "type": "trace",
+            "id": self.id,
+            "client_ts": self.client_ts,
+            "result": result,
+            "stages_ms": {name: round(value * 1000, 3) for name, value in self.spans().items()},
+        }
+
+    def finish(self, result: str = "ok"):
+        """Observes the spans and resolves `done`; later calls are ignored."""
+        if self.done.done():
+            return
+        spans = self.spans()
+        for name, value in spans.items():
+            metrics.TRACE_STAGE.labels(name).observe(value)
+        metrics.TRACES.labels(result).inc()
+        self.done.set_result(self.report(result))
+
+
+def trace_from(message: Dict[str, Any]) -> Optional[Trace]:
+    """A Trace for a WS message carrying a "trace" field, stamped "recv"; None otherwise."""
+    value = message.get("trace")
+    if value is None or not TRACING_ENABLED:
+        return None
+    if isinstance(value, dict):
+        trace = Trace(value.get("id"), value.get("t"))
+    else:
+        trace = Trace(value)
+    trace.mark("recv")
+    return trace
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from typing import Callable, Optional, Tuple
+
+from .siyi_protocol import SiyiPacket
+from .flightlog import RX_DATAGRAM
+
+logger = logging.getLogger(__name__)
+
+# SIYI Ethernet SDK endpoint
+SIYI_UDP_HOST = "192.168.144.25"
+SIYI_UDP_PORT = 37260
+
+TRANSPORTS = ("serial", "udp")
+
+
+async def open_serial(protocol_factory: Callable[[], asyncio.Protocol], port: str, baud: int):
+    """Opens a UART link; returns (transport, protocol)."""
+    # Imported here so the UDP path works without pyserial installed
+    import serial_asyncio
+    loop = asyncio.get_running_loop()
+    return await serial_asyncio.create_serial_connection(loop, protocol_factory, port, baudrate=baud)
+
+
+class DatagramLink(asyncio.DatagramProtocol):
+    """
+    SIYI over UDP. Each datagram carries whole frames, so there is no
+    stream reassembly: datagrams are decoded on their own and any trailing
+    garbage is discarded with them. Exposes the write()/close() subset of
+    a stream transport that SiyiDriver uses, plus the FrameParser counters.
+    """
+    def __init__(self, packet_callback: Callable[[SiyiPacket], None],
+                 stats_callback: Optional[Callable[['DatagramLink'], None]] = None):
+        self.callback = packet_callback
+        self.stats_callback = stats_callback
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.recorder = None  # Optional FlightLogWriter, set by the driver
+        self.on_lost = None  # Called with the exception if the socket closes under us
+
+        # Counters, same names as FrameParser
+        self.frames = 0
+        self.resync_bytes = 0
+        self.crc_failures = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        if self.recorder is not None:
+            self.recorder.record(RX_DATAGRAM, data)
+        errors_before = self.resync_bytes + self.crc_failures
+        view = memoryview(data)
+        offset = 0
+        while offset < len(data):
+            packet, consumed = SiyiPacket.decode(view[offset:])
+            if consumed == 0:
+                # Truncated frame; nothing more will arrive for it
+                self.resync_bytes += len(data) - offset
+                break
+            if packet is None:
+                if consumed == 2:
+                    self.crc_failures += 1
+                self.resync_bytes += consumed
+            else:
+                self.frames += 1
+                self.callback(packet)
+            offset += consumed
+        if self.stats_callback and self.resync_bytes + self.crc_failures != errors_before:
+            self.stats_callback(self)
+
+    def connection_lost(self, exc):
+        if self.on_lost:
+            self.on_lost(exc)
+
+    def error_received(self, exc):
+        logger.warning(f"UDP error: {exc}")
+
+    def write(self, data: bytes):
+        self.transport.sendto(data)
+
+    def close(self):
+        if self.transport:
+            self.transport.close()
+
+    def is_closing(self) -> bool:
+        return self.transport is None or self.transport.is_closing()
+
+
+async def open_udp(packet_callback: Callable[[SiyiPacket], None],
+                   stats_callback: Optional[Callable[[DatagramLink], None]] = None,
+                   host: str = SIYI_UDP_HOST, port: int = SIYI_UDP_PORT) -> Tuple[DatagramLink, DatagramLink]:
+    """Opens a UDP link to the gimbal; the link acts as both transport and protocol."""
+    loop = asyncio.get_running_loop()
+    _, link = await loop.create_datagram_endpoint(
+        lambda: DatagramLink(packet_callback, stats_callback),
+        remote_addr=(host, port),
+    )
+    return link, link
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+from collections import deque
+from enum import IntEnum
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TxPriority(IntEnum):
+    """Transmit classes, lower value goes out first."""
+    SAFETY = 0      # Stop
+    MOTION = 1      # Rotate, center
+    CAMERA = 2      # Zoom, photo, record
+    TELEMETRY = 3   # Attitude / status polling
+    HEARTBEAT = 4   # Firmware / hardware id probes
+
+
+CMD_PRIORITY: Dict[int, TxPriority] = {
+    0: TxPriority.MOTION,      # Center
+    1: TxPriority.MOTION,      # Up
+    2: TxPriority.MOTION,      # Down
+    3: TxPriority.MOTION,      # Right
+    4: TxPriority.MOTION,      # Left
+    5: TxPriority.SAFETY,      # Stop
+    6: TxPriority.CAMERA,      # Zoom +1
+    7: TxPriority.CAMERA,      # Zoom -1
+    12: TxPriority.CAMERA,     # Photo
+    13: TxPriority.CAMERA,     # Record
+    15: TxPriority.TELEMETRY,  # Gimbal status
+    22: TxPriority.TELEMETRY,  # Attitude
+    0x25: TxPriority.TELEMETRY,  # Data stream request
+    0x02: TxPriority.HEARTBEAT,  # Hardware ID
+    0x12: TxPriority.HEARTBEAT,  # Firmware version
+}
+
+
+def priority_for(cmd_id: int) -> TxPriority:
+    return CMD_PRIORITY.get(cmd_id, TxPriority.TELEMETRY)
+
+
+class _ClassStats:
+    __slots__ = ("sent", "bytes", "wait_avg", "wait_max")
+
+    def __init__(self):
+        self.sent = 0
+        self.bytes = 0
+        self.wait_avg = 0.0
+        self.wait_max = 0.0
+
+    def record(self, size: int, wait: float):
+        self.sent += 1
+        self.bytes += size
+        # EWMA keeps the average cheap and biased towards recent traffic
+        self.wait_avg += (wait - self.wait_avg) * (0.1 if self.sent > 1 else 1.0)
+        if wait > self.wait_max:
+            self.wait_max = wait
+
+
+class TxScheduler:
+    """
+    Single transmit queue for the driver.
+
+    Frames are queued per TxPriority class and drained highest class first,
+    paced by a token bucket sized from the link's byte rate (baud / 10 for
+    8N1) so the OS/UART buffer never holds a backlog that a stop would have
+    to wait behind. SAFETY frames may overdraw the bucket, and so may a
+    frame larger than the whole bucket once it is full.
+    """
+    def __init__(self, write: Callable[[bytes], None], baud: Optional[int] = 115200,
+                 burst_seconds: float = 0.01, stats_interval: float = 0.25,
+                 stats_callback: Optional[Callable[['TxScheduler'], None]] = None):
+        self.write = write
+        self.burst_seconds = burst_seconds
+        self.stats_interval = stats_interval
+        self.stats_callback = stats_callback
+
+        self._queues: List[Deque[Tuple[bytes, float, Optional[Callable[[float], None]]]]] = [deque() for _ in TxPriority]
+        self._stats = [_ClassStats() for _ in TxPriority]
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._notify_handle: Optional[asyncio.TimerHandle] = None
+        self._last_notify = 0.0
+
+        self.rate: Optional[float] = None
+        self.capacity = 0.0
+        self.tokens = 0.0
+        self._refill_at = 0.0
+        self.set_baud(baud)
+
+    def set_baud(self, baud: Optional[int]):
+        """Sets the byte budget from a serial baud rate; None disables pacing."""
+        if baud:
+            self.rate = baud / 10.0
+            self.capacity = max(32.0, self.rate * self.burst_seconds)
+        else:
+            self.rate = None
+            self.capacity = 0.0
+        self.tokens = self.capacity
+
+    @property
+    def depth(self) -> int:
+        return sum(len(q) for q in self._queues)
+
+    def snapshot(self) -> Dict[str, Any]:
+        classes = {}
+        for prio in TxPriority:
+            st = self._stats[prio]
+            classes[prio.name.lower()] = {
+                "depth": len(self._queues[prio]),
+                "sent": st.sent,
+                "wait_avg_ms": round(st.wait_avg * 1000, 2),
+                "wait_max_ms": round(st.wait_max * 1000, 2),
+            }
+        return {
+            "depth": self.depth,
+            "bytes_per_s": self.rate,
+            "classes": classes,
+        }
+
+    def submit(self, frame: bytes, priority: int = TxPriority.TELEMETRY,
+               on_sent: Optional[Callable[[float], None]] = None):
+        """
+        Queues `frame` for transmission. `on_sent` is called with the loop
+        time at which the frame was handed to the transport.
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+
+        # Fast path: nothing queued ahead and budget available. SAFETY frames
+        # only yield to earlier SAFETY frames and never wait for budget.
+        if priority == TxPriority.SAFETY:
+            ahead = len(self._queues[TxPriority.SAFETY])
+        else:
+            ahead = self.depth
+        if not ahead and self._take(len(frame), now, priority):
+            self._send(prio=priority, frame=frame, queued_at=now, on_sent=on_sent, now=now)
+            return
+
+        self._queues[priority].append((frame, now, on_sent))
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        self._notify()
+
+    def clear(self):
+        """Drops queued frames, e.g. on disconnect."""
+        for q in self._queues:
+            q.clear()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self.tokens = self.capacity
+        self._notify()
+
+    def _refill(self, now: float):
+        if self.rate is None:
+            return
+        self.tokens = min(self.capacity, self.tokens + (now - self._refill_at) * self.rate)
+        self._refill_at = now
+
+    def _take(self, size: int, now: float, priority: int) -> bool:
+        if self.rate is None:
+            return True
+        self._refill(now)
+        # A frame bigger than the bucket would never fit: send it from a full bucket, into debt
+        if self.tokens >= min(size, self.capacity) or priority == TxPriority.SAFETY:
+            self.tokens -= size
+            return True
+        return False
+
+    def _send(self, prio: int, frame: bytes, queued_at: float, on_sent, now: float):
+        try:
+            self.write(frame)
+        except Exception as e:
+            logger.error(f"TX write failed: {e}")
+        self._stats[prio].record(len(frame), now - queued_at)
+        if on_sent:
+            on_sent(now)
+        self._notify()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            queue = None
+            for prio, q in enumerate(self._queues):
+                if q:
+                    queue = q
+                    break
+            if queue is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            frame, queued_at, on_sent = queue[0]
+            now = loop.time()
+            if not self._take(len(frame), now, prio):
+                # Sleep until the bucket covers this frame, then re-pick in
+                # case something more urgent arrived meanwhile
+                await asyncio.sleep((min(len(frame), self.capacity) - self.tokens) / self.rate)
+                continue
+            queue.popleft()
+            self._send(prio, frame, queued_at, on_sent, now)
+
+    def _notify(self):
+        if not self.stats_callback or self._notify_handle is not None:
+            return
+        loop = asyncio.get_running_loop()
+        delay = self._last_notify + self.stats_interval - loop.time()
+        if delay <= 0:
+            self._emit_stats()
+        else:
+            self._notify_handle = loop.call_later(delay, self._emit_stats)
+
+    def _emit_stats(self):
+        self._notify_handle = None
+        self._last_notify = asyncio.get_running_loop().time()
+        self.stats_callback(self)
@@ -0,0 +1,79 @@
+"""
+ConnectionManager.broadcast fan-out: time from broadcast() to each
+client's send_text, and the cost of the broadcast call itself, for 1, 10
+and 50 connected clients.
+
+    python -m benchmarks.bench_broadcast [--messages N] [--json out.json]
+"""
+import argparse
+import asyncio
+import time
+
+from backend.connection import ConnectionManager
+
+from .common import dump, percentiles, to_us
+
+
+class TimingWebSocket:
+    """Accepts everything instantly and records when each message arrived."""
+    def __init__(self, sent_at):
+        self.sent_at = sent_at
+        self.latencies = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.latencies.append(time.perf_counter_ns() - self.sent_at[0])
+
+    async def send_bytes(self, data):
+        self.latencies.append(time.perf_counter_ns() - self.sent_at[0])
+
+    async def close(self, code=1000):
+        pass
+
+
+async def _fan_out(clients: int, messages: int, rate_hz: float):
+    manager = ConnectionManager(max_queue=64, max_lag=60)
+    sent_at = [0]
+    sockets = [TimingWebSocket(sent_at) for _ in range(clients)]
+    for ws in sockets:
+        await manager.connect(ws)
+
+    message = {"type": "state_delta", "base": 0, "version": 1,
+               "payload": {"yaw": 12.3, "pitch": -4.5, "roll": 0.1, "yaw_rate": 1.0}}
+    call_ns = []
+    for i in range(messages):
+        message["version"] = i + 1
+        sent_at[0] = time.perf_counter_ns()
+        await manager.broadcast(message)
+        call_ns.append(time.perf_counter_ns() - sent_at[0])
+        # Let every writer drain before the next one, like a paced state stream
+        await asyncio.sleep(1.0 / rate_hz)
+
+    latencies = [lat for ws in sockets for lat in ws.latencies]
+    for ws in sockets:
+        manager.disconnect(ws)
+    return {
+        "delivered": len(latencies) / (clients * messages),
+        "broadcast_call_us": percentiles(to_us(call_ns)),
+        "delivery_us": percentiles(to_us(latencies)),
+    }
+
+
+def run(messages: int = 200, rate_hz: float = 500.0, clients=(1, 10, 50)):
+    async def main():
+        return {f"clients_{n}": await _fan_out(n, messages, rate_hz) for n in clients}
+    return {"messages": messages, "cases": asyncio.run(main())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+    dump(run(args.messages), args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+SiyiDriver.send_cmd round trip against an in-process fake transport that
+ACKs every frame after `--latency` seconds: per-command latency percentiles
+(sequential and with the ACK window full) and fire-and-forget throughput.
+
+    python -m benchmarks.bench_driver [--count N] [--latency S] [--json out.json]
+"""
+import argparse
+import asyncio
+import time
+
+from backend.siyi_driver import SiyiDriver
+from backend.siyi_protocol import FrameParser, SiyiPacket
+
+from .common import dump, percentiles, to_us
+
+
+class AckingTransport:
+    """Stream transport stand-in: parses written frames and ACKs those that ask for it."""
+    def __init__(self, driver: SiyiDriver, latency: float = 0.0):
+        self.driver = driver
+        self.latency = latency
+        self.loop = asyncio.get_running_loop()
+        self.parser = FrameParser(self._on_frame)
+        self.written = 0
+
+    def _on_frame(self, packet: SiyiPacket):
+        if not packet.need_ack:
+            return
+        ack = SiyiPacket(seq=packet.seq, cmd_id=packet.cmd_id, is_ack=True)
+        if self.latency:
+            self.loop.call_later(self.latency, self.driver._on_packet_received, ack)
+        else:
+            self.loop.call_soon(self.driver._on_packet_received, ack)
+
+    def write(self, data: bytes):
+        self.written += len(data)
+        self.parser.feed(data)
+
+    def close(self):
+        pass
+
+
+def _attach(driver: SiyiDriver, latency: float):
+    # Bypass connect(): no heartbeat, no pacing, just the send path
+    driver.transport = AckingTransport(driver, latency)
+    driver.connected = True
+    driver.scheduler.set_baud(None)
+
+
+async def _run(count: int, latency: float):
+    results = {"count": count, "ack_latency_s": latency, "cases": {}}
+    cases = results["cases"]
+
+    driver = SiyiDriver()
+    _attach(driver, latency)
+
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter_ns()
+        await driver.send_cmd(0, b'', expect_ack=True)
+        samples.append(time.perf_counter_ns() - start)
+    cases["sequential_rtt_us"] = percentiles(to_us(samples))
+
+    async def timed():
+        start = time.perf_counter_ns()
+        ok = await driver.send_cmd(0, b'', expect_ack=True)
+        return time.perf_counter_ns() - start if ok else None
+
+    start = time.perf_counter()
+    windowed = await asyncio.gather(*(timed() for _ in range(count)))
+    elapsed = time.perf_counter() - start
+    cases["windowed_rtt_us"] = percentiles(to_us([s for s in windowed if s is not None]))
+    cases["windowed_cmds_per_s"] = count / elapsed
+    cases["windowed_failed"] = sum(1 for s in windowed if s is None)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        await driver.send_cmd(5, b'', expect_ack=False)
+    cases["no_ack_cmds_per_s"] = count / (time.perf_counter() - start)
+    cases["retransmits"] = driver.ack_window.retransmits
+    return results
+
+
+def run(count: int = 2000, latency: float = 0.0):
+    return asyncio.run(_run(count, latency))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake gimbal ACK latency, seconds")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+    dump(run(args.count, args.latency), args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Codec throughput: CRC MB/s per engine, frame encode/decode rate and the
+FrameParser cost on clean vs noisy serial streams.
+
+    python -m benchmarks.bench_protocol [--scale S] [--json out.json]
+"""
+import argparse
+import random
+
+from backend.siyi_protocol import (_CRC_ENGINES, CRC_ENGINE, FrameParser, SiyiCRC, SiyiPacket,
+                                   encode_frame)
+from backend.telemetry import ATTITUDE_STRUCT
+
+from .common import best_of, dump
+
+
+def _frames(rng, count):
+    frames = []
+    for i in range(count):
+        payload = ATTITUDE_STRUCT.pack(*(rng.randint(-1800, 1800) for _ in range(6)))
+        frames.append(SiyiPacket(seq=i % 65536, cmd_id=22, payload=payload).encode())
+    return frames
+
+
+def _noisy_stream(rng, frames, noise):
+    """Frames with random garbage (and stray STX bytes) between them, `noise` garbage bytes per frame."""
+    out = bytearray()
+    garbage_total = 0
+    for frame in frames:
+        count = rng.randint(0, 2 * noise)
+        garbage = bytearray(rng.getrandbits(8) for _ in range(count))
+        if count >= 4 and rng.random() < 0.5:
+            garbage[1:3] = b'\x55\x66'
+        out += garbage
+        out += frame
+        garbage_total += count
+    return bytes(out), garbage_total
+
+
+def _parse_rate(stream, chunk, repeat):
+    def run():
+        parser = FrameParser(lambda packet: None)
+        for i in range(0, len(stream), chunk):
+            parser.feed(stream[i:i + chunk])
+        run.frames = parser.frames
+        return parser.frames
+    rate = best_of(run, repeat)
+    return rate, run.frames
+
+
+def run(scale: float = 1.0, seed: int = 1, repeat: int = 5):
+    rng = random.Random(seed)
+    results = {"crc_engine": CRC_ENGINE, "cases": {}}
+    cases = results["cases"]
+
+    block = bytes(rng.getrandbits(8) for _ in range(4096))
+    for name, engine in _CRC_ENGINES.items():
+        loops = max(1, int((2000 if name == "native" else 20) * scale))
+
+        def crc_run(engine=engine, loops=loops):
+            for _ in range(loops):
+                engine(block)
+            return loops * len(block)
+        cases[f"crc_{name}_mb_s"] = best_of(crc_run, repeat) / 1e6
+
+    count = max(100, int(20000 * scale))
+    frames = _frames(rng, count)
+    packets = [SiyiPacket.decode(f)[0] for f in frames]
+    small = [SiyiPacket(seq=i, cmd_id=5, need_ack=True) for i in range(count)]
+
+    cases["encode_attitude_fps"] = best_of(lambda: sum(1 for p in packets if p.encode()), repeat)
+    cases["encode_cached_fps"] = best_of(
+        lambda: sum(1 for i in range(count) if encode_frame(i % 65536, 5, need_ack=True)), repeat)
+    cases["encode_uncached_fps"] = best_of(lambda: sum(1 for p in small if p.encode()), repeat)
+    cases["decode_fps"] = best_of(lambda: sum(1 for f in frames if SiyiPacket.decode(f)[0]), repeat)
+    cases["crc_batch_fps"] = best_of(lambda: len(SiyiCRC.verify_batch(frames)), repeat)
+
+    clean = b''.join(frames)
+    clean_fps, _ = _parse_rate(clean, 256, repeat)
+    cases["parse_clean_fps"] = clean_fps
+    cases["parse_clean_mb_s"] = clean_fps * len(clean) / count / 1e6
+    for noise in (4, 32):
+        stream, garbage = _noisy_stream(rng, frames, noise)
+        fps, parsed = _parse_rate(stream, 256, repeat)
+        # Extra time per garbage byte relative to the clean stream
+        per_frame_s = 1.0 / fps - 1.0 / clean_fps
+        cases[f"parse_noise{noise}_fps"] = fps
+        cases[f"parse_noise{noise}_recovered"] = parsed / count
+        cases[f"parse_noise{noise}_resync_ns_per_byte"] = per_frame_s * count / max(1, garbage) * 1e9
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0, help="Work multiplier (smaller is faster)")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+    dump(run(args.scale), args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Bytes on the wire and server CPU per message, JSON vs binary framing.
+
+    python -m benchmarks.bench_ws_format [--count N] [--json out.json]
+"""
+import argparse
+import json
+import math
+import random
+import time
+
+from backend.binary_codec import decode_command, encode_gimbal_rate, encode_state_delta
+from backend.connection import encode_message
+
+
+def _state(rng):
+    return {
+        "connected": True, "yaw": rng.uniform(-180, 180), "pitch": rng.uniform(-90, 25),
+        "roll": rng.uniform(-5, 5), "yaw_rate": rng.uniform(-50, 50),
+        "pitch_rate": rng.uniform(-50, 50), "roll_rate": 0.0, "last_ack_ts": time.time(),
+        "retries": 3, "errors": 0, "crc_failures": 1, "resync_bytes": 120, "in_flight": 1,
+        "srtt_ms": 12.5, "rto_ms": 60.0,
+    }
+
+
+def _cpu_per_call(fn, items):
+    start = time.process_time_ns()
+    for item in items:
+        fn(item)
+    return (time.process_time_ns() - start) / len(items)
+
+
+def run(count: int = 20000, seed: int = 1):
+    rng = random.Random(seed)
+    states = [_state(rng) for _ in range(count)]
+    attitude_keys = ("yaw", "pitch", "roll", "yaw_rate", "pitch_rate", "roll_rate")
+    hot_keys = tuple(states[0])
+
+    def json_delta(keys):
+        return lambda st: encode_message({
+            "type": "state_delta", "base": 100, "version": 106,
+            "payload": {k: st[k] for k in keys},
+        })
+
+    def binary_delta(keys):
+        return lambda st: encode_state_delta(st, keys, 100, 106)
+
+    commands_json = [encode_message({"type": "gimbal_rate", "yaw": rng.choice((-1, 0, 1)),
+                                     "pitch": rng.choice((-1, 0, 1)), "speed": rng.randint(0, 100)})
+                     for _ in range(count)]
+    commands_bin = [encode_gimbal_rate(rng.choice((-1, 0, 1)), rng.choice((-1, 0, 1)), rng.randint(0, 100))
+                    for _ in range(count)]
+
+    results = {"count": count, "cases": {}}
+    for name, keys in (("attitude_delta", attitude_keys), ("state_delta", hot_keys)):
+        enc_json, enc_bin = json_delta(keys), binary_delta(keys)
+        results["cases"][name] = {
+            "json_bytes": sum(len(enc_json(st).encode()) for st in states) / count,
+            "binary_bytes": sum(len(enc_bin(st)) for st in states) / count,
+            "json_encode_ns": _cpu_per_call(enc_json, states),
+            "binary_encode_ns": _cpu_per_call(enc_bin, states),
+        }
+    results["cases"]["gimbal_rate_command"] = {
+        "json_bytes": sum(len(c.encode()) for c in commands_json) / count,
+        "binary_bytes": sum(len(c) for c in commands_bin) / count,
+        "json_decode_ns": _cpu_per_call(json.loads, commands_json),
+        "binary_decode_ns": _cpu_per_call(decode_command, commands_bin),
+    }
+    for case in results["cases"].values():
+        for key, value in case.items():
+            if isinstance(value, float) and not math.isnan(value):
+                case[key] = round(value, 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = run(args.count)
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Timing helpers shared by the benchmark modules."""
+import json
+import math
+import time
+from typing import Callable, Dict, Iterable, List, Sequence
+
+
+def percentiles(samples: Sequence[float], points: Iterable[int] = (50, 90, 99)) -> Dict[str, float]:
+    """Nearest-rank percentiles, e.g. {"p50": ..., "p99": ...}."""
+    if not samples:
+        return {f"p{p}": math.nan for p in points}
+    ordered = sorted(samples)
+    n = len(ordered)
+    return {f"p{p}": ordered[min(n - 1, max(0, math.ceil(p / 100 * n) - 1))] for p in points}
+
+
+def best_of(fn: Callable[[], int], repeat: int = 5) -> float:
+    """
+    Runs `fn` (which returns how many operations it did) `repeat` times and
+    returns the best rate in operations per second.
+    """
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ops = fn()
+        elapsed = time.perf_counter() - start
+        if elapsed > 0:
+            best = max(best, ops / elapsed)
+    return best
+
+
+def rounded(results):
+    """Rounds floats in nested results for stable, readable JSON."""
+    if isinstance(results, dict):
+        return {k: rounded(v) for k, v in results.items()}
+    if isinstance(results, list):
+        return [rounded(v) for v in results]
+    if isinstance(results, float) and not math.isnan(results):
+        return round(results, 3 if abs(results) < 10 else 1)
+    return results
+
+
+def dump(results, path=None):
+    text = json.dumps(rounded(results), indent=2)
+    print(text)
+    if path:
+        with open(path, "w") as f:
+            f.write(text)
+
+
+def to_us(samples_ns: List[int]) -> List[float]:
+    return [s / 1000.0 for s in samples_ns]
@@ -0,0 +1,85 @@
+"""
+Runs every benchmark and writes one JSON document, tagged with the commit
+and interpreter, so results can be tracked across commits.
+
+    python -m benchmarks.run [--quick] [--json results.json] [--compare old.json]
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+
+from . import bench_broadcast, bench_driver, bench_protocol, bench_ws_format
+from .common import dump, rounded
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(quick: bool = False):
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "quick": quick,
+        },
+        "protocol": bench_protocol.run(scale=0.1 if quick else 1.0, repeat=3 if quick else 5),
+        "driver": bench_driver.run(count=200 if quick else 2000),
+        "broadcast": bench_broadcast.run(messages=50 if quick else 200),
+        "ws_format": bench_ws_format.run(count=2000 if quick else 20000),
+    }
+
+
+def _leaves(results, prefix=""):
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _leaves(value, name + ".")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(old, new, threshold: float = 0.1):
+    """Lines for every metric that moved by more than `threshold` (relative)."""
+    before = dict(_leaves({k: v for k, v in old.items() if k != "meta"}))
+    lines = []
+    for name, value in _leaves({k: v for k, v in new.items() if k != "meta"}):
+        base = before.get(name)
+        if not base:
+            continue
+        change = (value - base) / abs(base)
+        if abs(change) > threshold:
+            lines.append(f"{name}: {base} -> {value} ({change:+.0%})")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Smaller workloads, for CI smoke runs")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Earlier results file to diff against")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = run(args.quick)
+    dump(results, args.json)
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        lines = compare(old, rounded(results), args.threshold)
+        print(f"\nChanged by more than {args.threshold:.0%} vs {old.get('meta', {}).get('commit')}:", file=sys.stderr)
+        for line in lines or ["(none)"]:
+            print(f"  {line}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
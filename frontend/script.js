@@ -1,22 +1,39 @@
 const ws = new WebSocket(`ws://${location.host}/ws/control`);
+ws.binaryType = 'arraybuffer';
+// Opt-in binary framing: open the page with ?binary
+const wantBinary = new URLSearchParams(location.search).has('binary');
+let binaryMode = false;
+// Gimbal this page controls: ?device=<id>, the server's default otherwise
+const deviceId = new URLSearchParams(location.search).get('device') || 'default';
+// With ?trace, control commands carry a trace id and the server echoes stage timings.
+// Traced messages always go as JSON, even with ?binary
+const tracing = new URLSearchParams(location.search).has('trace');
+let traceId = 0;
+const apiBase = deviceId === 'default' ? '/api' : `/api/devices/${encodeURIComponent(deviceId)}`;
 const statusEl = document.getElementById('status-indicator');
 const logContainer = document.getElementById('log-container');
 
-// Fetch Ports
+// Ports: cached list from the server, kept current by "ports" WS events
+function renderPorts(details) {
+    const datalist = document.getElementById('port-list');
+    datalist.innerHTML = '';
+    details.forEach(port => {
+        const opt = document.createElement('option');
+        opt.value = port.device;
+        opt.label = port.siyi ? `${port.description || port.device} (SIYI)` : (port.description || '');
+        datalist.appendChild(opt);
+    });
+    const input = document.getElementById('port-input');
+    if (details.length > 0 && !input.value) {
+        input.value = details[0].device; // SIYI ports sort first
+    }
+}
+
 async function loadPorts() {
     try {
         const res = await fetch('/api/ports');
         const data = await res.json();
-        const datalist = document.getElementById('port-list');
-        datalist.innerHTML = '';
-        data.ports.forEach(port => {
-            const opt = document.createElement('option');
-            opt.value = port;
-            datalist.appendChild(opt);
-        });
-        if (data.ports.length > 0) {
-            document.getElementById('port-input').value = data.ports[0];
-        }
+        renderPorts(data.details);
     } catch (e) {
         log("Failed to load ports: " + e);
     }
@@ -25,6 +42,7 @@ loadPorts();
 
 // State
 let isConnected = false;
+let linkState = null;
 let currentSpeed = 50;
 
 function log(msg) {
@@ -36,20 +54,134 @@ function log(msg) {
 
 ws.onopen = () => {
     log("WebSocket Connected");
+    if (deviceId !== 'default') ws.send(JSON.stringify({ type: 'subscribe', devices: [deviceId] }));
+    if (wantBinary) ws.send(JSON.stringify({ type: 'hello', format: 'binary' }));
 };
 
+// Local copy of driver state, kept in sync from keyframes + deltas
+let state = {};
+let stateVersion = -1;
+
+const fmtAngle = (v) => (typeof v === 'number' ? v.toFixed(1) : '-');
+
+function renderState() {
+    if (state.connected !== isConnected) {
+        isConnected = state.connected;
+        statusEl.textContent = isConnected ? "Connected" : "Disconnected";
+        statusEl.className = `status ${isConnected ? 'online' : 'offline'}`;
+        log(isConnected ? "Driver Connected" : "Driver Disconnected");
+    }
+    // Link health from the server-side monitor: connected / degraded / lost
+    if (isConnected && state.link && state.link !== linkState) {
+        linkState = state.link;
+        const healthy = linkState === 'connected';
+        statusEl.textContent = healthy ? "Connected" : `Link ${linkState}`;
+        statusEl.className = `status ${healthy ? 'online' : 'offline'}`;
+        if (!healthy) log(`Link ${linkState}`);
+    } else if (!isConnected) {
+        linkState = null;
+    }
+    document.getElementById('last-ack').textContent = state.last_ack_ts ? new Date(state.last_ack_ts * 1000).toLocaleTimeString() : 'Never';
+    document.getElementById('error-count').textContent = state.errors;
+    document.getElementById('attitude').textContent =
+        `Y ${fmtAngle(state.yaw)} P ${fmtAngle(state.pitch)} R ${fmtAngle(state.roll)}`;
+}
+
+// Binary records, layouts match backend/binary_codec.py (little endian)
+const REC_ATTITUDE = 0x01;
+const REC_STATE = 0x02;
+const ATTITUDE_FIELDS = ['yaw', 'pitch', 'roll', 'yaw_rate', 'pitch_rate', 'roll_rate'];
+
+function decodeRecord(buf) {
+    const dv = new DataView(buf);
+    const rec = dv.getUint8(0);
+    const msg = { type: 'state_delta', base: dv.getUint32(1, true), version: dv.getUint32(5, true), payload: {} };
+    const p = msg.payload;
+    const nan2null = (v) => (Number.isNaN(v) ? null : v);
+    if (rec === REC_ATTITUDE) {
+        ATTITUDE_FIELDS.forEach((f, i) => { p[f] = dv.getFloat32(9 + i * 4, true); });
+    } else if (rec === REC_STATE) {
+        p.connected = dv.getUint8(9) === 1;
+        ATTITUDE_FIELDS.forEach((f, i) => { p[f] = dv.getFloat32(10 + i * 4, true); });
+        p.last_ack_ts = dv.getFloat64(34, true);
+        p.retries = dv.getUint32(42, true);
+        p.errors = dv.getUint32(46, true);
+        p.crc_failures = dv.getUint32(50, true);
+        p.resync_bytes = dv.getUint32(54, true);
+        p.in_flight = dv.getUint16(58, true);
+        p.srtt_ms = nan2null(dv.getFloat32(60, true));
+        p.rto_ms = nan2null(dv.getFloat32(64, true));
+    } else {
+        return null;
+    }
+    return msg;
+}
+
+const GIMBAL_RATE_RECORD = 0x81;
+const ZOOM_RECORD = 0x82;
+const ZOOM_CODES = { stop: 0, in: 1, out: 2 };
+
+// Stamps a control message for latency tracing (echoed back as a "trace" message)
+function traced(msg) {
+    if (tracing) msg.trace = { id: ++traceId, t: performance.now() };
+    return msg;
+}
+
+function renderTrace(msg) {
+    // Full round trip on this page's clock; the server's share and the gimbal link from its stages
+    const rtt = performance.now() - msg.client_ts;
+    const stages = msg.stages_ms;
+    const parts = [`${rtt.toFixed(1)} ms`];
+    if (stages.server !== undefined) parts.push(`server ${stages.server.toFixed(1)}`);
+    if (stages.link !== undefined) parts.push(`link ${stages.link.toFixed(1)}`);
+    document.getElementById('control-latency').textContent =
+        msg.result === 'ok' ? parts.join(' / ') : `${msg.result} (${rtt.toFixed(0)} ms)`;
+}
+
+function sendCommand(msg) {
+    if (!binaryMode || msg.trace) {  // Binary records have no room for a trace
+        ws.send(JSON.stringify(msg));
+    } else if (msg.type === 'gimbal_rate') {
+        const dv = new DataView(new ArrayBuffer(4));
+        dv.setUint8(0, GIMBAL_RATE_RECORD);
+        dv.setInt8(1, msg.yaw);
+        dv.setInt8(2, msg.pitch);
+        dv.setUint8(3, msg.speed);
+        ws.send(dv.buffer);
+    } else if (msg.type === 'zoom') {
+        ws.send(new Uint8Array([ZOOM_RECORD, ZOOM_CODES[msg.action]]).buffer);
+    } else {
+        ws.send(JSON.stringify(msg));
+    }
+}
+
 ws.onmessage = (event) => {
-    const msg = JSON.parse(event.data);
-    if (msg.type === 'state') {
-        const state = msg.payload;
-        if (state.connected !== isConnected) {
-            isConnected = state.connected;
-            statusEl.textContent = isConnected ? "Connected" : "Disconnected";
-            statusEl.className = `status ${isConnected ? 'online' : 'offline'}`;
-            log(isConnected ? "Driver Connected" : "Driver Disconnected");
+    const msg = event.data instanceof ArrayBuffer ? decodeRecord(event.data) : JSON.parse(event.data);
+    if (!msg) return;
+    if (msg.device && msg.device !== deviceId) return; // Another gimbal's stream
+    if (msg.type === 'hello') {
+        binaryMode = msg.format === 'binary';
+        log(`Telemetry format: ${msg.format}`);
+    } else if (msg.type === 'state') {
+        state = msg.payload;
+        stateVersion = msg.version;
+        renderState();
+    } else if (msg.type === 'state_delta') {
+        if (msg.version <= stateVersion) return; // Already covered by a keyframe
+        if (stateVersion < msg.base) {
+            // Missed an update, ask for a fresh snapshot
+            ws.send(JSON.stringify({ type: 'state_request' }));
+            return;
         }
-        document.getElementById('last-ack').textContent = state.last_ack_ts ? new Date(state.last_ack_ts * 1000).toLocaleTimeString() : 'Never';
-        document.getElementById('error-count').textContent = state.errors;
+        Object.assign(state, msg.payload);
+        stateVersion = msg.version;
+        renderState();
+    } else if (msg.type === 'trace') {
+        if (typeof msg.client_ts === 'number') renderTrace(msg);
+    } else if (msg.type === 'ports') {
+        msg.added.forEach(p => log(`Port added: ${p.device}${p.siyi ? ' (SIYI)' : ''}`));
+        msg.removed.forEach(p => log(`Port removed: ${p.device}`));
+        renderPorts(msg.ports);
     }
 };
 
@@ -68,12 +200,21 @@ document.getElementById('btn-connect').onclick = async () => {
         return;
     }
 
+    // "udp://192.168.144.25:37260" (or just "udp") selects the Ethernet link
+    let body = { port, baud };
+    if (port.startsWith('udp')) {
+        const [host, udpPort] = port.replace(/^udp:\/*/, '').split(':');
+        body = { transport: 'udp' };
+        if (host) body.host = host;
+        if (udpPort) body.udp_port = parseInt(udpPort);
+    }
+
     // Determine if connecting or disconnecting
     // For now simple connect
-    const res = await fetch('/api/connect', {
+    const res = await fetch(`${apiBase}/connect`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ port, baud })
+        body: JSON.stringify(body)
     });
     const data = await res.json();
     if (res.status !== 200) {
@@ -91,7 +232,7 @@ document.getElementById('speed-slider').oninput = (e) => {
 // Gimbal Control (Hold to Move)
 const sendMove = (yaw, pitch) => {
     log(`UI: Move ${yaw}, ${pitch} @ ${currentSpeed}%`);
-    ws.send(JSON.stringify({
+    sendCommand(traced({
         type: 'gimbal_rate',
         yaw: yaw,
         pitch: pitch,
@@ -100,7 +241,7 @@ const sendMove = (yaw, pitch) => {
 };
 
 const stopMove = () => {
-    ws.send(JSON.stringify({
+    sendCommand(traced({
         type: 'gimbal_rate',
         yaw: 0,
         pitch: 0,
@@ -125,18 +266,18 @@ setupHold('btn-left', -1, 0);
 setupHold('btn-right', 1, 0);
 
 document.getElementById('btn-center').onclick = async () => {
-    await fetch('/api/gimbal/center', { method: 'POST' });
+    await fetch(`${apiBase}/gimbal/center`, { method: 'POST' });
 };
 
 document.getElementById('btn-stop').onclick = async () => {
-    await fetch('/api/gimbal/stop', { method: 'POST' });
+    await fetch(`${apiBase}/gimbal/stop`, { method: 'POST' });
 };
 
 // Camera Control
 const setupZoom = (id, dir) => {
     const btn = document.getElementById(id);
-    const start = () => ws.send(JSON.stringify({ type: 'zoom', action: dir }));
-    const stop = () => ws.send(JSON.stringify({ type: 'zoom', action: 'stop' }));
+    const start = () => sendCommand(traced({ type: 'zoom', action: dir }));
+    const stop = () => sendCommand({ type: 'zoom', action: 'stop' });
 
     btn.onmousedown = start;
     btn.onmouseup = stop;
@@ -149,11 +290,11 @@ setupZoom('btn-zoom-in', 'in');
 setupZoom('btn-zoom-out', 'out');
 
 document.getElementById('btn-photo').onclick = async () => {
-    await fetch('/api/camera/photo', { method: 'POST' });
+    await fetch(`${apiBase}/camera/photo`, { method: 'POST' });
 };
 
 document.getElementById('btn-record').onclick = async () => {
-    await fetch('/api/camera/record', {
+    await fetch(`${apiBase}/camera/record`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ action: 'toggle' })
@@ -0,0 +1,80 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+
+from backend.ack_window import AckWindow
+from backend.siyi_protocol import SiyiPacket, encode_frame
+
+
+def _ack(window, seq):
+    window.on_ack(SiyiPacket(seq=seq, cmd_id=0, is_ack=True))
+
+
+def _sender(sent, after=None):
+    """Transmit path that writes immediately and records frames."""
+    def write(frame, tag, on_sent):
+        sent.append(frame)
+        on_sent(asyncio.get_running_loop().time())
+        if after:
+            after(frame)
+    return write
+
+
+def test_commands_pipeline_within_window():
+    async def run():
+        loop = asyncio.get_running_loop()
+        sent = []
+
+        # ACK every frame 50 ms after it is written
+        def ack_later(frame):
+            seq = SiyiPacket.decode(frame)[0].seq
+            loop.call_later(0.05, _ack, window, seq)
+        window = AckWindow(_sender(sent, ack_later), max_in_flight=4)
+
+        start = loop.time()
+        results = await asyncio.gather(*(
+            window.send(seq, encode_frame(seq, 0, need_ack=True)) for seq in range(1, 9)
+        ))
+        elapsed = loop.time() - start
+        assert all(r is not None for r in results)
+        # 8 commands through a window of 4 take two round trips, not eight
+        assert elapsed < 0.3
+        assert window.in_flight == 0
+        assert window.srtt is not None and 0.04 < window.srtt < 0.15
+
+    asyncio.run(run())
+
+
+def test_lost_ack_is_retransmitted_with_same_seq():
+    async def run():
+        loop = asyncio.get_running_loop()
+        sent = []
+
+        def ack_retransmit(frame):
+            if len(sent) == 2:  # Only the retransmit gets through
+                loop.call_soon(_ack, window, 7)
+
+        window = AckWindow(_sender(sent, ack_retransmit), initial_rto=0.05)
+        ack = await window.send(7, encode_frame(7, 5, need_ack=True), retries=3)
+        assert ack is not None and ack.seq == 7
+        assert len(sent) == 2 and sent[0] == sent[1]
+        assert window.retransmits == 1
+        # Karn's rule: no RTT sample from the retransmitted frame
+        assert window.srtt is None
+
+    asyncio.run(run())
+
+
+def test_gives_up_after_retries():
+    async def run():
+        sent = []
+        window = AckWindow(_sender(sent))
+        ack = await window.send(3, encode_frame(3, 0, need_ack=True), timeout=0.01, retries=2)
+        assert ack is None
+        assert len(sent) == 3
+        assert window.failures == 1
+        assert 3 not in window
+
+    asyncio.run(run())
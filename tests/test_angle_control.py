@@ -0,0 +1,117 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+
+from backend.angle_control import AngleController
+from backend.siyi_driver import SiyiDriver
+from backend.simulator import GimbalSimulator
+from backend.telemetry import CMD_FIRMWARE
+
+
+async def _connected(sim):
+    host, port = await sim.serve_udp()
+    driver = SiyiDriver()
+    await driver.connect(transport="udp", host=host, udp_port=port)
+    return driver
+
+
+def test_move_settles_on_target():
+    async def run():
+        sim = GimbalSimulator(latency=0.003, seed=6)
+        driver = await _connected(sim)
+        controller = AngleController(driver, hz=50)
+
+        done = await controller.set_target(30.0, -15.0)
+        assert controller.active and driver.state["attitude_stream_hz"] == 50
+        result = await asyncio.wait_for(done, 5)
+
+        assert result["status"] == "settled", result
+        assert abs(sim.yaw - 30.0) < 1.0 and abs(sim.pitch + 15.0) < 1.0
+        assert 0 < result["settle_time_s"] < 3.0
+        assert max(result["overshoot_deg"].values()) < 3.0
+        assert sim.yaw_rate == 0 and sim.pitch_rate == 0  # Stopped at the end
+        assert not controller.active
+
+        await driver.disconnect()
+        sim.close()
+
+    asyncio.run(run())
+
+
+def test_move_waits_for_a_late_attitude_stream():
+    async def run():
+        sim = GimbalSimulator(seed=8)
+        driver = await _connected(sim)
+        controller = AngleController(driver, hz=50, feedback_timeout=0.5)
+        await driver.query(CMD_FIRMWARE)  # So the simulator knows where to stream to
+        # The driver believes the stream is on, but the first sample is late
+        driver.state["attitude_stream_hz"] = 50
+
+        done = await controller.set_target(10.0, 0.0)
+        await asyncio.sleep(0.2)
+        assert controller.active and sim.yaw_rate == 0  # Holding, not aborted
+        sim.stream_hz = 50
+        sim._restart_stream()
+        result = await asyncio.wait_for(done, 5)
+        assert result["status"] == "settled", result
+
+        # A stream that never comes ends the move after feedback_timeout
+        sim.stream_hz = 0
+        sim._restart_stream()
+        await asyncio.sleep(0.6)
+        done = await controller.set_target(-10.0, 0.0)
+        result = await asyncio.wait_for(done, 2)
+        assert result["status"] == "no_feedback" and 0.5 <= result["duration_s"] < 1.0
+
+        await driver.disconnect()
+        sim.close()
+
+    asyncio.run(run())
+
+
+def test_stream_requested_again_on_a_new_link():
+    async def run():
+        sims = [GimbalSimulator(seed=11), GimbalSimulator(seed=12)]
+        driver = await _connected(sims[0])
+        controller = AngleController(driver, hz=50)
+        assert (await asyncio.wait_for(await controller.set_target(5.0, 0.0), 5))["status"] == "settled"
+
+        # Another gimbal (or the same one power cycled) isn't streaming yet
+        await driver.disconnect()
+        assert driver.state["attitude_stream_hz"] == 0
+        host, port = await sims[1].serve_udp()
+        await driver.connect(transport="udp", host=host, udp_port=port)
+        done = await controller.set_target(-5.0, 0.0)
+        assert sims[1].stream_hz == 50
+        assert (await asyncio.wait_for(done, 5))["status"] == "settled"
+
+        await driver.disconnect()
+        for sim in sims:
+            sim.close()
+
+    asyncio.run(run())
+
+
+def test_new_target_supersedes_and_cancel_stops():
+    async def run():
+        sim = GimbalSimulator(seed=7)
+        driver = await _connected(sim)
+        controller = AngleController(driver, hz=50)
+
+        first = await controller.set_target(100.0, 0.0)
+        await asyncio.sleep(0.1)
+        second = await controller.set_target(-100.0, 0.0)
+        assert (await first)["status"] == "superseded"
+
+        await asyncio.sleep(0.1)
+        await controller.cancel()
+        assert (await second)["status"] == "cancelled"
+        await asyncio.sleep(0.02)
+        assert sim.yaw_rate == 0
+
+        await driver.disconnect()
+        sim.close()
+
+    asyncio.run(run())
@@ -0,0 +1,60 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import struct
+
+import pytest
+
+from backend.autodetect import DetectionCache, detect, find_reply, probe_frame
+from backend.siyi_protocol import SiyiCRC, SiyiPacket
+from backend.simulator import GimbalSimulator
+from backend.telemetry import CMD_FIRMWARE
+
+
+def test_find_reply_variants_and_echo():
+    # Our own request echoed back (loopback adapter) is not a reply
+    assert find_reply(probe_frame()) is None
+
+    reply = SiyiPacket(seq=1, cmd_id=CMD_FIRMWARE, payload=b'\x01\x02\x03\x00' * 3, is_ack=True).encode()
+    assert find_reply(b'\x00garbage' + reply) == (0x6655, 0, b'\x01\x02\x03\x00' * 3)
+
+    # Byte-swapped STX with a 0xFFFF CRC init
+    body = struct.pack('<BHHB', 2, 4, 1, CMD_FIRMWARE) + b'\x01\x00\x00\x00'
+    swapped = b'\x66\x55' + body + struct.pack('<H', SiyiCRC.calculate(body, 0xFFFF))
+    assert find_reply(swapped)[:2] == (0x5566, 0xFFFF)
+
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a pty")
+def test_detect_in_parallel_and_from_cache(tmp_path):
+    pytest.importorskip("serial_asyncio")
+
+    async def run():
+        sim = GimbalSimulator(seed=1)
+        path = sim.serve_pty()
+        # A port nobody answers on
+        master, slave = os.openpty()
+        silent = os.ttyname(slave)
+
+        cache = DetectionCache(str(tmp_path / "autodetect.json"))
+        result = await detect([silent, path], device="cam1", cache=cache, probe_timeout=0.2)
+        assert result.port == path and result.baud == 115200 and result.standard
+        assert result.firmware.gimbal == "3.4.2"
+        # Answered on the first baud: no waiting out the silent port's sweep
+        assert result.elapsed < 0.2
+
+        # Persisted; the next run goes straight to the known-good config
+        cache = DetectionCache(str(tmp_path / "autodetect.json"))
+        assert cache.get("cam1")["port"] == path
+        probes = sim.commands[CMD_FIRMWARE]
+        assert (await detect([silent, path], device="cam1", cache=cache)).port == path
+        assert sim.commands[CMD_FIRMWARE] == probes + 1
+
+        assert await detect([silent], probe_timeout=0.02, bauds=(115200, 9600)) is None
+
+        sim.close()
+        os.close(master)
+        os.close(slave)
+
+    asyncio.run(run())
@@ -0,0 +1,21 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks import bench_broadcast, bench_driver, bench_protocol
+from benchmarks.run import compare
+
+
+def test_benchmarks_smoke():
+    protocol = bench_protocol.run(scale=0.01, repeat=1)["cases"]
+    assert protocol["decode_fps"] > 0 and protocol["parse_noise32_recovered"] > 0.9
+
+    driver = bench_driver.run(count=20)["cases"]
+    assert driver["windowed_failed"] == 0 and driver["retransmits"] == 0
+
+    broadcast = bench_broadcast.run(messages=5, clients=(1, 3))["cases"]
+    assert broadcast["clients_3"]["delivered"] == 1.0
+
+    old = {"meta": {}, "driver": {"cases": {"no_ack_cmds_per_s": 100.0, "retransmits": 0}}}
+    new = {"meta": {}, "driver": {"cases": {"no_ack_cmds_per_s": 50.0, "retransmits": 0}}}
+    assert compare(old, new) == ["driver.cases.no_ack_cmds_per_s: 100.0 -> 50.0 (-50%)"]
@@ -0,0 +1,69 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+
+from backend.coalescer import RateCoalescer
+from backend.connection import ConnectionManager
+from backend.registry import DriverRegistry
+
+
+class FakeDriver:
+    def __init__(self):
+        self.sent = []
+
+    async def send_cmd(self, cmd_id, payload=b'', expect_ack=True, **kwargs):
+        self.sent.append((cmd_id, bytes(payload)))
+        return True
+
+
+def test_latest_intent_wins_per_tick():
+    async def run():
+        driver = FakeDriver()
+        coalescer = RateCoalescer(driver, hz=50)
+        await coalescer.submit(1, 0, 10)
+        await coalescer.submit(1, 0, 20)
+        await coalescer.submit(0, 1, 30)
+        assert driver.sent == []
+
+        await coalescer.flush()
+        assert driver.sent == [(1, bytes([30]))]  # Rotate up at the newest speed
+        assert coalescer.superseded == 2
+        assert coalescer.flushed == 1
+
+        await coalescer.flush()
+        assert len(driver.sent) == 1  # Nothing pending, nothing sent
+
+    asyncio.run(run())
+
+
+def test_stop_bypasses_tick_and_drops_pending_motion():
+    async def run():
+        driver = FakeDriver()
+        coalescer = RateCoalescer(driver, hz=50)
+        await coalescer.submit(-1, 0, 50)
+        await coalescer.submit(0, 0, 0)
+        assert driver.sent == [(5, b'')]
+
+        await coalescer.flush()
+        assert driver.sent == [(5, b'')]
+        assert coalescer.stops == 1 and coalescer.superseded == 1
+
+    asyncio.run(run())
+
+
+def test_registry_tick_flushes():
+    async def run():
+        driver = FakeDriver()
+        registry = DriverRegistry(ConnectionManager(), control_hz=100)
+        coalescer = registry.create("a").coalescer
+        coalescer.driver = driver
+        registry.start()
+        await coalescer.submit(1, -1, 40)
+        await asyncio.sleep(0.05)
+        await registry.stop()
+        assert driver.sent == [(3, bytes([40])), (2, bytes([40]))]
+        assert coalescer.stats["hz"] == 100
+
+    asyncio.run(run())
@@ -0,0 +1,72 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import json
+
+from backend.connection import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.received = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        if self.fail:
+            raise ConnectionError("gone")
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received.append(json.loads(data))
+
+    async def close(self, code=1000):
+        self.closed = True
+
+
+def test_slow_client_does_not_block_others():
+    async def run():
+        manager = ConnectionManager(max_queue=4, max_lag=10)
+        fast, slow = FakeWebSocket(), FakeWebSocket(delay=0.05)
+        await manager.connect(fast)
+        await manager.connect(slow)
+
+        for i in range(10):
+            await manager.broadcast({"n": i})
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.01)
+        assert [m["n"] for m in fast.received] == list(range(10))
+
+        await asyncio.sleep(0.3)
+        # Slow client keeps the newest telemetry, oldest is dropped
+        assert [m["n"] for m in slow.received][-4:] == [6, 7, 8, 9]
+        slow_stats = [s for s in manager.stats() if s["dropped"]]
+        assert slow_stats and slow_stats[0]["lag_max_ms"] > 0
+
+    asyncio.run(run())
+
+
+def test_failing_and_lagging_clients_are_evicted():
+    async def run():
+        manager = ConnectionManager(max_queue=100, max_lag=0.05)
+        broken, stuck, ok = FakeWebSocket(fail=True), FakeWebSocket(delay=10), FakeWebSocket()
+        for ws in (broken, stuck, ok):
+            await manager.connect(ws)
+
+        await manager.broadcast({"n": 0})
+        await manager.broadcast({"n": 1})
+        await asyncio.sleep(0.1)
+        await manager.broadcast({"n": 2})
+        await asyncio.sleep(0.01)
+
+        assert manager.active_connections == [ok]
+        assert broken.closed and stuck.closed
+        assert manager.evicted == 2
+        assert [m["n"] for m in ok.received] == [0, 1, 2]
+
+    asyncio.run(run())
@@ -0,0 +1,180 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from backend.connection import ConnectionManager
+from backend.daemon import DriverDaemon, encode
+from backend.registry import DEFAULT_DEVICE
+from backend.remote import DaemonClient, RemoteRegistry
+from backend.shm_state import SEQ_OFFSET, SeqlockReader, SeqlockWriter
+from backend.simulator import GimbalSimulator
+from backend.telemetry import CMD_FIRMWARE
+
+
+def test_seqlock_never_returns_torn_snapshots(tmp_path):
+    path = str(tmp_path / "block")
+    writer = SeqlockWriter(path, capacity=4096)
+    reader = SeqlockReader(path)
+    assert reader.read() == (0, None)
+
+    writer.publish({"n": 0, "pad": "x" * 1000})
+    seq, snapshot = reader.read()
+    assert snapshot["n"] == 0
+    assert reader.read(since=seq) == (seq, None)  # Nothing new
+
+    # Writer hammering the block from another thread; every read must be whole
+    stop = threading.Event()
+
+    def publish():
+        n = 0
+        while not stop.is_set():
+            n += 1
+            writer.publish({"n": n, "pad": str(n) * (n % 500)})
+
+    thread = threading.Thread(target=publish)
+    thread.start()
+    try:
+        last = -1
+        deadline = time.monotonic() + 0.5
+        while time.monotonic() < deadline:
+            _, snapshot = reader.read()
+            assert snapshot["pad"] == str(snapshot["n"]) * (snapshot["n"] % 500)
+            assert snapshot["n"] >= last
+            last = snapshot["n"]
+    finally:
+        stop.set()
+        thread.join()
+
+    # A writer that died mid-write (odd seq) is reported, not read through
+    writer._mm[SEQ_OFFSET] |= 1
+    with pytest.raises(TimeoutError):
+        reader.read_bytes(spins=10)
+
+    with pytest.raises(ValueError):
+        writer.write(b'x' * 5000)
+    reader.close()
+    writer.close()
+    assert not os.path.exists(path)
+
+
+def test_workers_drive_gimbal_through_daemon(tmp_path):
+    async def wait_for(condition, timeout=3.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline, "condition not met"
+            await asyncio.sleep(0.01)
+
+    async def run():
+        sim = GimbalSimulator(latency=0.002, seed=3)
+        host, port = await sim.serve_udp()
+        socket_path = str(tmp_path / "daemon.sock")
+        daemon = DriverDaemon(socket_path, str(tmp_path), publish_hz=100)
+        await daemon.start()
+
+        # Two workers, as uvicorn --workers 2 would run them
+        workers = [RemoteRegistry(socket_path, ConnectionManager()) for _ in range(2)]
+        workers[0].create(DEFAULT_DEVICE)
+        for worker in workers:
+            worker.start()
+            await worker.wait_ready(2)
+        one, two = (worker.get(DEFAULT_DEVICE) for worker in workers)
+
+        await one.driver.connect(transport="udp", host=host, udp_port=port)
+        assert one.driver.connected and one.driver.port == f"{host}:{port}"
+        # The other worker sees it through shared memory, not a round trip
+        await wait_for(lambda: two.driver.connected and two.state["connected"])
+
+        assert (await two.driver.query(CMD_FIRMWARE))["gimbal"] == "3.4.2"
+        assert await one.driver.send_cmd(12, b'') and sim.commands[12] == 1
+
+        done = await two.angle.set_target(20.0, -10.0)
+        result = await asyncio.wait_for(done, 5)
+        assert result["status"] == "settled", result
+        await wait_for(lambda: abs(one.state["yaw"] - 20.0) < 1.0)
+        assert one.driver.attitude.latest() is not None
+
+        # Daemon-side exceptions keep their type
+        with pytest.raises(ValueError):
+            await one.scan.start([])
+        await one.scan.start([{"type": "dwell", "seconds": 5}])
+        assert one.scan.active
+        await wait_for(lambda: two.scan.active)
+        await two.take_over()
+        await wait_for(lambda: one.scan.state == "aborted")
+
+        # Rate intents are coalesced by the daemon's control tick
+        for _ in range(10):
+            await one.coalescer.submit(0.5, 0, 50)
+        await wait_for(lambda: two.coalescer.stats.get("received") == 10)
+
+        # Devices added through one worker show up in the other
+        workers[1].create("cam2")
+        await wait_for(lambda: "cam2" in workers[0])
+        await workers[0].remove("cam2")
+        await wait_for(lambda: "cam2" not in workers[1])
+
+        # Daemon gone: commands fail the way SiyiDriver's do, without raising
+        await daemon.stop()
+        await wait_for(lambda: not one.client.connected)
+        assert await one.driver.send_cmd(12, b'') is False
+
+        for worker in workers:
+            await worker.stop()
+        sim.close()
+
+    asyncio.run(run())
+
+
+def test_bad_device_id_does_not_stop_publishing(tmp_path):
+    async def run():
+        daemon = DriverDaemon(str(tmp_path / "daemon.sock"), str(tmp_path), publish_hz=100)
+        await daemon.start()
+        for op in ("create", "connect"):
+            with pytest.raises(ValueError):
+                await daemon.handle(op, "../escape", {})
+        assert list(daemon.registry.devices) == [DEFAULT_DEVICE]
+        assert not os.path.exists(tmp_path.parent / "siyi-escape.state")
+
+        # A device whose block can't be created (bypassing the id check) is
+        # skipped; the others keep publishing
+        daemon.registry.devices["a/b"] = daemon.registry.devices[DEFAULT_DEVICE]
+        reader = SeqlockReader(daemon.devices()[0]["shm"])
+        seq = reader.seq
+        daemon.registry.get(DEFAULT_DEVICE).driver.state["errors"] = 7
+        await asyncio.sleep(0.05)
+        assert reader.seq > seq and reader.read()[1]["state"]["errors"] == 7
+        assert not daemon._task.done()
+        del daemon.registry.devices["a/b"]
+
+        reader.close()
+        await daemon.stop()
+
+    asyncio.run(run())
+
+
+def test_final_reply_in_the_same_read(tmp_path):
+    async def run():
+        async def serve(reader, writer):
+            request = json.loads(await reader.readline())
+            # Both replies in one write: the client reads them in one go
+            writer.write(encode({"id": request["id"], "result": "started"}) +
+                         encode({"id": request["id"], "final": {"status": "settled"}}))
+
+        path = str(tmp_path / "fake.sock")
+        server = await asyncio.start_unix_server(serve, path=path)
+        client = DaemonClient(path)
+        await client.connect()
+        result, final = await client.call_final("set_angle", "default", yaw=0, pitch=0)
+        assert result == "started" and (await asyncio.wait_for(final, 1)) == {"status": "settled"}
+        await client.close()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(run())
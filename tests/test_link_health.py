@@ -0,0 +1,105 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+
+from backend.siyi_driver import SiyiDriver
+from backend.simulator import GimbalSimulator, CMD_FIRMWARE
+
+
+async def _connect(sim: GimbalSimulator, host: str, port: int) -> SiyiDriver:
+    driver = SiyiDriver()
+    link = driver.link
+    link.idle, link.lost_after, link.tick, link.backoff = 0.1, 0.4, 0.02, (0.05, 0.2)
+    await driver.connect(transport="udp", host=host, udp_port=port)
+    driver.ack_window.rto = 0.05
+    return driver
+
+
+async def _wait_for(predicate, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.02)
+
+
+def test_probes_only_when_idle():
+    async def run():
+        sim = GimbalSimulator(seed=1)
+        host, port = await sim.serve_udp()
+        driver = await _connect(sim, host, port)
+
+        await asyncio.sleep(0.5)
+        assert sim.commands.get(CMD_FIRMWARE, 0) >= 2
+        assert driver.state["link"] == "connected"
+
+        # Attitude stream keeps the link busy: no more probes
+        await driver.request_attitude_stream(50)
+        await asyncio.sleep(0.1)
+        probes = sim.commands.get(CMD_FIRMWARE, 0)
+        await asyncio.sleep(0.5)
+        assert sim.commands.get(CMD_FIRMWARE, 0) == probes
+        assert driver.state["link"] == "connected"
+
+        await driver.disconnect()
+        assert driver.state["link"] == "down"
+        sim.close()
+
+    asyncio.run(run())
+
+
+def test_degraded_lost_and_reconnect():
+    async def run():
+        sim = GimbalSimulator(loss=0.5, stream_hz=50, seed=3)
+        host, port = await sim.serve_udp()
+        driver = await _connect(sim, host, port)
+        await asyncio.gather(*(driver.send_cmd(0, b'', retries=6) for _ in range(20)))
+        await _wait_for(lambda: driver.state["link"] == "degraded")
+        assert driver.state["link_loss"] > 0.2
+
+        sim.close()
+        await _wait_for(lambda: driver.state["link"] == "lost")
+        await _wait_for(lambda: driver.state["reconnects"] >= 1)
+
+        # Gimbal comes back on the same endpoint; the monitor's probes find it
+        sim = GimbalSimulator(stream_hz=50, seed=4)
+        await sim.serve_udp(host, port)
+        await _wait_for(lambda: driver.state["link"] != "lost")
+        assert driver.connected and driver.state["yaw"] == 0.0
+
+        await driver.disconnect()
+        sim.close()
+
+    asyncio.run(run())
+
+
+def test_stream_restored_after_reconnect():
+    async def run():
+        sim = GimbalSimulator(seed=5)
+        host, port = await sim.serve_udp()
+        driver = await _connect(sim, host, port)
+        assert await driver.request_attitude_stream(50) == 50 and sim.stream_hz == 50
+
+        sim.close()
+        await _wait_for(lambda: driver.state["link"] == "lost")
+        assert driver.state["attitude_stream_hz"] == 0
+
+        # The gimbal restarts without a stream; the session's rate is asked for again
+        sim = GimbalSimulator(seed=6)
+        await sim.serve_udp(host, port)
+        await _wait_for(lambda: driver.state["link"] != "lost")
+        await _wait_for(lambda: sim.stream_hz == 50 and driver.state["attitude_stream_hz"] == 50)
+        since = driver.attitude.latest().t if driver.attitude.latest() else 0
+        await _wait_for(lambda: driver.attitude.latest() is not None and driver.attitude.latest().t > since)
+
+        # A user disconnect ends the session: nothing to restore on the next connect
+        await driver.disconnect()
+        await driver.connect(transport="udp", host=host, udp_port=port)
+        await driver.restore_stream()
+        assert driver.state["attitude_stream_hz"] == 0
+
+        await driver.disconnect()
+        sim.close()
+
+    asyncio.run(run())
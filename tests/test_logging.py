@@ -0,0 +1,51 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import logging
+
+from backend.logging_setup import LazyQueueHandler, RateLimitFilter, setup_logging, stop_logging
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+def test_queue_logging_formats_off_the_caller():
+    handler = ListHandler()
+    root = logging.getLogger()
+    level = root.level
+    setup_logging(level="INFO", trace=True, handler=handler)
+    try:
+        trace = logging.getLogger("siyi.trace")
+        trace.filters[0].rate = 3
+        queue_handler = next(h for h in root.handlers if isinstance(h, LazyQueueHandler))
+        record = logging.LogRecord("t", logging.INFO, __file__, 1, "TX %s", ("arg",), None)
+        # Enqueued untouched: formatting is left to the listener thread
+        assert queue_handler.prepare(record) is record and record.args == ("arg",)
+
+        for _ in range(10):
+            trace.debug("TX %s", "arg")
+        stop_logging()  # Drains the queue
+        assert handler.lines == ["DEBUG:siyi.trace:TX arg"] * 3
+    finally:
+        stop_logging()
+        for h in [h for h in root.handlers if isinstance(h, LazyQueueHandler)]:
+            root.removeHandler(h)
+        root.setLevel(level)
+        trace.setLevel(logging.NOTSET)
+
+
+def test_rate_limit_reports_suppressed():
+    limiter = RateLimitFilter(rate=2, period=0.05)
+    record = lambda: logging.LogRecord("t", logging.DEBUG, __file__, 1, "RX %s", ("x",), None)
+    assert [limiter.filter(record()) for _ in range(5)] == [True, True, False, False, False]
+    import time
+    time.sleep(0.06)
+    first = record()
+    assert limiter.filter(first) and first.suppressed == 3
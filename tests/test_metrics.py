@@ -0,0 +1,70 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+
+from backend import metrics
+from backend.metrics import MetricsRegistry
+from backend.siyi_driver import SiyiDriver
+from backend.simulator import GimbalSimulator
+
+
+def test_exposition_format():
+    registry = MetricsRegistry()
+    frames = registry.counter("tx_frames_total", "Frames", ("cmd",))
+    rtt = registry.histogram("rtt_seconds", "RTT", buckets=(0.01, 0.1))
+    depth = registry.gauge("depth", "Queue depth")
+    frames.labels(5).inc()
+    frames.labels(5).inc(2)
+    rtt.observe(0.005)
+    rtt.observe(0.05)
+    rtt.observe(3)
+    depth.set_function(lambda: 4)
+
+    text = registry.render()
+    assert 'tx_frames_total{cmd="5"} 3' in text
+    assert '# TYPE rtt_seconds histogram' in text
+    assert 'rtt_seconds_bucket{le="0.01"} 1' in text
+    assert 'rtt_seconds_bucket{le="0.1"} 2' in text
+    assert 'rtt_seconds_bucket{le="+Inf"} 3' in text
+    assert 'rtt_seconds_count 3' in text
+    assert 'depth 4' in text
+
+    # Client-supplied label values can't break the exposition
+    links = registry.gauge("link", "Link", ("device", "cmd"))
+    links.labels('a"b\\c\nd', 1).set(1)
+    links.labels('a"b\\c\nd', 2).set(1)
+    links.labels("other", 1).set(2)
+    assert 'link{device="a\\"b\\\\c\\nd",cmd="1"} 1' in registry.render()
+    links.remove('a"b\\c\nd')  # Every series of that device
+    assert [line for line in registry.render().splitlines() if line.startswith("link{")] == \
+        ['link{device="other",cmd="1"} 2']
+
+    disabled = MetricsRegistry(enabled=False)
+    disabled.counter("x_total", "X", ("a",)).labels(1).inc()
+    assert disabled.render() == "\n"
+
+
+def test_driver_records_link_metrics():
+    async def run():
+        sim = GimbalSimulator(seed=3)
+        host, port = await sim.serve_udp()
+        driver = SiyiDriver(device_id="metrics-test")
+        await driver.connect(transport="udp", host=host, udp_port=port)
+        rtt_before = metrics.ACK_RTT._default.count
+
+        assert await driver.send_cmd(0, b'')
+        await driver.send_cmd(5, b'', expect_ack=False)
+        await asyncio.sleep(0.02)
+
+        text = metrics.render()
+        assert 'siyi_tx_frames_total{device="metrics-test",cmd="0"}' in text
+        assert 'siyi_tx_bytes_total{device="metrics-test",cmd="5"} 10' in text
+        assert 'siyi_rx_frames_total{device="metrics-test",cmd="0"}' in text
+        assert metrics.ACK_RTT._default.count > rtt_before
+
+        await driver.disconnect()
+        sim.close()
+
+    asyncio.run(run())
@@ -0,0 +1,51 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+from types import SimpleNamespace
+
+from backend.port_watcher import PortWatcher, parse_usb_ids
+
+
+def _port(device, vid=None, pid=None):
+    return SimpleNamespace(device=device, description=f"{device} adapter", hwid="n/a", vid=vid, pid=pid,
+                           serial_number=None, manufacturer=None)
+
+
+def test_scan_diff_and_fingerprint_skip():
+    async def run():
+        present = [_port("/dev/ttyS0")]
+        calls = []
+        events = []
+        fingerprint = [1]
+
+        def lister():
+            calls.append(1)
+            return list(present)
+
+        async def on_change(added, removed, ports):
+            events.append(([p["device"] for p in added], [p["device"] for p in removed]))
+
+        watcher = PortWatcher(on_change=on_change, lister=lister, fingerprint=lambda: fingerprint[0],
+                              known_ids=parse_usb_ids("0483:5740"))
+        await watcher.refresh()
+        assert watcher.scanned and watcher.ports[0]["device"] == "/dev/ttyS0"
+
+        # /dev unchanged: no enumeration at all
+        present.append(_port("/dev/ttyACM0", 0x0483, 0x5740))
+        assert await watcher.refresh() == ([], [])
+        assert len(calls) == 1
+
+        fingerprint[0] = 2
+        added, removed = await watcher.refresh()
+        assert [p["device"] for p in added] == ["/dev/ttyACM0"] and not removed
+        # SIYI ports sort first and carry their USB ids
+        assert watcher.ports[0] == dict(watcher.ports[0], device="/dev/ttyACM0", siyi=True, vid="0483", pid="5740")
+
+        present.pop(0)
+        await watcher.refresh(force=True)
+        assert events == [(["/dev/ttyS0"], []), (["/dev/ttyACM0"], []), ([], ["/dev/ttyS0"])]
+        assert watcher.scans == 3
+
+    asyncio.run(run())
@@ -0,0 +1,69 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+
+import pytest
+
+from backend.siyi_driver import SiyiDriver
+from backend.simulator import GimbalSimulator
+from backend.telemetry import CMD_FIRMWARE, CMD_STATUS, FirmwareVersion, decode_firmware
+
+
+def test_decoders():
+    assert decode_firmware(bytes.fromhex("01020300" "02030400" "00000100")) == FirmwareVersion("3.2.1", "4.3.2", "1.0.0")
+    assert decode_firmware(b'\x00' * 8) is None
+
+
+def test_query_dedupes_and_caches():
+    async def run():
+        sim = GimbalSimulator(latency=0.01, seed=1)
+        host, port = await sim.serve_udp()
+        driver = SiyiDriver()
+        await driver.connect(transport="udp", host=host, udp_port=port)
+
+        # Five concurrent reads, one frame on the link
+        results = await asyncio.gather(*(driver.query(CMD_FIRMWARE) for _ in range(5)))
+        assert results == [FirmwareVersion("3.2.1", "3.4.2", "1.0.0")] * 5
+        assert sim.commands[CMD_FIRMWARE] == 1
+
+        # Served from the cache until max_age says otherwise
+        await driver.query(CMD_FIRMWARE)
+        assert sim.commands[CMD_FIRMWARE] == 1
+        await driver.query(CMD_FIRMWARE, max_age=0)
+        assert sim.commands[CMD_FIRMWARE] == 2
+
+        assert (await driver.query(CMD_STATUS))["motion_mode"] == "follow"
+
+        # Replies lost: resent, then given up
+        sim.loss = 1.0
+        with pytest.raises(RuntimeError):
+            await driver.query(CMD_STATUS, max_age=0, timeout=0.05, retries=1)
+        assert sim.dropped == 2
+
+        await driver.disconnect()
+        sim.close()
+
+    asyncio.run(run())
+
+
+def test_disconnect_ends_pending_queries():
+    async def run():
+        sim = GimbalSimulator(latency=1.0, seed=2)
+        host, port = await sim.serve_udp()
+        driver = SiyiDriver()
+        await driver.connect(transport="udp", host=host, udp_port=port)
+
+        query = asyncio.create_task(driver.query(CMD_STATUS, timeout=5))
+        await asyncio.sleep(0.01)
+        assert driver._query_tasks and driver._queries
+        await driver.disconnect()
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(query, 0.5)
+        await asyncio.sleep(0)
+        assert not driver._query_tasks and not driver._queries
+
+        sim.close()
+
+    asyncio.run(run())
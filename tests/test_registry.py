@@ -0,0 +1,108 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+
+import pytest
+
+from backend import metrics
+from backend.connection import ConnectionManager
+from backend.registry import DriverRegistry
+from backend.simulator import GimbalSimulator
+from test_connection import FakeWebSocket
+
+
+class RecordingDriver:
+    def __init__(self, log, name):
+        self.log = log
+        self.name = name
+
+    async def send_cmd(self, cmd_id, payload=b'', expect_ack=True, **kwargs):
+        self.log.append((self.name, cmd_id, asyncio.get_running_loop().time()))
+        return True
+
+
+def test_group_rate_reaches_devices_in_one_tick():
+    async def run():
+        registry = DriverRegistry(ConnectionManager(), control_hz=20)
+        log = []
+        for name in ("a", "b"):
+            registry.create(name).coalescer.driver = RecordingDriver(log, name)
+        registry.start()
+
+        assert await registry.group_rate(["a", "b", "missing"], 1, 0, 40) == ["missing"]
+        await asyncio.sleep(0.08)
+        # Both right (3) commands went out on the same tick, once each
+        assert sorted(entry[:2] for entry in log) == [("a", 3), ("b", 3)]
+        assert abs(log[0][2] - log[1][2]) < 0.01
+
+        await registry.group_rate(["a", "b"], 0, 0, 0)
+        assert [entry[:2] for entry in log[2:]] == [("a", 5), ("b", 5)]
+        await registry.stop()
+
+    asyncio.run(run())
+
+
+def test_group_rate_takes_over_scans_and_moves():
+    async def run():
+        registry = DriverRegistry(ConnectionManager(), control_hz=20)
+        sims = [GimbalSimulator(seed=9), GimbalSimulator(seed=10)]
+        a, b = registry.create("a"), registry.create("b")
+        for device, sim in zip((a, b), sims):
+            host, port = await sim.serve_udp()
+            await device.driver.connect(transport="udp", host=host, udp_port=port)
+        registry.start()
+
+        await a.scan.start([{"type": "dwell", "seconds": 5}])
+        move = await b.angle.set_target(90.0, 0.0)
+        await registry.group_rate(["a", "b"], 1, 0, 40)
+        assert a.scan.state == "aborted" and not b.angle.active
+        assert (await move)["status"] == "cancelled"
+
+        await registry.stop()
+        for device, sim in zip((a, b), sims):
+            await device.driver.disconnect()
+            sim.close()
+
+    asyncio.run(run())
+
+
+def test_device_ids_are_checked():
+    registry = DriverRegistry(ConnectionManager())
+    for bad in ("", "a/b", "..", "x" * 65, "a b", 'a"b'):
+        with pytest.raises(ValueError):
+            registry.create(bad)
+    assert not registry.devices
+    assert registry.create("cam_2-A").id == "cam_2-A"
+
+
+def test_removed_device_stops_exporting_metrics():
+    async def run():
+        registry = DriverRegistry(ConnectionManager())
+        registry.create("gone")
+        metrics.TX_FRAMES.labels("gone", 5).inc()
+        metrics.LINK_STATE.labels("gone").set(1)
+        assert 'device="gone"' in metrics.render()
+        await registry.remove("gone")
+        assert 'device="gone"' not in metrics.render()
+
+    asyncio.run(run())
+
+
+def test_broadcast_scoped_to_device_subscribers():
+    async def run():
+        manager = ConnectionManager(default_topics=("default",))
+        first, second = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(first)
+        await manager.connect(second)
+        manager.subscribe(second, ["cam2"])
+
+        await manager.broadcast({"n": 1}, topic="default")
+        await manager.broadcast({"n": 2}, topic="cam2")
+        await asyncio.sleep(0.01)
+        assert first.received == [{"n": 1}] and second.received == [{"n": 2}]
+        assert manager.primary_topic(second) == "cam2"
+        assert not manager.has_subscribers("cam3")
+
+    asyncio.run(run())
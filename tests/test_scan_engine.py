@@ -0,0 +1,111 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import time
+
+import pytest
+
+from backend.angle_control import AngleController
+from backend.scan_engine import ScanEngine, expand
+from backend.siyi_driver import SiyiDriver
+from backend.simulator import GimbalSimulator
+
+
+def test_expand_patterns():
+    program = expand([{"type": "raster", "yaw": [-10, 10], "pitch": [0, -10], "rows": 2, "cols": 3, "photo": True}])
+    gotos = [(s["yaw"], s["pitch"]) for s in program if s["type"] == "goto"]
+    # Serpentine: the second row runs backwards
+    assert gotos == [(-10, 0), (0, 0), (10, 0), (10, -10), (0, -10), (-10, -10)]
+    assert [s["type"] for s in program[:2]] == ["goto", "photo"]
+
+    sweep = expand([{"type": "sweep", "yaw": [-20, 20], "pitch": -5, "cycles": 2, "dwell": 0.5}])
+    assert [s.get("yaw") for s in sweep if s["type"] == "goto"] == [-20, 20, -20, 20]
+
+    for bad in ([], [{"type": "spin"}], [{"type": "dwell", "seconds": -1}], [{"type": "raster", "yaw": 5}]):
+        with pytest.raises(ValueError):
+            expand(bad)
+
+
+async def _setup():
+    sim = GimbalSimulator(latency=0.002, seed=1)
+    host, port = await sim.serve_udp()
+    driver = SiyiDriver()
+    await driver.connect(transport="udp", host=host, udp_port=port)
+    events = []
+
+    async def on_event(message):
+        events.append(message)
+
+    return sim, driver, ScanEngine(driver, AngleController(driver), on_event=on_event), events
+
+
+async def _wait_done(scan, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while scan.active:
+        assert time.monotonic() < deadline, "scan did not finish"
+        await asyncio.sleep(0.02)
+
+
+def test_program_timing_under_load():
+    async def run():
+        sim, driver, scan, events = await _setup()
+
+        async def load():
+            # Competing work on the loop: 2 ms of CPU every 5 ms
+            while True:
+                end = time.perf_counter() + 0.002
+                while time.perf_counter() < end:
+                    pass
+                await asyncio.sleep(0.005)
+
+        hog = asyncio.create_task(load())
+        await scan.start([{"type": "goto", "yaw": 10, "pitch": -5}, {"type": "photo"},
+                    {"type": "dwell", "seconds": 0.1}, {"type": "dwell", "seconds": 0.1}, {"type": "photo"}], repeat=2)
+        await _wait_done(scan)
+        hog.cancel()
+
+        status = scan.status()
+        assert status["state"] == "done", status
+        assert len(status["reports"]) == 10 and sim.commands[12] == 4
+        assert abs(sim.yaw - 10) < 1 and abs(sim.pitch + 5) < 1
+        # Absolute deadlines: dwells end on schedule even with the loop busy
+        assert status["timing"]["max_error_ms"] < 20
+        assert all(abs(r["end_error_ms"]) < 20 for r in status["reports"] if r["type"] == "dwell")
+        assert events[-1]["state"] == "done"
+
+        await driver.disconnect()
+        sim.close()
+
+    asyncio.run(run())
+
+
+def test_pause_resume_and_abort():
+    async def run():
+        sim, driver, scan, events = await _setup()
+        loop = asyncio.get_running_loop()
+
+        started = loop.time()
+        await scan.start([{"type": "dwell", "seconds": 0.3}, {"type": "photo"}])
+        await asyncio.sleep(0.1)
+        await scan.pause()
+        await asyncio.sleep(0.2)
+        assert scan.state == "paused" and 12 not in sim.commands
+        await scan.resume()
+        await _wait_done(scan)
+        # The schedule slid by the paused time; the step still ended on its shifted deadline
+        assert loop.time() - started == pytest.approx(0.5, abs=0.08)
+        assert abs(scan.reports[0]["end_error_ms"]) < 20
+
+        await scan.start([{"type": "dwell", "seconds": 5}])
+        await asyncio.sleep(0.05)
+        await scan.abort()
+        assert scan.state == "aborted" and [e["state"] for e in events][-1] == "aborted"
+        with pytest.raises(RuntimeError):
+            await scan.resume()
+
+        await driver.disconnect()
+        sim.close()
+
+    asyncio.run(run())
@@ -0,0 +1,84 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+
+import pytest
+
+from backend.state_broadcast import StateStore, StateBroadcaster
+
+
+class FakeManager:
+    def __init__(self):
+        self.active_connections = [object()]
+        self.messages = []
+        self.binary = []
+
+    def has_subscribers(self, topic=None):
+        return bool(self.active_connections)
+
+    async def broadcast(self, message, binary=None, topic=None):
+        self.messages.append(message)
+        self.binary.append(binary)
+
+
+def test_state_store_tracks_changed_keys():
+    state = StateStore({"yaw": 0.0, "errors": 0})
+    assert state.version == 0
+    state["yaw"] = 0.0  # Same value, no new version
+    assert state.version == 0
+
+    state["yaw"] = 1.5
+    v1 = state.version
+    state["errors"] += 1
+    assert state.changes_since(0) == {"yaw": 1.5, "errors": 1}
+    assert state.changes_since(v1) == {"errors": 1}
+    assert state.changes_since(state.version) == {}
+
+
+def test_broadcaster_coalesces_and_skips_idle():
+    async def run():
+        state = StateStore({"yaw": 0.0, "pitch": 0.0})
+        manager = FakeManager()
+        broadcaster = StateBroadcaster(state, manager, max_hz=20, keyframe_interval=60)
+        broadcaster.start()
+        await asyncio.sleep(0)
+
+        for i in range(10):
+            state["yaw"] = float(i)
+        state["pitch"] = 3.0
+        await asyncio.sleep(0.02)
+        state["yaw"] = 42.0
+        await asyncio.sleep(0.15)  # Idle afterwards
+        await broadcaster.stop()
+
+        assert [m["type"] for m in manager.messages] == ["state_delta", "state_delta"]
+        first, second = manager.messages
+        assert first["base"] == 0 and first["payload"] == {"yaw": 9.0, "pitch": 3.0}
+        assert second["base"] == first["version"] and second["payload"] == {"yaw": 42.0}
+
+    asyncio.run(run())
+
+
+def test_binary_records_for_hot_fields():
+    from backend.binary_codec import (encode_state_delta, decode_command, encode_gimbal_rate,
+                                      encode_zoom, ATTITUDE_RECORD, STATE_RECORD, REC_ATTITUDE)
+    state = {"yaw": 10.5, "pitch": -3.0, "roll": 0.0, "yaw_rate": 1.0, "pitch_rate": 0.0,
+             "roll_rate": 0.0, "connected": True, "errors": 2, "tx_queue": {}}
+
+    record = encode_state_delta(state, ["yaw", "pitch"], 4, 6)
+    assert len(record) == ATTITUDE_RECORD.size
+    rec, base, version, yaw, pitch = ATTITUDE_RECORD.unpack(record)[:5]
+    assert (rec, base, version, yaw, pitch) == (REC_ATTITUDE, 4, 6, 10.5, -3.0)
+
+    assert len(encode_state_delta(state, ["yaw", "errors"], 4, 6)) == STATE_RECORD.size
+    assert encode_state_delta(state, ["tx_queue"], 4, 6) is None
+
+    assert decode_command(encode_gimbal_rate(-1, 1, 70)) == {"type": "gimbal_rate", "yaw": -1, "pitch": 1, "speed": 70}
+    assert decode_command(encode_zoom("out")) == {"type": "zoom", "action": "out"}
+
+    # Malformed records are ValueErrors, which the WS handler skips
+    for bad in (b'', b'\x81', encode_gimbal_rate(1, 0, 50) + b'\x00', b'\x82', b'\x82\x07', b'\x99'):
+        with pytest.raises(ValueError):
+            decode_command(bad)
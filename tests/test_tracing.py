@@ -0,0 +1,119 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+
+from backend.coalescer import RateCoalescer
+from backend.connection import ConnectionManager
+from backend.daemon import DriverDaemon
+from backend.registry import DEFAULT_DEVICE
+from backend.remote import RemoteRegistry
+from backend.siyi_driver import SiyiDriver
+from backend.simulator import GimbalSimulator
+from backend.tracing import trace_from
+
+
+def test_traced_rate_intent_through_coalescer():
+    async def run():
+        sim = GimbalSimulator(latency=0.01, seed=2)
+        host, port = await sim.serve_udp()
+        driver = SiyiDriver()
+        await driver.connect(transport="udp", host=host, udp_port=port)
+        coalescer = RateCoalescer(driver, hz=50)
+
+        assert trace_from({"type": "gimbal_rate"}) is None
+        first = trace_from({"trace": {"id": 1, "t": 1234.5}})
+        second = trace_from({"trace": 2})
+        await coalescer.submit(1, 0, 50, first)
+        await coalescer.submit(-1, 0, 50, second)
+        assert (await first.done)["result"] == "superseded"
+
+        await asyncio.sleep(0.02)  # The control tick
+        await coalescer.flush()
+        report = await asyncio.wait_for(second.done, 2)
+        assert report["type"] == "trace" and report["id"] == 2 and report["result"] == "ok"
+        stages = report["stages_ms"]
+        assert set(stages) == {"coalesce", "tx_queue", "link", "server"}
+        assert stages["coalesce"] >= 15  # Waited for the tick
+        assert stages["link"] >= 10  # The simulated ACK latency
+        assert stages["server"] >= stages["coalesce"] + stages["link"]
+        # Rates are still fire-and-forget for the caller; the traced frame asked for an ACK
+        assert sim.commands[4] == 1 and driver.ack_window.in_flight == 0 and not driver._traced
+
+        # Untraced commands keep the plain path: no ACK requested, nothing in flight
+        await coalescer.submit(0, 0, 0)
+        assert driver.ack_window.in_flight == 0 and not driver._traced
+        await asyncio.sleep(0.05)
+        assert sim.commands[5] == 1
+
+        # A traced frame goes out in order with the untraced ones around it
+        order = []
+        on_packet = sim.on_packet
+        sim.on_packet = lambda packet: (order.append(packet.payload), on_packet(packet))
+        await driver.send_cmd(4, b'\x10\x00', expect_ack=False)
+        traced = trace_from({"trace": 3})
+        await driver.send_cmd(4, b'\x20\x00', expect_ack=False, trace=traced)
+        await driver.send_cmd(5, b'', expect_ack=False)
+        assert (await asyncio.wait_for(traced.done, 2))["result"] == "ok"
+        await asyncio.sleep(0.02)
+        assert order == [b'\x10\x00', b'\x20\x00', b'']
+
+        await driver.disconnect()
+        sim.close()
+
+    asyncio.run(run())
+
+
+def test_traces_dropped_with_the_tx_queue():
+    async def run():
+        sim = GimbalSimulator(seed=3)
+        host, port = await sim.serve_udp()
+        driver = SiyiDriver()
+        await driver.connect(transport="udp", host=host, udp_port=port)
+
+        for close in (driver.reopen, driver.disconnect):
+            # Out of byte budget: the traced frame waits in the scheduler queue
+            driver.scheduler.set_baud(100)
+            driver.scheduler.tokens, driver.scheduler._refill_at = 0, asyncio.get_running_loop().time()
+            trace = trace_from({"trace": close.__name__})
+            assert await driver.send_cmd(3, b'\x10', expect_ack=False, trace=trace)
+            assert driver.scheduler.depth == 1 and driver._traced
+            await close()
+            assert (await asyncio.wait_for(trace.done, 1))["result"] == "error"
+            assert not driver._traced
+
+        sim.close()
+
+    asyncio.run(run())
+
+
+def test_trace_crosses_the_daemon(tmp_path):
+    async def run():
+        sim = GimbalSimulator(latency=0.005, seed=4)
+        host, port = await sim.serve_udp()
+        socket_path = str(tmp_path / "daemon.sock")
+        daemon = DriverDaemon(socket_path, str(tmp_path))
+        await daemon.start()
+        registry = RemoteRegistry(socket_path, ConnectionManager())
+        registry.start()
+        await registry.wait_ready(2)
+        device = registry.get(DEFAULT_DEVICE)
+        await device.driver.connect(transport="udp", host=host, udp_port=port)
+
+        trace = trace_from({"trace": {"id": "a", "t": 99.0}})
+        await device.coalescer.submit(0, 0, 0, trace)  # A stop goes out immediately
+        report = await asyncio.wait_for(trace.done, 2)
+        assert report["result"] == "ok" and report["id"] == "a" and report["client_ts"] == 99.0
+        # "recv" was stamped in this process, the rest in the daemon's
+        assert report["stages_ms"]["server"] >= report["stages_ms"]["link"] >= 5
+
+        trace = trace_from({"trace": "zoom"})
+        assert await device.driver.send_cmd(6, b'', expect_ack=True, trace=trace)
+        assert (await asyncio.wait_for(trace.done, 2))["result"] == "ok"
+
+        await registry.stop()
+        await daemon.stop()
+        sim.close()
+
+    asyncio.run(run())
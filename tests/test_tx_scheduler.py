@@ -0,0 +1,78 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+
+from backend.tx_scheduler import TxScheduler, TxPriority, priority_for
+from backend.siyi_protocol import encode_frame
+
+
+def test_priority_mapping():
+    assert priority_for(5) == TxPriority.SAFETY
+    assert priority_for(3) == TxPriority.MOTION
+    assert priority_for(12) == TxPriority.CAMERA
+    assert priority_for(0x12) == TxPriority.HEARTBEAT
+
+
+def test_queued_frames_drain_by_priority():
+    async def run():
+        written = []
+        # 9600 baud -> 960 B/s, the 32 byte burst covers three 10 byte frames
+        scheduler = TxScheduler(written.append, baud=9600)
+        frames = {cmd: encode_frame(1, cmd) for cmd in (0x12, 12, 3, 5)}
+
+        for _ in range(3):
+            scheduler.submit(frames[0x12], TxPriority.HEARTBEAT)
+        # Bucket is empty now; these queue up behind nothing but each other
+        scheduler.submit(frames[0x12], TxPriority.HEARTBEAT)
+        scheduler.submit(frames[12], TxPriority.CAMERA)
+        scheduler.submit(frames[3], TxPriority.MOTION)
+        assert scheduler.depth == 3
+
+        # A stop overdraws the budget and goes out immediately
+        scheduler.submit(frames[5], TxPriority.SAFETY)
+        assert written[-1] == frames[5]
+
+        await asyncio.sleep(0.06)
+        assert written[4:] == [frames[3], frames[12], frames[0x12]]
+        assert scheduler.depth == 0
+
+        snap = scheduler.snapshot()
+        assert snap["classes"]["heartbeat"]["sent"] == 4
+        assert snap["classes"]["camera"]["wait_max_ms"] > 0
+
+    asyncio.run(run())
+
+
+def test_frame_larger_than_the_bucket_still_goes_out():
+    async def run():
+        written = []
+        scheduler = TxScheduler(written.append, baud=9600)  # 32 byte bucket
+        big = encode_frame(1, 12, bytes(100))
+        small = encode_frame(2, 0x12)
+        scheduler.submit(small, TxPriority.HEARTBEAT)
+        scheduler.submit(big, TxPriority.CAMERA)
+        scheduler.submit(small, TxPriority.HEARTBEAT)
+        assert written == [small] and scheduler.depth == 2
+
+        # Sent once the bucket is full again, then the debt delays what follows
+        await asyncio.sleep(0.05)
+        assert written == [small, big]
+        await asyncio.sleep(0.15)
+        assert written == [small, big, small] and scheduler.depth == 0
+
+    asyncio.run(run())
+
+
+def test_unpaced_scheduler_writes_immediately():
+    async def run():
+        written = []
+        sent_at = []
+        scheduler = TxScheduler(written.append, baud=None)
+        for i in range(100):
+            scheduler.submit(encode_frame(i, 1), TxPriority.MOTION, sent_at.append)
+        assert len(written) == 100 and len(sent_at) == 100
+        assert scheduler.depth == 0
+
+    asyncio.run(run())
@@ -0,0 +1,65 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+
+from backend.siyi_driver import SiyiDriver
+from backend.siyi_protocol import SiyiPacket
+from backend.telemetry import ATTITUDE_STRUCT
+
+
+class GimbalStandIn(asyncio.DatagramProtocol):
+    """Minimal UDP gimbal: ACKs frames that ask for it, can push attitude."""
+    def __init__(self, drop_first=0):
+        self.drop_first = drop_first
+        self.received = []
+        self.peer = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.peer = addr
+        packet, _ = SiyiPacket.decode(data)
+        self.received.append(packet)
+        if len(self.received) <= self.drop_first:
+            return
+        if packet and packet.need_ack:
+            ack = SiyiPacket(seq=packet.seq, cmd_id=packet.cmd_id, is_ack=True)
+            self.transport.sendto(ack.encode(), addr)
+
+    def push(self, data):
+        self.transport.sendto(data, self.peer)
+
+
+async def _start_stand_in(**kwargs):
+    loop = asyncio.get_running_loop()
+    transport, gimbal = await loop.create_datagram_endpoint(
+        lambda: GimbalStandIn(**kwargs), local_addr=("127.0.0.1", 0))
+    return transport, gimbal
+
+
+def test_driver_over_udp():
+    async def run():
+        transport, gimbal = await _start_stand_in(drop_first=1)
+        port = transport.get_extra_info("sockname")[1]
+        driver = SiyiDriver()
+        await driver.connect(transport="udp", host="127.0.0.1", udp_port=port)
+        assert driver.state["transport"] == "udp"
+
+        # First frame is swallowed, the retransmit gets ACKed
+        driver.ack_window.rto = 0.05
+        assert await driver.send_cmd(0, b'', expect_ack=True)
+        assert driver.state["retries"] >= 1
+
+        gimbal.push(SiyiPacket(seq=1, cmd_id=22, payload=ATTITUDE_STRUCT.pack(100, -200, 5, 0, 0, 0)).encode())
+        gimbal.push(b'\x55\x66\x00garbage')
+        await asyncio.sleep(0.05)
+        assert driver.state["yaw"] == 10.0 and driver.state["pitch"] == -20.0
+        assert driver.state["resync_bytes"] > 0
+
+        await driver.disconnect()
+        transport.close()
+
+    asyncio.run(run())
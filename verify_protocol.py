@@ -3,18 +3,11 @@ import time
 import struct
 import argparse
 
+from backend.siyi_protocol import SiyiCRC
+
 # CRC16-CCITT (0x1021)
 def calculate_crc(data):
-    crc = 0x0000
-    for byte in data:
-        crc ^= (byte << 8)
-        for _ in range(8):
-            if crc & 0x8000:
-                crc = (crc << 1) ^ 0x1021
-            else:
-                crc = crc << 1
-        crc &= 0xFFFF
-    return crc
+    return SiyiCRC.calculate(data)
 
 def make_packet(seq, cmd_id, payload=b'', header_ver=1):
     # Header V1: 0x55 0x66
@@ -3,23 +3,12 @@ import struct
 import time
 import argparse
 
+from backend.siyi_protocol import SiyiCRC
+
 # SIYI UDP Configuration
 SIYI_IP = "192.168.144.25"
 SIYI_PORT = 37260
 
-# CRC16-CCITT (Poly 0x1021, Init 0x0000)
-def crc16_ccitt(data):
-    crc = 0x0000
-    for byte in data:
-        crc ^= (byte << 8)
-        for _ in range(8):
-            if crc & 0x8000:
-                crc = (crc << 1) ^ 0x1021
-            else:
-                crc = crc << 1
-        crc &= 0xFFFF
-    return crc
-
 def make_packet(seq, cmd_id, payload=b''):
     # Header: 0x55 0x66 (Low byte first -> 55 66)
     stx = b'\x55\x66'
@@ -29,7 +18,7 @@ def make_packet(seq, cmd_id, payload=b''):
     # Header body for CRC: CTRL(1) + LEN(2) + SEQ(2) + CMD(1) + DATA(N)
     body = struct.pack('<BHHB', ctrl, length, seq, cmd_id) + payload
     
-    crc = crc16_ccitt(body)
+    crc = SiyiCRC.calculate(body)
     packet = stx + body + struct.pack('<H', crc)
     return packet
 